@@ -3,6 +3,15 @@ ASGI config for DidactaPrototipo project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Las vistas del calendario son asíncronas; para servirlas sin ocupar un hilo
+por request:
+
+    pip install uvicorn
+    uvicorn DidactaPrototipo.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+(o ``daphne DidactaPrototipo.asgi:application``). Con varios workers,
+configurar DIDACTA_METRICAS_DIR para que /metrics sume todos los procesos.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -10,8 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import re
+import warnings
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,9 +28,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-ioch=x5et)rf)yr2cj4c=y41^cyx+5tc4$jo$r8_60_#cyt8=0'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DIDACTA_DEBUG', '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('DIDACTA_ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -36,12 +41,18 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # runserver sirve los estáticos igual que en producción (con WhiteNoise)
+    'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
     'core',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.PerfilamientoMiddleware',
+    'core.middleware.MetricasMiddleware',
+    'core.middleware.CompresionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -52,12 +63,19 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'DidactaPrototipo.urls'
 
+# Las plantillas se compilan una vez por proceso (cargador con caché). Con
+# DEBUG, runserver vacía esa caché al modificar una plantilla.
+CARGADORES_PLANTILLAS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'core/templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': [('django.template.loaders.cached.Loader', CARGADORES_PLANTILLAS)],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -73,11 +91,240 @@ WSGI_APPLICATION = 'DidactaPrototipo.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+#
+# DIDACTA_DB_ENGINE=postgresql usa PostgreSQL (requiere psycopg) con conexiones
+# persistentes: cada hilo reutiliza su conexión durante DIDACTA_DB_CONN_MAX_AGE
+# segundos y la verifica al inicio de cada request. Con DIDACTA_DB_POOL=1
+# se usa en cambio el pool de psycopg (psycopg[pool]), que no admite
+# CONN_MAX_AGE. Sin configurar nada se mantiene SQLite.
+
+DB_ENGINE = os.environ.get('DIDACTA_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DIDACTA_DB_NAME', 'didacta'),
+            'USER': os.environ.get('DIDACTA_DB_USER', 'didacta'),
+            'PASSWORD': os.environ.get('DIDACTA_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DIDACTA_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DIDACTA_DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DIDACTA_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DIDACTA_DB_POOL') == '1':
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DIDACTA_DB_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('DIDACTA_DB_POOL_MAX', 10)),
+            'timeout': int(os.environ.get('DIDACTA_DB_POOL_TIMEOUT', 10)),
+        }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DIDACTA_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Las transacciones toman el bloqueo de escritura al comenzar, así
+                # busy_timeout puede esperar en lugar de fallar al promoverlas
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"DIDACTA_DB_ENGINE no soportado: {DB_ENGINE}")
+
+# PRAGMAs aplicados a cada conexión SQLite nueva (ver core.signals). Con WAL
+# (DIDACTA_SQLITE_WAL=1) los lectores no se bloquean mientras se escriben
+# eventos, y synchronous=NORMAL es seguro en ese modo. WAL queda grabado en el
+# archivo de la base y crea los archivos -wal y -shm junto a ella, por eso no
+# se activa por defecto sobre el db.sqlite3 del repositorio.
+SQLITE_WAL = os.environ.get('DIDACTA_SQLITE_WAL') == '1'
+SQLITE_PRAGMAS = {
+    **({'journal_mode': 'WAL', 'synchronous': 'NORMAL'} if SQLITE_WAL else {}),
+    'mmap_size': int(os.environ.get('DIDACTA_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'busy_timeout': int(os.environ.get('DIDACTA_SQLITE_BUSY_TIMEOUT_MS', 5000)),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# El alias 'calendario' guarda los fragmentos renderizados de las vistas del
+# calendario. Por defecto usa memoria local (LRU por proceso), suficiente para
+# desarrollo y pruebas. En producción se puede apuntar a un backend compartido,
+# p. ej. DIDACTA_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache y
+# DIDACTA_CACHE_LOCATION=redis://127.0.0.1:6379/1 con maxmemory-policy
+# allkeys-lru, o a FileBasedCache con un directorio como LOCATION.
+#
+# La versión de cada usuario (core.cache) se incrementa solo en la caché del
+# proceso que atendió la escritura: con varios workers y memoria local, los
+# demás seguirían sirviendo fragmentos y ETags viejos hasta el TIMEOUT. Por
+# eso DIDACTA_PROCESOS (la cantidad de workers) mayor a 1 exige un backend
+# compartido (ver core.checks).
+
+PROCESOS = int(os.environ.get('DIDACTA_PROCESOS', 1))
+CALENDARIO_CACHE_BACKEND = os.environ.get(
+    'DIDACTA_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'calendario': {
+        'BACKEND': CALENDARIO_CACHE_BACKEND,
+        'LOCATION': os.environ.get('DIDACTA_CACHE_LOCATION', 'didacta-calendario'),
+        'TIMEOUT': int(os.environ.get('DIDACTA_CACHE_TIMEOUT', 600)),
+    },
+}
+
+# MAX_ENTRIES solo aplica a los backends locales; Redis desaloja según su propia política
+if CALENDARIO_CACHE_BACKEND.endswith(('LocMemCache', 'FileBasedCache')):
+    CACHES['calendario']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('DIDACTA_CACHE_MAX_ENTRIES', 5000)),
     }
+
+
+# Sesiones y mensajes
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+#
+# Con cached_db las sesiones se leen desde la caché 'sesiones' y solo se
+# escriben en la base de datos cuando cambian (write-through), así que una
+# página vista en régimen normal no escribe en la base de datos. Los mensajes
+# van en una cookie firmada en lugar de la sesión.
+#
+# La caché de sesiones debe ser compartida entre procesos (p. ej. Redis con
+# DIDACTA_SESSION_CACHE_BACKEND y DIDACTA_SESSION_CACHE_LOCATION): con una
+# caché local, cerrar sesión o cambiar la clave en un worker no invalidaría
+# la copia de otro. Por eso cached_db solo se usa por defecto con una caché
+# compartida o en desarrollo con un único proceso; si no, las sesiones se
+# leen de la base de datos (una consulta por request).
+# Las sesiones expiradas se eliminan con `manage.py limpiar_sesiones`.
+
+SESSION_CACHE_BACKEND = os.environ.get(
+    'DIDACTA_SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+SESSION_ENGINE = os.environ.get(
+    'DIDACTA_SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db'
+    if not SESSION_CACHE_BACKEND.endswith('LocMemCache') or (DEBUG and PROCESOS == 1)
+    else 'django.contrib.sessions.backends.db'
+)
+SESSION_CACHE_ALIAS = 'sesiones'
+CACHES['sesiones'] = {
+    'BACKEND': SESSION_CACHE_BACKEND,
+    'LOCATION': os.environ.get('DIDACTA_SESSION_CACHE_LOCATION', 'didacta-sesiones'),
+}
+
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+
+# Límite de intentos de inicio de sesión (core.limites)
+#
+# Cada límite es "intentos/segundos": la cantidad de intentos seguidos que se
+# permiten y el tiempo en que se recuperan todos. Vacío o "0" lo desactiva.
+# Igual que la de sesiones, la caché 'limites' debe ser compartida entre
+# procesos para que el límite sea global: con memoria local cada worker
+# permite la cantidad completa de intentos. core.checks lo exige con
+# DIDACTA_PROCESOS mayor a 1.
+#
+# Detrás de un proxy inverso REMOTE_ADDR es la IP del proxy, y sin declararlo
+# en DIDACTA_PROXIES_CONFIABLES (IPs o redes separadas por comas, p. ej.
+# 127.0.0.1,10.0.0.0/8) todos los clientes compartirían el bucket por IP: 30
+# intentos fallidos de cualquiera bloquearían todos los inicios de sesión. Con
+# proxies declarados la IP del cliente se toma de X-Forwarded-For, que el
+# proxy debe completar.
+
+LIMITE_LOGIN_RUT = os.environ.get('DIDACTA_LIMITE_LOGIN_RUT', '5/300')
+LIMITE_LOGIN_IP = os.environ.get('DIDACTA_LIMITE_LOGIN_IP', '30/60')
+PROXIES_CONFIABLES = [red for red in os.environ.get('DIDACTA_PROXIES_CONFIABLES', '').split(',') if red]
+CACHES['limites'] = {
+    'BACKEND': os.environ.get(
+        'DIDACTA_LIMITES_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+    ),
+    'LOCATION': os.environ.get('DIDACTA_LIMITES_CACHE_LOCATION', 'didacta-limites'),
+}
+
+
+# Archivo de eventos (core.archivo)
+#
+# manage.py archivar_eventos mueve a la tabla de archivo los eventos que
+# terminaron antes del primer día del mes de hace ARCHIVO_MESES meses. Las
+# vistas del calendario solo leen el archivo para periodos anteriores al
+# corte.
+
+ARCHIVO_MESES = int(os.environ.get('DIDACTA_ARCHIVO_MESES', 24))
+ARCHIVO_LOTE = int(os.environ.get('DIDACTA_ARCHIVO_LOTE', 1000))
+
+
+# Métricas (endpoint /metrics)
+#
+# Con varios procesos (gunicorn, uvicorn --workers) DIDACTA_METRICAS_DIR debe
+# apuntar a un directorio compartido y vacío al iniciar: cada proceso vuelca
+# ahí sus valores y el endpoint los suma. Sin directorio cada proceso reporta
+# solo los suyos.
+#
+# Por defecto solo un superusuario puede leerlas: DIDACTA_METRICAS_IPS (lista
+# separada por comas) habilita además las IPs del recolector. No conviene
+# incluir 127.0.0.1 si hay un proxy local, porque detrás de un proxy
+# REMOTE_ADDR es la IP del proxy y cualquier cliente quedaría habilitado.
+
+METRICAS = os.environ.get('DIDACTA_METRICAS', '1') == '1'
+METRICAS_DIRECTORIO = os.environ.get('DIDACTA_METRICAS_DIR')
+METRICAS_INTERVALO = float(os.environ.get('DIDACTA_METRICAS_INTERVALO', 1))
+METRICAS_IPS_PERMITIDAS = [ip for ip in os.environ.get('DIDACTA_METRICAS_IPS', '').split(',') if ip]
+
+
+# Compresión de respuestas (core.middleware.CompresionMiddleware)
+#
+# HTML, JSON e iCalendar se comprimen con brotli o gzip según lo que acepte
+# el cliente; los estáticos ya van comprimidos desde collectstatic. Un nivel
+# más alto reduce algo más el tamaño a cambio de CPU en cada request: brotli
+# va de 0 a 11 y gzip de 1 a 9.
+
+COMPRESION = os.environ.get('DIDACTA_COMPRESION', '1') == '1'
+COMPRESION_NIVEL_BROTLI = int(os.environ.get('DIDACTA_COMPRESION_NIVEL_BROTLI', 5))
+COMPRESION_NIVEL_GZIP = int(os.environ.get('DIDACTA_COMPRESION_NIVEL_GZIP', 6))
+COMPRESION_MINIMO = int(os.environ.get('DIDACTA_COMPRESION_MINIMO', 200))
+
+
+# Perfilamiento de requests
+#
+# Con DIDACTA_PERFILAMIENTO=1 cada respuesta incluye una cabecera
+# Server-Timing (SQL, plantillas, vista y total) y los requests que superan
+# DIDACTA_PERFILAMIENTO_UMBRAL_MS se registran como líneas JSON en
+# DIDACTA_PERFILAMIENTO_LOG, que rota al llegar a 10 MB.
+
+PERFILAMIENTO = os.environ.get('DIDACTA_PERFILAMIENTO') == '1'
+PERFILAMIENTO_UMBRAL_MS = float(os.environ.get('DIDACTA_PERFILAMIENTO_UMBRAL_MS', 0))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'mensaje': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'perfilamiento': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.environ.get('DIDACTA_PERFILAMIENTO_LOG', BASE_DIR / 'perfilamiento.jsonl'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,  # El archivo se crea con la primera línea registrada
+            'formatter': 'mensaje',
+        },
+    },
+    'loggers': {
+        'core.perfilamiento': {
+            'handlers': ['perfilamiento'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -115,7 +362,34 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
+#
+# Bootstrap se sirve desde core/static (sin CDN). Con DEBUG desactivado,
+# `collectstatic` copia los archivos a STATIC_ROOT con el hash del contenido
+# en el nombre y genera sus variantes .gz y .br; WhiteNoise los sirve
+# directamente desde el proceso, eligiendo la variante según
+# Accept-Encoding y con Cache-Control de un año (immutable) para los
+# archivos con hash, así que nunca se comprime por request.
+
 STATIC_URL = 'static/'
+STATIC_ROOT = Path(os.environ.get('DIDACTA_STATIC_ROOT', BASE_DIR / 'staticfiles'))
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        # El manifiesto solo existe después de collectstatic
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
+# En desarrollo y en las pruebas se sirve desde las apps sin collectstatic, así
+# que STATIC_ROOT puede no existir. Solo se silencia ese aviso y solo con
+# DEBUG: en producción la falta de STATIC_ROOT debe seguir avisándose.
+if DEBUG:
+    warnings.filterwarnings('ignore', message=f'No directory at: {re.escape(str(STATIC_ROOT))}/?$')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -18,8 +18,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import RedirectView
 
+from core.metricas import metricas_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('calendario/', include('core.urls')),
+    path('metrics', metricas_view, name='metricas'),
     path('', RedirectView.as_view(url='/calendario/', permanent=False)),
 ]
\ No newline at end of file
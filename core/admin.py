@@ -1,3 +1,139 @@
-from django.contrib import admin
+import csv
+import io
+from datetime import timedelta
 
-# Register your models here.
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from .conflictos import conflictos_en_rango
+from .importacion import FORMATOS, TAMANO_LOTE, detectar_formato, importar_eventos
+from .models import Evento, EventoArchivado, Usuario
+
+MAXIMO_DIAS_CONFLICTOS = 366
+MAXIMO_CONFLICTOS_REPORTE = 500
+
+
+class ImportarEventosForm(forms.Form):
+    archivo = forms.FileField(label="Archivo CSV o .ics")
+    usuario = forms.ModelChoiceField(queryset=Usuario.objects.order_by("rut"), label="Usuario")
+    lote = forms.IntegerField(label="Filas por lote", min_value=1, initial=TAMANO_LOTE)
+
+
+class ConflictosForm(forms.Form):
+    desde = forms.DateField(label="Desde", widget=forms.DateInput(attrs={"type": "date"}))
+    hasta = forms.DateField(label="Hasta", help_text="Incluye el día indicado.", widget=forms.DateInput(attrs={"type": "date"}))
+    usuario = forms.ModelChoiceField(
+        queryset=Usuario.objects.order_by("rut"), label="Usuario", required=False,
+        help_text="Vacío para revisar todos los usuarios.",
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde, hasta = cleaned_data.get("desde"), cleaned_data.get("hasta")
+        if desde and hasta and hasta < desde:
+            raise forms.ValidationError("La fecha final no puede ser anterior a la inicial.")
+        if desde and hasta and (hasta - desde).days > MAXIMO_DIAS_CONFLICTOS:
+            raise forms.ValidationError(f"El rango no puede superar {MAXIMO_DIAS_CONFLICTOS} días.")
+        return cleaned_data
+
+
+@admin.register(Evento)
+class EventoAdmin(admin.ModelAdmin):
+    list_display = ("titulo", "usuario", "fecha_inicio", "fecha_fin")
+    list_filter = ("usuario",)
+    search_fields = ("titulo",)
+    date_hierarchy = "fecha_inicio"
+    raw_id_fields = ("usuario",)
+    change_list_template = "admin/core/evento/change_list.html"
+
+    def get_urls(self):
+        urls = [
+            path(
+                "importar/",
+                self.admin_site.admin_view(self.importar_view),
+                name="core_evento_importar",
+            ),
+            path(
+                "conflictos/",
+                self.admin_site.admin_view(self.conflictos_view),
+                name="core_evento_conflictos",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def importar_view(self, request):
+        """Carga masiva de eventos desde un archivo subido"""
+        if not self.has_add_permission(request):
+            return redirect("admin:core_evento_changelist")
+
+        form = ImportarEventosForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            archivo = form.cleaned_data["archivo"]
+            formato = detectar_formato(archivo.name)
+            lineas = io.TextIOWrapper(archivo.file, encoding="utf-8-sig", newline="")
+            try:
+                resultado = importar_eventos(lineas, form.cleaned_data["usuario"], formato, form.cleaned_data["lote"])
+            except (UnicodeDecodeError, csv.Error) as error:
+                # La importación es una sola transacción: no se guardó ningún evento
+                form.add_error("archivo", f"Archivo rechazado, no se importó ningún evento: {error}")
+            else:
+                messages.success(
+                    request,
+                    f"Importados {resultado.creados} eventos en {resultado.segundos:.2f} s "
+                    f"({resultado.eventos_por_segundo:.0f} eventos/s).",
+                )
+                if resultado.rechazados:
+                    messages.warning(request, f"{len(resultado.rechazados)} filas rechazadas.")
+                context = {**self.admin_site.each_context(request), "opts": self.model._meta,
+                           "form": ImportarEventosForm(), "resultado": resultado}
+                return TemplateResponse(request, "admin/core/evento/importar.html", context)
+
+        context = {**self.admin_site.each_context(request), "opts": self.model._meta,
+                   "form": form, "formatos": FORMATOS}
+        return TemplateResponse(request, "admin/core/evento/importar.html", context)
+
+    def conflictos_view(self, request):
+        """Reporte de eventos superpuestos de un mismo usuario en un rango de fechas"""
+        if not self.has_view_permission(request):
+            return redirect("admin:index")
+
+        hoy = timezone.localdate()
+        form = ConflictosForm(request.GET or {"desde": hoy, "hasta": hoy + timedelta(days=30)})
+        conflictos = None
+        if form.is_valid():
+            eventos = Evento.objects.all()
+            if form.cleaned_data["usuario"]:
+                eventos = eventos.filter(usuario=form.cleaned_data["usuario"])
+            conflictos = conflictos_en_rango(
+                eventos, form.cleaned_data["desde"], form.cleaned_data["hasta"] + timedelta(days=1)
+            )
+        context = {
+            **self.admin_site.each_context(request), "opts": self.model._meta, "form": form,
+            "conflictos": conflictos[:MAXIMO_CONFLICTOS_REPORTE] if conflictos else conflictos,
+            "total": len(conflictos or []), "maximo": MAXIMO_CONFLICTOS_REPORTE,
+        }
+        return TemplateResponse(request, "admin/core/evento/conflictos.html", context)
+
+
+@admin.register(EventoArchivado)
+class EventoArchivadoAdmin(admin.ModelAdmin):
+    """Solo lectura: los eventos archivados no se editan (ver core.archivo)"""
+    list_display = ("titulo", "usuario", "fecha_inicio", "fecha_fin")
+    list_filter = ("usuario",)
+    search_fields = ("titulo",)
+    date_hierarchy = "fecha_inicio"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    # Borrar una fila del archivo no pasa por las señales de Evento: los
+    # conteos diarios y la caché del usuario seguirían mostrándolo
+    def has_delete_permission(self, request, obj=None):
+        return False
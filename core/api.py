@@ -0,0 +1,176 @@
+"""
+API JSON de eventos para que el navegador arme el calendario por su cuenta.
+
+Los eventos se leen con ``values_list`` (sin construir instancias del
+modelo) y se paginan por cursor sobre ``(fecha_inicio, id)``, lo que usa el
+índice (usuario, fecha_inicio) sin importar qué tan avanzada esté la página.
+La respuesta se envía en streaming a medida que se leen las filas. Bajo
+ASGI el contenido debe ser un iterador asíncrono (con las filas de
+``EventoQuerySet.aiterar``): Django carga completo un iterador síncrono
+antes de enviarlo, y bajo WSGI hace lo mismo con uno asíncrono, así que se
+elige según el servidor.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_GET
+
+from .models import Evento
+
+LIMITE_POR_DEFECTO = 500
+LIMITE_MAXIMO = 2000
+CAMPOS = (
+    "id", "titulo", "descripcion", "fecha_inicio", "fecha_fin",
+    "recurrencia", "intervalo", "repetir_hasta", "repeticiones", "excepciones",
+)
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def _parsear_fecha(valor, nombre):
+    """Acepta una fecha (YYYY-MM-DD) o un datetime ISO 8601"""
+    if not valor:
+        raise ParametroInvalido(f"El parámetro '{nombre}' es obligatorio.")
+    try:
+        resultado = parse_datetime(valor) or parse_date(valor)
+    except ValueError:
+        resultado = None
+    if resultado is None:
+        raise ParametroInvalido(f"El parámetro '{nombre}' no es una fecha válida.")
+    if isinstance(resultado, datetime) and timezone.is_naive(resultado):
+        resultado = timezone.make_aware(resultado)
+    return resultado
+
+
+def _parsear_limite(valor):
+    if not valor:
+        return LIMITE_POR_DEFECTO
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise ParametroInvalido("El parámetro 'limit' debe ser un entero.")
+    if limite < 1:
+        raise ParametroInvalido("El parámetro 'limit' debe ser positivo.")
+    return min(limite, LIMITE_MAXIMO)
+
+
+def codificar_cursor(fecha_inicio, pk):
+    contenido = json.dumps([fecha_inicio.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(contenido).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        fecha_inicio, pk = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        fecha_inicio = parse_datetime(fecha_inicio)
+        pk = int(pk)
+    except (binascii.Error, ValueError, TypeError):
+        raise ParametroInvalido("El cursor no es válido.")
+    if fecha_inicio is None:
+        raise ParametroInvalido("El cursor no es válido.")
+    return fecha_inicio, pk
+
+
+def _serializar(fila):
+    (pk, titulo, descripcion, fecha_inicio, fecha_fin,
+     recurrencia, intervalo, repetir_hasta, repeticiones, excepciones) = fila
+    # Las series se entregan una vez con su regla; el cliente expande las ocurrencias
+    regla = {
+        "frecuencia": recurrencia,
+        "intervalo": intervalo,
+        "hasta": repetir_hasta.isoformat() if repetir_hasta else None,
+        "repeticiones": repeticiones,
+        "excepciones": excepciones,
+    } if recurrencia else None
+    return json.dumps({
+        "id": pk,
+        "titulo": titulo,
+        "descripcion": descripcion,
+        "fecha_inicio": fecha_inicio.isoformat(),
+        "fecha_fin": fecha_fin.isoformat(),
+        "recurrencia": regla,
+    }, ensure_ascii=False)
+
+
+def _cierre(ultima, hay_mas):
+    siguiente = codificar_cursor(ultima[3], ultima[0]) if hay_mas else None
+    return '],"siguiente":' + json.dumps(siguiente) + '}'
+
+
+def _generar_pagina(filas, limite):
+    """Escribe el documento JSON fila por fila y agrega el cursor al final"""
+    yield '{"eventos":['
+    ultima = None
+    hay_mas = False
+    for posicion, fila in enumerate(filas):
+        if posicion == limite:
+            # Se pidió una fila de más solo para saber si existe otra página
+            hay_mas = True
+            break
+        yield ("," if posicion else "") + _serializar(fila)
+        ultima = fila
+    yield _cierre(ultima, hay_mas)
+
+
+async def _agenerar_pagina(filas, limite):
+    """Versión asíncrona de _generar_pagina para filas leídas con aiterar()"""
+    yield '{"eventos":['
+    ultima = None
+    hay_mas = False
+    posicion = 0
+    async for fila in filas:
+        if posicion == limite:
+            hay_mas = True
+            break
+        yield ("," if posicion else "") + _serializar(fila)
+        ultima = fila
+        posicion += 1
+    yield _cierre(ultima, hay_mas)
+
+
+@require_GET
+def eventos_api(request):
+    """
+    GET /calendario/api/eventos?start=&end=[&cursor=][&limit=]
+
+    Retorna los eventos del usuario que ocurren en [start, end), ordenados
+    por fecha de inicio. Si hay más resultados, `siguiente` trae el cursor
+    para pedir la página siguiente.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Autenticación requerida."}, status=401)
+
+    try:
+        inicio = _parsear_fecha(request.GET.get("start"), "start")
+        fin = _parsear_fecha(request.GET.get("end"), "end")
+        limite = _parsear_limite(request.GET.get("limit"))
+        cursor = request.GET.get("cursor")
+        posicion = decodificar_cursor(cursor) if cursor else None
+    except ParametroInvalido as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    eventos = Evento.objects.filter(usuario=request.user).overlapping(inicio, fin)
+    if posicion:
+        fecha_inicio, pk = posicion
+        eventos = eventos.filter(
+            Q(fecha_inicio__gt=fecha_inicio) | Q(fecha_inicio=fecha_inicio, id__gt=pk)
+        )
+    filas = eventos.order_by("fecha_inicio", "id").values_list(*CAMPOS)[:limite + 1]
+
+    if isinstance(request, ASGIRequest):
+        contenido = _agenerar_pagina(filas.aiterar(LIMITE_POR_DEFECTO), limite)
+    else:
+        contenido = _generar_pagina(filas.iterator(chunk_size=LIMITE_POR_DEFECTO), limite)
+    response = StreamingHttpResponse(contenido, content_type="application/json")
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
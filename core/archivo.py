@@ -0,0 +1,140 @@
+"""
+Archivo de eventos de periodos pasados.
+
+Los eventos que terminaron antes de la fecha de corte (``CorteArchivo``) se
+mueven por lotes a ``EventoArchivado`` con ``manage.py archivar_eventos``,
+así que ``core_evento`` y sus índices solo crecen con los periodos que se
+consultan a diario. Cada lote copia las filas con un INSERT ... SELECT y
+las borra con un DELETE en la misma transacción: un evento está siempre en
+una sola de las dos tablas y conserva su id.
+
+Las consultas del calendario pasan por ``con_archivo``, que agrega con
+UNION ALL la misma consulta sobre el archivo. Esa parte está condicionada a
+que exista un corte posterior al inicio del periodo (un EXISTS sin
+correlación, que SQLite y PostgreSQL evalúan una vez antes de leer la
+tabla), de modo que un periodo posterior al corte no toca el archivo y
+ningún periodo cuesta consultas adicionales.
+
+El corte se publica antes de mover el primer lote: mientras el comando
+avanza, los periodos anteriores al corte ya leen ambas tablas.
+
+Los eventos archivados siguen en los conteos diarios (el DELETE no emite
+señales) pero no en la búsqueda de texto, el feed iCalendar ni la detección
+de conflictos, y no se pueden editar.
+"""
+from datetime import date, datetime, time
+
+from django.db import connection, transaction
+from django.db.models import Exists, Q
+from django.utils import timezone
+
+from .calendario import mes_relativo
+from .models import CorteArchivo, Evento, EventoArchivado, EventoQuerySet, rango_datetimes
+
+
+def corte_vigente():
+    """Fecha de corte del archivo, o None si nunca se ha archivado"""
+    return CorteArchivo.objects.values_list('fecha', flat=True).first()
+
+
+def antes_del_corte(desde):
+    """Condición: existe un corte posterior a `desde` (fecha o datetime)"""
+    desde, _ = rango_datetimes(desde, desde)
+    return Exists(CorteArchivo.objects.filter(fecha__gt=desde))
+
+
+def con_archivo(consulta, desde):
+    """
+    Aplica `consulta` (una función que recibe y retorna un queryset) a Evento
+    y a EventoArchivado y une ambos resultados. El archivo solo se lee si el
+    periodo, que comienza en `desde`, es anterior al corte. Los resultados son
+    instancias de Evento; el orden se debe indicar sobre la unión.
+    """
+    activos = consulta(Evento.objects.all()).order_by()
+    archivados = consulta(EventoArchivado.objects.filter(antes_del_corte(desde))).order_by()
+    return activos.union(archivados, all=True)
+
+
+def _filas_resumen(consulta, desde):
+    # Django no calcula bien un aggregate() sobre una unión: cada tabla aporta
+    # sus filas ya agregadas (una por usuario) y se combinan en Python
+    return con_archivo(
+        lambda eventos: consulta(eventos).values('usuario').annotate(**EventoQuerySet.RESUMEN_CAMBIOS), desde
+    )
+
+
+def _combinar_resumenes(filas):
+    modificaciones = [fila['ultima_modificacion'] for fila in filas if fila['ultima_modificacion']]
+    return {
+        'cantidad': sum(fila['cantidad'] for fila in filas),
+        'ultima_modificacion': max(modificaciones, default=None),
+    }
+
+
+def resumen_cambios(consulta, desde):
+    """resumen_cambios() de `consulta` sobre ambas tablas, con una consulta"""
+    return _combinar_resumenes(list(_filas_resumen(consulta, desde)))
+
+
+async def aresumen_cambios(consulta, desde):
+    return _combinar_resumenes([fila async for fila in _filas_resumen(consulta, desde)])
+
+
+def archivables(corte):
+    """
+    Eventos que terminan antes de `corte`: los no recurrentes y las series
+    cuya última ocurrencia termina antes (las series sin fin nunca se archivan)
+    """
+    return Evento.objects.filter(
+        Q(recurrencia='') | Q(fin_serie__isnull=False, fin_serie__lt=corte),
+        fecha_fin__lt=corte,
+    )
+
+
+def corte_por_antiguedad(meses, hoy=None):
+    """Primer día del mes de hace `meses` meses"""
+    hoy = hoy or timezone.localdate()
+    year, month = mes_relativo(hoy.year, hoy.month, -meses)
+    return date(year, month, 1)
+
+
+def fijar_corte(fecha):
+    """
+    Publica el corte (medianoche de `fecha` en la zona horaria activa). Solo
+    avanza: los eventos ya archivados deben seguir siendo visibles.
+    """
+    corte = timezone.make_aware(datetime.combine(fecha, time.min))
+    actual = corte_vigente()
+    if actual is not None and corte < actual:
+        raise ValueError(f"El corte vigente ({actual:%Y-%m-%d}) es posterior a {fecha:%Y-%m-%d}.")
+    CorteArchivo.objects.update_or_create(pk=1, defaults={'fecha': corte})
+    return corte
+
+
+def _columnas():
+    return ", ".join(connection.ops.quote_name(campo.column) for campo in Evento._meta.concrete_fields)
+
+
+def archivar_lote(corte, tamano):
+    """
+    Mueve al archivo hasta `tamano` eventos que terminan antes de `corte` y
+    retorna cuántos movió. El borrado es SQL directo para no emitir señales:
+    los conteos diarios siguen incluyendo a los eventos archivados y los
+    fragmentos cacheados siguen siendo válidos, porque el calendario muestra
+    lo mismo.
+    """
+    with transaction.atomic():
+        # Bloquea el lote en PostgreSQL para que no se edite antes de moverlo
+        ids = list(archivables(corte).select_for_update().order_by('id').values_list('id', flat=True)[:tamano])
+        if not ids:
+            return 0
+        marcadores = ", ".join(["%s"] * len(ids))
+        columnas = _columnas()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {EventoArchivado._meta.db_table} ({columnas}) "
+                f"SELECT {columnas} FROM {Evento._meta.db_table} WHERE id IN ({marcadores})",
+                ids,
+            )
+            cursor.execute(f"DELETE FROM {Evento._meta.db_table} WHERE id IN ({marcadores})", ids)
+    return len(ids)
@@ -0,0 +1,329 @@
+"""
+Benchmarks de los endpoints del calendario.
+
+Se generan datos sintéticos a distintas escalas (eventos repartidos entre
+muchos usuarios, con una parte de eventos multidía y de series recurrentes)
+y cada endpoint se ejecuta con el cliente de pruebas de Django. Por cada uno
+se registra la cantidad de consultas, la latencia p50/p95 y el pico de
+memoria asignada durante el request.
+
+La caché de fragmentos se vacía antes de cada request, así que siempre se
+mide el peor caso. ``PRESUPUESTO_CONSULTAS`` fija el máximo de consultas por
+endpoint; como no depende de la escala, una vista que empiece a consultar
+por mes o por evento excede el presupuesto aunque la base sea pequeña.
+"""
+import logging
+import random
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import conteos, limites
+from .cache import CACHE_CALENDARIO
+from .ical import token_suscripcion
+from .models import Evento, Usuario
+from .recurrencia import SEMANAL, calcular_fin_serie
+
+ESCALAS = (1_000, 10_000, 100_000)
+EVENTOS_POR_USUARIO = 200
+REPETICIONES = 20
+# Accept-Encoding de los requests con los que se mide la latencia
+ACEPTA_COMPRESION = "br, gzip"
+# Intentos fallidos por cada inicio de sesión legítimo en medir_login
+ATAQUE_POR_LOGIN = 10
+REPETICIONES_LOGIN = 10
+IP_ATACANTE = "203.0.113.7"
+IP_LEGITIMO = "198.51.100.20"
+IP_PROXY = "127.0.0.1"
+ANIO = 2025
+TAMANO_LOTE = 1000
+
+# Máximo de consultas por request con la caché de fragmentos vacía. La sesión
+# se lee desde la caché de sesiones (cached_db), así que no suma consultas.
+# Las altas y bajas incluyen la actualización de los conteos diarios (un
+# INSERT en su propia transacción y un UPDATE); la edición medida no cambia
+# las fechas, así que no los toca. Las altas y ediciones medidas omiten la
+# revisión de conflictos, que se mide aparte en "conflictos": una edición
+# que solo suma la consulta por rango al usuario y al evento editado.
+PRESUPUESTO_CONSULTAS = {
+    "anual": 5,
+    "mapa_calor": 4,
+    "mensual": 3,
+    "semanal": 3,
+    "diario": 3,
+    "api": 2,
+    "ics": 3,
+    "crear_form": 1,
+    "crear": 6,
+    "editar_form": 2,
+    "editar": 4,
+    "conflictos": 3,
+    "eliminar_form": 2,
+    "eliminar": 6,
+}
+
+
+@dataclass
+class Endpoint:
+    nombre: str
+    # Retorna (método, url, datos) para el próximo request
+    preparar: Callable[[], tuple]
+
+
+@dataclass
+class Resultado:
+    escala: int
+    endpoint: str
+    consultas: int
+    p50_ms: float
+    p95_ms: float
+    memoria_pico_kb: float
+    # Tamaño del cuerpo sin comprimir y con la compresión negociada
+    cuerpo_kb: float
+    comprimido_kb: float
+
+    @property
+    def presupuesto(self):
+        return PRESUPUESTO_CONSULTAS[self.endpoint]
+
+    @property
+    def excedido(self):
+        return self.consultas > self.presupuesto
+
+
+def _fecha(dia, hora):
+    return timezone.make_aware(datetime(ANIO, 1, 1, hora)) + timedelta(days=dia)
+
+
+def sembrar(cantidad, semilla=0):
+    """
+    Crea `cantidad` eventos repartidos entre usuarios sintéticos y retorna el
+    primero de ellos (superusuario) para usarlo en las mediciones.
+    """
+    aleatorio = random.Random(semilla)
+    clave = make_password("benchmark")  # Se calcula una sola vez
+    usuarios = Usuario.objects.bulk_create([
+        Usuario(rut=f"bench-{numero:05d}", password=clave, is_staff=numero == 0, is_superuser=numero == 0)
+        for numero in range(max(1, cantidad // EVENTOS_POR_USUARIO))
+    ])
+
+    lote = []
+    for numero in range(cantidad):
+        inicio = _fecha(aleatorio.randrange(365), aleatorio.randrange(8, 19))
+        evento = Evento(
+            titulo=f"Evento {numero}",
+            descripcion="Generado para benchmarks",
+            fecha_inicio=inicio,
+            fecha_fin=inicio + timedelta(hours=aleatorio.randint(1, 3)),
+            usuario=usuarios[numero % len(usuarios)],
+        )
+        tipo = aleatorio.random()
+        if tipo < 0.1:
+            evento.fecha_fin += timedelta(days=aleatorio.randint(1, 4))
+        elif tipo < 0.12:
+            evento.recurrencia = SEMANAL
+            evento.repeticiones = 10
+            # bulk_create no llama a save(): calcular el fin de la serie aquí
+            evento.fin_serie = calcular_fin_serie(evento)
+        lote.append(evento)
+        if len(lote) == TAMANO_LOTE:
+            Evento.objects.bulk_create(lote)
+            lote = []
+    Evento.objects.bulk_create(lote)
+    # bulk_create no emite señales: los conteos diarios se calculan de una vez
+    conteos.reconstruir()
+    return usuarios[0]
+
+
+def endpoints(usuario):
+    """Endpoints a medir para `usuario`, con fechas fijas dentro de ANIO"""
+    editado = Evento.objects.filter(usuario=usuario, recurrencia="").first()
+    formulario = {
+        "titulo": "Evento de benchmark",
+        "descripcion": "",
+        "fecha_inicio": f"{ANIO}-06-12T10:00",
+        "fecha_fin": f"{ANIO}-06-12T11:00",
+        "ignorar_conflictos": "on",
+    }
+    revisado = {key: valor for key, valor in formulario.items() if key != "ignorar_conflictos"}
+
+    def eliminable():
+        evento = Evento.objects.create(
+            titulo="Eliminar", fecha_inicio=_fecha(200, 9), fecha_fin=_fecha(200, 10), usuario=usuario
+        )
+        return reverse("evento_eliminar", args=[evento.pk])
+
+    api = f"{reverse('api_eventos')}?start={ANIO}-06-01&end={ANIO}-07-01"
+    ics = reverse("eventos_ics", args=[token_suscripcion(usuario)])
+    editar = reverse("evento_editar", args=[editado.pk])
+    return [
+        Endpoint("anual", lambda: ("get", reverse("calendario_anual", args=[ANIO]), None)),
+        Endpoint("mapa_calor", lambda: ("get", reverse("mapa_calor", args=[ANIO]), None)),
+        Endpoint("mensual", lambda: ("get", reverse("calendario_mensual", args=[ANIO, 6]), None)),
+        Endpoint("semanal", lambda: ("get", reverse("calendario_semanal", args=[ANIO, 24]), None)),
+        Endpoint("diario", lambda: ("get", reverse("calendario_diario", args=[ANIO, 6, 12]), None)),
+        Endpoint("api", lambda: ("get", api, None)),
+        Endpoint("ics", lambda: ("get", ics, None)),
+        Endpoint("crear_form", lambda: ("get", reverse("evento_crear"), None)),
+        Endpoint("crear", lambda: ("post", reverse("evento_crear"), formulario)),
+        Endpoint("editar_form", lambda: ("get", editar, None)),
+        Endpoint("editar", lambda: ("post", editar, formulario)),
+        Endpoint("conflictos", lambda: ("post", editar, revisado)),
+        Endpoint("eliminar_form", lambda: ("get", eliminable(), None)),
+        Endpoint("eliminar", lambda: ("post", eliminable(), None)),
+    ]
+
+
+def _preparar(endpoint):
+    """Datos del próximo request, con la caché de fragmentos vacía"""
+    peticion = endpoint.preparar()
+    caches[CACHE_CALENDARIO].clear()
+    return peticion
+
+
+def _ejecutar(client, nombre, peticion, **cabeceras):
+    """
+    Ejecuta un request y consume la respuesta, incluida la de streaming.
+    Retorna los segundos transcurridos y el tamaño del cuerpo en bytes.
+    """
+    metodo, url, datos = peticion
+    inicio = time.perf_counter()
+    response = getattr(client, metodo)(url, datos, **cabeceras)
+    if response.streaming:
+        cuerpo = b"".join(response.streaming_content)
+    else:
+        cuerpo = response.content
+    transcurrido = time.perf_counter() - inicio
+    if response.status_code >= 400:
+        raise RuntimeError(f"{nombre}: {url} respondió {response.status_code}")
+    return transcurrido, len(cuerpo)
+
+
+def _percentiles(tiempos):
+    tiempos = sorted(tiempos)
+    return statistics.median(tiempos), tiempos[min(len(tiempos) - 1, round(0.95 * (len(tiempos) - 1)))]
+
+
+def medir(client, endpoint, escala, repeticiones=REPETICIONES):
+    """
+    Mide un endpoint. La latencia se mide con compresión, como la pide un
+    navegador; las consultas, la memoria y el tamaño sin comprimir se
+    registran en un request aparte para que la instrumentación no afecte la
+    latencia.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        segundos, comprimido = _ejecutar(
+            client, endpoint.nombre, _preparar(endpoint), HTTP_ACCEPT_ENCODING=ACEPTA_COMPRESION
+        )
+        tiempos.append(segundos * 1000)
+    peticion = _preparar(endpoint)
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as consultas:
+            _, cuerpo = _ejecutar(client, endpoint.nombre, peticion)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    p50, p95 = _percentiles(tiempos)
+    return Resultado(
+        escala=escala,
+        endpoint=endpoint.nombre,
+        consultas=len(consultas),
+        p50_ms=p50,
+        p95_ms=p95,
+        memoria_pico_kb=pico / 1024,
+        cuerpo_kb=cuerpo / 1024,
+        comprimido_kb=comprimido / 1024,
+    )
+
+
+@dataclass
+class ResultadoLogin:
+    escenario: str
+    p50_ms: float
+    p95_ms: float
+    intentos_ataque: int
+    rechazados: int
+
+
+def medir_login(ataque_por_login=ATAQUE_POR_LOGIN, repeticiones=REPETICIONES_LOGIN):
+    """
+    Latencia de un inicio de sesión legítimo en un worker que, por cada uno,
+    atiende antes `ataque_por_login` intentos fallidos desde otra IP (con
+    RUTs distintos, como en un relleno de credenciales). La latencia incluye
+    la espera por los intentos atendidos antes, así que sin límite crece con
+    el costo del hash de cada intento del ataque. Con límite, los primeros
+    intentos pasan hasta vaciar el bucket de la IP y el resto se rechaza.
+
+    En el escenario "tras proxy" ambos clientes llegan desde la misma IP (un
+    proxy inverso declarado en PROXIES_CONFIABLES) y se distinguen por
+    X-Forwarded-For: el bucket del atacante no debe bloquear al legítimo.
+    """
+    legitimo = Usuario.objects.create_user(rut="bench-login", password="benchmark")
+    datos = {"username": legitimo.rut, "password": "benchmark"}
+    escenarios = [
+        ("sin ataque", 0, {}),
+        ("ataque sin límite", ataque_por_login, {"LIMITE_LOGIN_RUT": "", "LIMITE_LOGIN_IP": ""}),
+        ("ataque con límite", ataque_por_login, {}),
+        ("tras proxy", ataque_por_login, {"PROXIES_CONFIABLES": [IP_PROXY]}),
+    ]
+    resultados = []
+    # Cada rechazo se registraría como advertencia
+    registro = logging.getLogger("django.request")
+    nivel = registro.level
+    registro.setLevel(logging.ERROR)
+    try:
+        for escenario, intentos, ajustes in escenarios:
+            resultados.append(_medir_escenario_login(escenario, intentos, ajustes, datos, repeticiones))
+    finally:
+        registro.setLevel(nivel)
+    return resultados
+
+
+def _clientes_login(tras_proxy):
+    """Clientes del atacante y del usuario legítimo, directos o tras el mismo proxy"""
+    if tras_proxy:
+        return (
+            Client(REMOTE_ADDR=IP_PROXY, HTTP_X_FORWARDED_FOR=IP_ATACANTE),
+            Client(REMOTE_ADDR=IP_PROXY, HTTP_X_FORWARDED_FOR=IP_LEGITIMO),
+        )
+    return Client(REMOTE_ADDR=IP_ATACANTE), Client(REMOTE_ADDR=IP_LEGITIMO)
+
+
+def _medir_escenario_login(escenario, intentos, ajustes, datos, repeticiones):
+    limites.reiniciar_todos()
+    tiempos, rechazados, numero = [], 0, 0
+    with override_settings(**ajustes):
+        for _ in range(repeticiones):
+            atacante, cliente = _clientes_login(bool(ajustes.get("PROXIES_CONFIABLES")))
+            inicio = time.perf_counter()
+            for _ in range(intentos):
+                numero += 1
+                response = atacante.post(reverse("login"), {"username": f"ataque-{numero}", "password": "x"})
+                rechazados += response.status_code == 429
+            response = cliente.post(reverse("login"), datos)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            if response.status_code != 302:
+                raise RuntimeError(f"login legítimo respondió {response.status_code} ({escenario})")
+    p50, p95 = _percentiles(tiempos)
+    return ResultadoLogin(escenario, p50, p95, intentos * repeticiones, rechazados)
+
+
+def ejecutar(cantidad, repeticiones=REPETICIONES):
+    """Siembra `cantidad` eventos y mide todos los endpoints"""
+    usuario = sembrar(cantidad)
+    client = Client()
+    client.force_login(usuario)
+    return [medir(client, endpoint, cantidad, repeticiones) for endpoint in endpoints(usuario)]
@@ -0,0 +1,156 @@
+"""
+Búsqueda de texto completo en el título y la descripción de los eventos.
+
+El índice depende del motor de base de datos (ver la migración 0007):
+
+- SQLite: una tabla virtual FTS5 de contenido externo (``core_evento_fts``)
+  que se mantiene con triggers sobre ``core_evento``. Los triggers también
+  cubren ``bulk_create`` y las actualizaciones masivas, que no emiten
+  señales. Se tokeniza sin acentos, así que "reunion" encuentra "Reunión".
+- PostgreSQL: una columna generada ``busqueda`` (tsvector en español, con el
+  título con más peso que la descripción) con un índice GIN.
+
+En ambos casos el resultado se ordena por relevancia y se pagina con LIMIT.
+Ninguna consulta recorre la tabla con LIKE.
+
+Si una migración futura reconstruye ``core_evento`` en SQLite (Django lo
+hace al alterar ciertas columnas), los triggers se pierden con la tabla
+original: ``manage.py reconstruir_busqueda`` los vuelve a crear.
+"""
+import re
+from dataclasses import dataclass
+from datetime import date
+
+from django.db import connection
+
+from .models import Evento
+
+POR_PAGINA = 20
+MAXIMO_TERMINOS = 10
+# Peso del título frente a la descripción en bm25
+PESO_TITULO = 10.0
+# Extremos usados cuando el rango de fechas queda abierto por un lado
+DESDE_MINIMO = date(1900, 1, 1)
+HASTA_MAXIMO = date(9000, 1, 1)
+
+SQLITE_INDICE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_evento_fts USING fts5(
+        titulo, descripcion,
+        content='core_evento', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_evento_fts_insertar AFTER INSERT ON core_evento BEGIN
+        INSERT INTO core_evento_fts(rowid, titulo, descripcion)
+        VALUES (new.id, new.titulo, new.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_evento_fts_eliminar AFTER DELETE ON core_evento BEGIN
+        INSERT INTO core_evento_fts(core_evento_fts, rowid, titulo, descripcion)
+        VALUES ('delete', old.id, old.titulo, old.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_evento_fts_actualizar
+    AFTER UPDATE OF titulo, descripcion ON core_evento BEGIN
+        INSERT INTO core_evento_fts(core_evento_fts, rowid, titulo, descripcion)
+        VALUES ('delete', old.id, old.titulo, old.descripcion);
+        INSERT INTO core_evento_fts(rowid, titulo, descripcion)
+        VALUES (new.id, new.titulo, new.descripcion);
+    END
+    """,
+]
+SQLITE_RECONSTRUIR = "INSERT INTO core_evento_fts(core_evento_fts) VALUES ('rebuild')"
+
+POSTGRESQL_INDICE = [
+    """
+    ALTER TABLE core_evento ADD COLUMN IF NOT EXISTS busqueda tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS core_evento_busqueda ON core_evento USING GIN (busqueda)",
+]
+
+
+def reconstruir():
+    """Crea el índice si falta y, en SQLite, lo recalcula desde core_evento"""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for sentencia in POSTGRESQL_INDICE:
+                cursor.execute(sentencia)
+            return
+        for sentencia in SQLITE_INDICE:
+            cursor.execute(sentencia)
+        cursor.execute(SQLITE_RECONSTRUIR)
+
+
+def consulta_fts5(texto):
+    """
+    Convierte el texto del usuario en una consulta FTS5: cada palabra como
+    frase entre comillas con búsqueda por prefijo, todas obligatorias. Así
+    los operadores y signos que escriba el usuario no son sintaxis de FTS5.
+    Retorna "" si no hay palabras.
+    """
+    terminos = re.findall(r"\w+", texto)[:MAXIMO_TERMINOS]
+    return " ".join(f'"{termino}"*' for termino in terminos)
+
+
+@dataclass
+class Resultados:
+    eventos: list
+    pagina: int
+    hay_siguiente: bool
+
+    @property
+    def hay_anterior(self):
+        return self.pagina > 1
+
+
+def _columnas():
+    return ", ".join(f"core_evento.{campo.column}" for campo in Evento._meta.concrete_fields)
+
+
+def buscar(usuario, texto, desde=None, hasta=None, pagina=1, por_pagina=POR_PAGINA):
+    """
+    Eventos de `usuario` cuyo título o descripción contiene las palabras de
+    `texto`, de mayor a menor relevancia (y luego del más reciente al más
+    antiguo). Si se indica [desde, hasta) solo se consideran los eventos que
+    ocurren en ese rango. Cada evento trae su `relevancia`.
+    """
+    eventos = Evento.objects.filter(usuario=usuario)
+    if desde or hasta:
+        eventos = eventos.overlapping(desde or DESDE_MINIMO, hasta or HASTA_MAXIMO)
+    filtro, parametros = eventos.values("id").query.sql_with_params()
+
+    if connection.vendor == "postgresql":
+        if not texto.strip():
+            return Resultados([], pagina, False)
+        sql = f"""
+            SELECT {_columnas()}, ts_rank_cd(core_evento.busqueda, consulta) AS relevancia
+            FROM core_evento, websearch_to_tsquery('spanish', %s) AS consulta
+            WHERE core_evento.busqueda @@ consulta AND core_evento.id IN ({filtro})
+            ORDER BY relevancia DESC, core_evento.fecha_inicio DESC, core_evento.id DESC
+            LIMIT %s OFFSET %s
+        """
+        parametros = [texto, *parametros]
+    else:
+        consulta = consulta_fts5(texto)
+        if not consulta:
+            return Resultados([], pagina, False)
+        # bm25 es menor mientras más relevante: se invierte el signo
+        sql = f"""
+            SELECT {_columnas()}, -bm25(core_evento_fts, {PESO_TITULO}, 1.0) AS relevancia
+            FROM core_evento_fts JOIN core_evento ON core_evento.id = core_evento_fts.rowid
+            WHERE core_evento_fts MATCH %s AND core_evento.id IN ({filtro})
+            ORDER BY relevancia DESC, core_evento.fecha_inicio DESC, core_evento.id DESC
+            LIMIT %s OFFSET %s
+        """
+        parametros = [consulta, *parametros]
+
+    # Se pide un resultado de más solo para saber si hay otra página
+    encontrados = list(Evento.objects.raw(sql, [*parametros, por_pagina + 1, (pagina - 1) * por_pagina]))
+    return Resultados(encontrados[:por_pagina], pagina, len(encontrados) > por_pagina)
@@ -0,0 +1,92 @@
+"""
+Caché de fragmentos renderizados del calendario.
+
+Cada fragmento se guarda bajo una clave que incluye una versión por usuario.
+Al crear, editar o eliminar un evento se incrementa la versión de su dueño
+(ver ``core.signals``), de modo que solo sus fragmentos quedan obsoletos; las
+entradas antiguas no se borran, simplemente dejan de leerse y el backend las
+desaloja por antigüedad.
+"""
+import time
+
+from django.core.cache import caches
+
+from .metricas import registrar_cache
+
+CACHE_CALENDARIO = 'calendario'
+
+
+def _cache():
+    return caches[CACHE_CALENDARIO]
+
+
+def _clave_version(usuario_id):
+    return f'calendario:version:{usuario_id}'
+
+
+def version_usuario(usuario_id):
+    """Retorna la versión vigente de los fragmentos de un usuario"""
+    cache = _cache()
+    clave = _clave_version(usuario_id)
+    version = cache.get(clave)
+    if version is None:
+        # Se parte desde la hora actual y no desde 1: si la clave fue desalojada,
+        # la nueva versión nunca coincide con la de fragmentos aún guardados
+        version = time.time_ns()
+        if not cache.add(clave, version, timeout=None):
+            version = cache.get(clave, version)
+    return version
+
+
+async def aversion_usuario(usuario_id):
+    """Versión asíncrona de version_usuario"""
+    cache = _cache()
+    clave = _clave_version(usuario_id)
+    version = await cache.aget(clave)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(clave, version, timeout=None):
+            version = await cache.aget(clave, version)
+    return version
+
+
+def invalidar_usuario(usuario_id):
+    """Deja obsoletos todos los fragmentos cacheados de un usuario"""
+    cache = _cache()
+    clave = _clave_version(usuario_id)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), timeout=None)
+
+
+def _clave_fragmento(usuario, vista, periodo, version):
+    return 'calendario:{}:{}:{}:{}:{}'.format(vista, usuario.pk, int(usuario.is_superuser), version, periodo)
+
+
+def obtener_fragmento(usuario, vista, periodo, construir):
+    """
+    Retorna el valor cacheado de `vista` para `periodo`, llamando a
+    `construir` solo cuando no está en caché. La clave incluye si el usuario
+    es administrador porque el fragmento muestra los botones de edición.
+    """
+    cache = _cache()
+    clave = _clave_fragmento(usuario, vista, periodo, version_usuario(usuario.pk))
+    fragmento = cache.get(clave)
+    registrar_cache(vista, fragmento is not None)
+    if fragmento is None:
+        fragmento = construir()
+        cache.set(clave, fragmento)
+    return fragmento
+
+
+async def aobtener_fragmento(usuario, vista, periodo, construir):
+    """Versión asíncrona de obtener_fragmento; `construir` es una corrutina"""
+    cache = _cache()
+    clave = _clave_fragmento(usuario, vista, periodo, await aversion_usuario(usuario.pk))
+    fragmento = await cache.aget(clave)
+    registrar_cache(vista, fragmento is not None)
+    if fragmento is None:
+        fragmento = await construir()
+        await cache.aset(clave, fragmento)
+    return fragmento
@@ -0,0 +1,166 @@
+"""
+Utilidades para armar las vistas del calendario a partir de los eventos
+ya obtenidos de la base de datos.
+
+Las grillas mensual y semanal (fechas, enlaces y navegación) no dependen
+del usuario: se calculan una vez por periodo con ``esqueleto_mensual`` y
+``esqueleto_semanal`` y cada request solo agrega los eventos de cada día.
+"""
+import calendar
+from collections import namedtuple
+from datetime import timedelta
+from functools import lru_cache
+
+from django.urls import get_script_prefix, reverse
+from django.utils import timezone
+
+NOMBRES_MESES = [
+    '', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+    'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'
+]
+
+# Posición que ocupa un día dentro de un evento: 'unico' si empieza y termina
+# ese día, 'inicio', 'fin' o 'continua' para los tramos de un evento multi-día
+EventoDelDia = namedtuple('EventoDelDia', ['evento', 'segmento'])
+
+DIAS_SEMANA = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
+# Periodos distintos que se memorizan por proceso
+ESQUELETOS_EN_MEMORIA = 256
+
+# Celda de una grilla: la fecha, el enlace a su vista diaria y si pertenece a
+# otro mes (la grilla mensual completa las semanas con días vecinos)
+DiaGrilla = namedtuple('DiaGrilla', ['fecha', 'url', 'fuera_del_mes'])
+
+EsqueletoMes = namedtuple('EsqueletoMes', [
+    'titulo', 'semanas', 'desde', 'hasta', 'url_anterior', 'url_siguiente', 'url_anual',
+])
+EsqueletoSemana = namedtuple('EsqueletoSemana', [
+    'dias', 'desde', 'hasta', 'anterior', 'siguiente', 'url_anterior', 'url_siguiente', 'url_mes',
+])
+
+
+def fecha_local(valor):
+    """Retorna la fecha de un datetime en la zona horaria activa"""
+    if timezone.is_aware(valor):
+        valor = timezone.localtime(valor)
+    return valor.date()
+
+
+def agrupar_eventos_por_mes(eventos, year):
+    """
+    Reparte los eventos de un año en 12 listas, una por mes.
+
+    Un evento multi-día aparece en cada mes que abarca. Como los eventos
+    llegan ordenados por fecha de inicio, cada lista conserva ese orden.
+    """
+    meses = [[] for _ in range(12)]
+    for evento in eventos:
+        inicio = fecha_local(evento.fecha_inicio)
+        fin = fecha_local(evento.fecha_fin)
+        primer_mes = inicio.month if inicio.year == year else 1
+        ultimo_mes = fin.month if fin.year == year else 12
+        for mes in range(primer_mes, ultimo_mes + 1):
+            meses[mes - 1].append(evento)
+    return meses
+
+
+def _segmento(inicio, fin, dia):
+    if inicio == dia and fin == dia:
+        return 'unico'
+    if inicio == dia:
+        return 'inicio'
+    if fin == dia:
+        return 'fin'
+    return 'continua'
+
+
+def indexar_eventos_por_dia(eventos, dias):
+    """
+    Construye un diccionario fecha -> lista de EventoDelDia para `dias`.
+
+    Recorre los días en orden manteniendo el conjunto de eventos activos
+    (barrido sobre los eventos ordenados por inicio), de modo que el costo
+    es lineal en días más eventos más apariciones, en lugar de comparar
+    cada evento contra cada día.
+    """
+    pendientes = sorted(
+        ((fecha_local(evento.fecha_inicio), fecha_local(evento.fecha_fin), evento) for evento in eventos),
+        key=lambda item: item[0]
+    )
+    activos = []
+    siguiente = 0
+    indice = {}
+    for dia in dias:
+        while siguiente < len(pendientes) and pendientes[siguiente][0] <= dia:
+            activos.append(pendientes[siguiente])
+            siguiente += 1
+        activos = [item for item in activos if item[1] >= dia]
+        indice[dia] = [
+            EventoDelDia(evento, _segmento(inicio, fin, dia))
+            for inicio, fin, evento in activos
+        ]
+    return indice
+
+
+def mes_relativo(year, month, meses):
+    """(año, mes) que está `meses` meses antes o después"""
+    year, indice = divmod(year * 12 + month - 1 + meses, 12)
+    return year, indice + 1
+
+
+def _dia_grilla(fecha, month=None):
+    url = reverse('calendario_diario', args=[fecha.year, fecha.month, fecha.day])
+    return DiaGrilla(fecha, url, month is not None and fecha.month != month)
+
+
+def esqueleto_mensual(year, month):
+    """
+    Grilla de la vista mensual sin eventos: semanas completas de lunes a
+    domingo, título y enlaces al mes anterior y siguiente. Se memoriza y se
+    comparte entre usuarios; no se debe modificar.
+    """
+    # Las URLs dependen del prefijo del script, que es parte de la clave
+    return _esqueleto_mensual(year, month, get_script_prefix())
+
+
+@lru_cache(maxsize=ESQUELETOS_EN_MEMORIA)
+def _esqueleto_mensual(year, month, prefijo):
+    semanas = tuple(
+        tuple(_dia_grilla(fecha, month) for fecha in semana)
+        for semana in calendar.Calendar().monthdatescalendar(year, month)
+    )
+    return EsqueletoMes(
+        titulo=f'{NOMBRES_MESES[month]} {year}',
+        semanas=semanas,
+        desde=semanas[0][0].fecha,
+        hasta=semanas[-1][-1].fecha + timedelta(days=1),
+        url_anterior=reverse('calendario_mensual', args=mes_relativo(year, month, -1)),
+        url_siguiente=reverse('calendario_mensual', args=mes_relativo(year, month, 1)),
+        url_anual=reverse('calendario_anual', args=[year]),
+    )
+
+
+def esqueleto_semanal(inicio):
+    """
+    Grilla de la vista semanal sin eventos para la semana ISO que comienza
+    el lunes `inicio`, con la semana anterior y la siguiente como pares
+    (año ISO, semana). Se memoriza igual que esqueleto_mensual.
+    """
+    return _esqueleto_semanal(inicio, get_script_prefix())
+
+
+@lru_cache(maxsize=ESQUELETOS_EN_MEMORIA)
+def _esqueleto_semanal(inicio, prefijo):
+    # Algunos años ISO tienen 53 semanas
+    anterior = tuple((inicio - timedelta(weeks=1)).isocalendar()[:2])
+    siguiente = tuple((inicio + timedelta(weeks=1)).isocalendar()[:2])
+    return EsqueletoSemana(
+        dias=tuple(_dia_grilla(inicio + timedelta(days=numero)) for numero in range(7)),
+        desde=inicio,
+        hasta=inicio + timedelta(days=7),
+        anterior=anterior,
+        siguiente=siguiente,
+        url_anterior=reverse('calendario_semanal', args=anterior),
+        url_siguiente=reverse('calendario_semanal', args=siguiente),
+        url_mes=reverse('calendario_mensual', args=[inicio.year, inicio.month]),
+    )
@@ -0,0 +1,75 @@
+"""
+Verificaciones de configuración (``manage.py check``).
+
+Algunas cachés guardan estado que todos los procesos deben ver igual (ver
+``CACHES_COMPARTIDAS``). Con un backend local cada worker tiene su propia
+copia, así que con ``PROCESOS`` mayor a 1 es un error. Con un solo proceso
+se permite, pero ``check --deploy`` lo advierte por si se olvidó declarar
+la cantidad de workers.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+BACKENDS_LOCALES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+# Alias -> qué falla si la caché no es compartida
+CACHES_COMPARTIDAS = {
+    'calendario': (
+        "invalidar los fragmentos de un usuario solo afecta al proceso que atendió "
+        "la escritura; los demás siguen sirviendo páginas y ETags viejos"
+    ),
+    'sesiones': (
+        "cerrar sesión o cambiar la clave en un proceso no invalida la sesión "
+        "cacheada en los demás, que la siguen aceptando"
+    ),
+    'limites': (
+        "cada proceso tiene sus propios buckets, así que los intentos de inicio de "
+        "sesión permitidos por RUT e IP se multiplican por la cantidad de workers"
+    ),
+}
+MOTORES_SESION_CON_CACHE = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+def _en_uso(alias):
+    if alias == settings.SESSION_CACHE_ALIAS:
+        return settings.SESSION_ENGINE in MOTORES_SESION_CON_CACHE
+    if alias == 'limites':
+        return bool(settings.LIMITE_LOGIN_RUT or settings.LIMITE_LOGIN_IP)
+    return True
+
+
+def _caches_locales():
+    for alias, motivo in CACHES_COMPARTIDAS.items():
+        if _en_uso(alias) and settings.CACHES.get(alias, {}).get('BACKEND') in BACKENDS_LOCALES:
+            yield alias, motivo
+
+
+@register(Tags.caches)
+def revisar_caches_compartidas(app_configs, **kwargs):
+    if settings.PROCESOS <= 1:
+        return []
+    return [
+        Error(
+            f"La caché '{alias}' es local a cada proceso y DIDACTA_PROCESOS={settings.PROCESOS}: {motivo}.",
+            hint="Configure un backend compartido, p. ej. Redis (ver README).",
+            id='core.E001',
+        )
+        for alias, motivo in _caches_locales()
+    ]
+
+
+@register(Tags.caches, deploy=True)
+def advertir_caches_locales(app_configs, **kwargs):
+    if settings.PROCESOS > 1:
+        return []
+    return [
+        Warning(
+            f"La caché '{alias}' es local a cada proceso: solo es correcta con un único worker.",
+            hint="Con varios workers declare DIDACTA_PROCESOS y configure un backend compartido.",
+            id='core.W001',
+        )
+        for alias, _ in _caches_locales()
+    ]
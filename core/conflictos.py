@@ -0,0 +1,94 @@
+"""
+Detección de eventos superpuestos de un mismo usuario.
+
+Dos eventos están en conflicto si se cruzan en al menos un instante; los que
+solo se tocan (uno termina cuando el otro comienza) no lo están. Los eventos
+de cada consulta se obtienen con una sola consulta por rango (``overlapping``,
+que usa los índices por usuario y fecha) y las series recurrentes se
+expanden dentro del rango.
+
+Los pares en conflicto se obtienen con un barrido: los eventos se ordenan
+por inicio y se mantiene un heap con los términos de los eventos activos.
+Cada evento entra en conflicto con los activos que aún no terminan, así que
+el costo es O(n log n + k) para k conflictos, en lugar de comparar todos los
+pares.
+"""
+import copy
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Evento, rango_datetimes
+from .recurrencia import calcular_fin_serie, expandir_eventos
+
+# Hasta dónde se revisan las ocurrencias de una serie (sin fin o muy larga)
+HORIZONTE_SERIES = timedelta(days=365)
+
+Conflicto = namedtuple('Conflicto', ['primero', 'segundo'])
+
+
+def barrer(eventos):
+    """
+    Pares de eventos superpuestos del mismo usuario, en orden de inicio.
+    `eventos` puede venir en cualquier orden.
+    """
+    ordenados = sorted(eventos, key=lambda evento: (evento.usuario_id, evento.fecha_inicio, evento.fecha_fin))
+    conflictos = []
+    activos = []  # heap de (fecha_fin, posición, evento)
+    usuario_actual = None
+    for posicion, evento in enumerate(ordenados):
+        if evento.usuario_id != usuario_actual:
+            usuario_actual = evento.usuario_id
+            activos = []
+        while activos and activos[0][0] <= evento.fecha_inicio:
+            heapq.heappop(activos)
+        conflictos.extend(Conflicto(activo, evento) for _, _, activo in sorted(activos, key=lambda item: item[1]))
+        heapq.heappush(activos, (evento.fecha_fin, posicion, evento))
+    return conflictos
+
+
+def conflictos_en_rango(eventos, desde, hasta):
+    """
+    Todos los conflictos entre los `eventos` (un queryset, p. ej. los de un
+    usuario o todos) que ocurren en [desde, hasta)
+    """
+    candidatos = eventos.overlapping(desde, hasta).select_related('usuario').order_by('usuario_id', 'fecha_inicio')
+    desde, hasta = rango_datetimes(desde, hasta)
+    return barrer(expandir_eventos(list(candidatos), desde, hasta))
+
+
+def conflictos_de(evento):
+    """
+    Eventos del mismo usuario que se superponen con `evento`, nuevo o
+    editado (aún sin guardar). Si es una serie, se revisan sus ocurrencias
+    hasta el fin de la serie, como máximo durante HORIZONTE_SERIES.
+    Retorna los pares (ocurrencia de `evento`, evento existente).
+    """
+    desde = evento.fecha_inicio
+    if evento.recurrencia:
+        horizonte = evento.fecha_inicio + HORIZONTE_SERIES
+        hasta = min(calcular_fin_serie(evento) or horizonte, horizonte)
+    else:
+        hasta = evento.fecha_fin
+    existentes = Evento.objects.filter(usuario_id=evento.usuario_id).overlapping(desde, hasta)
+    if evento.pk:
+        existentes = existentes.exclude(pk=evento.pk)
+    # Marca para distinguir las ocurrencias del evento revisado en el barrido
+    propio = copy.copy(evento)
+    propio._revisado = True
+    ocurrencias = expandir_eventos([propio, *existentes], desde, hasta)
+    return [
+        (primero, segundo) if getattr(primero, '_revisado', False) else (segundo, primero)
+        for primero, segundo in barrer(ocurrencias)
+        if getattr(primero, '_revisado', False) != getattr(segundo, '_revisado', False)
+    ]
+
+
+def describir(evento):
+    """Texto corto para mostrar un evento en mensajes de conflicto"""
+    inicio = timezone.localtime(evento.fecha_inicio)
+    fin = timezone.localtime(evento.fecha_fin)
+    formato_fin = '%H:%M' if inicio.date() == fin.date() else '%d/%m/%Y %H:%M'
+    return f"«{evento.titulo}» ({inicio:%d/%m/%Y %H:%M}–{fin.strftime(formato_fin)})"
@@ -0,0 +1,166 @@
+"""
+Conteos diarios de eventos por usuario (``ConteoDiario``).
+
+Los resúmenes del calendario anual se leen de esta tabla, que tiene a lo
+más 366 filas por usuario y año, en lugar de recorrer los eventos. Las filas
+se mantienen de forma incremental: cada alta, edición o baja de un evento
+suma o resta 1 en los días que abarca (ver ``core.signals``). Los
+incrementos se hacen con expresiones F, así que dos escrituras concurrentes
+no pisan sus cambios.
+
+Las series recurrentes no se cuentan aquí porque pueden no tener fin; sus
+ocurrencias se calculan al leer. Si cambia TIME_ZONE, los días locales
+cambian y la tabla se debe reconstruir con ``manage.py reconstruir_conteos``.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import ExtractMonth
+
+from .calendario import fecha_local
+from .models import ConteoDiario, Evento, EventoArchivado
+
+TAMANO_LOTE = 1000
+
+
+def dias_evento(fecha_inicio, fecha_fin):
+    """
+    Días locales que abarca un evento, como pares (fecha, es_primero_del_mes)
+    """
+    dia = fecha_local(fecha_inicio)
+    fin = fecha_local(fecha_fin)
+    resultado = [(dia, True)]
+    while dia < fin:
+        dia += timedelta(days=1)
+        resultado.append((dia, dia.day == 1))
+    return resultado
+
+
+def deltas_evento(fecha_inicio, fecha_fin, signo=1):
+    """Cambios {fecha: (cantidad, nuevos_en_mes)} que produce un evento"""
+    return {
+        dia: (signo, signo if primero else 0)
+        for dia, primero in dias_evento(fecha_inicio, fecha_fin)
+    }
+
+
+def combinar_deltas(*grupos):
+    total = defaultdict(lambda: [0, 0])
+    for deltas in grupos:
+        for dia, (cantidad, nuevos) in deltas.items():
+            total[dia][0] += cantidad
+            total[dia][1] += nuevos
+    return {dia: tuple(valores) for dia, valores in total.items() if valores != [0, 0]}
+
+
+def aplicar_deltas(usuario_id, deltas):
+    """
+    Aplica los cambios a las filas del usuario con a lo más dos consultas:
+    crea las filas que faltan y las actualiza con un solo UPDATE, que suma a
+    cada día su incremento con un CASE. Solo se crean filas para los días que
+    suman eventos: los que restan ya tienen su fila (y al eliminar un usuario
+    sus filas pueden haberse borrado antes que sus eventos).
+    """
+    if not deltas:
+        return
+    nuevas = [ConteoDiario(usuario_id=usuario_id, fecha=dia) for dia, (cantidad, _) in deltas.items() if cantidad > 0]
+    if nuevas:
+        ConteoDiario.objects.bulk_create(nuevas, ignore_conflicts=True, batch_size=TAMANO_LOTE)
+    ConteoDiario.objects.filter(usuario_id=usuario_id, fecha__in=deltas).update(
+        cantidad=F('cantidad') + _incrementos(deltas, 0),
+        nuevos_en_mes=F('nuevos_en_mes') + _incrementos(deltas, 1),
+    )
+
+
+def _incrementos(deltas, posicion):
+    """CASE que asigna a cada fecha su incremento, agrupando fechas con el mismo valor"""
+    por_valor = defaultdict(list)
+    for dia, valores in deltas.items():
+        if valores[posicion]:
+            por_valor[valores[posicion]].append(dia)
+    if not por_valor:
+        return Value(0)
+    return Case(
+        *(When(fecha__in=dias, then=Value(valor)) for valor, dias in por_valor.items()),
+        default=Value(0),
+    )
+
+
+def registrar_cambio(anterior, actual):
+    """
+    Actualiza los conteos por el cambio de un evento. `anterior` y `actual`
+    son tuplas (usuario_id, fecha_inicio, fecha_fin, recurrencia), o None si
+    el evento no existía o ya no existe.
+    """
+    por_usuario = defaultdict(list)
+    for estado, signo in ((anterior, -1), (actual, 1)):
+        if estado is not None and not estado[3]:
+            usuario_id, fecha_inicio, fecha_fin, _ = estado
+            por_usuario[usuario_id].append(deltas_evento(fecha_inicio, fecha_fin, signo))
+    for usuario_id, grupos in por_usuario.items():
+        aplicar_deltas(usuario_id, combinar_deltas(*grupos))
+
+
+def sumar_eventos(eventos):
+    """Suma a los conteos eventos creados sin señales (p. ej. con bulk_create)"""
+    por_usuario = defaultdict(list)
+    for evento in eventos:
+        if not evento.recurrencia:
+            por_usuario[evento.usuario_id].append(deltas_evento(evento.fecha_inicio, evento.fecha_fin))
+    for usuario_id, grupos in por_usuario.items():
+        aplicar_deltas(usuario_id, combinar_deltas(*grupos))
+
+
+def reconstruir(usuarios=None):
+    """
+    Recalcula desde cero los conteos de `usuarios` (un queryset o lista de
+    ids; todos si es None). Retorna la cantidad de filas creadas.
+    """
+    # Los eventos archivados se siguen contando (ver core.archivo)
+    tablas = [Evento.objects.filter(recurrencia=''), EventoArchivado.objects.filter(recurrencia='')]
+    existentes = ConteoDiario.objects.all()
+    if usuarios is not None:
+        tablas = [eventos.filter(usuario__in=usuarios) for eventos in tablas]
+        existentes = existentes.filter(usuario__in=usuarios)
+
+    cantidades = Counter()
+    nuevos = Counter()
+    filas = chain.from_iterable(
+        eventos.values_list('usuario_id', 'fecha_inicio', 'fecha_fin').iterator(chunk_size=TAMANO_LOTE)
+        for eventos in tablas
+    )
+    for usuario_id, fecha_inicio, fecha_fin in filas:
+        for dia, primero in dias_evento(fecha_inicio, fecha_fin):
+            cantidades[usuario_id, dia] += 1
+            if primero:
+                nuevos[usuario_id, dia] += 1
+
+    with transaction.atomic():
+        existentes.delete()
+        ConteoDiario.objects.bulk_create(
+            [
+                ConteoDiario(usuario_id=usuario_id, fecha=dia, cantidad=cantidad, nuevos_en_mes=nuevos[usuario_id, dia])
+                for (usuario_id, dia), cantidad in cantidades.items()
+            ],
+            batch_size=TAMANO_LOTE,
+        )
+    return len(cantidades)
+
+
+def resumen_por_mes(usuario, desde, hasta):
+    """
+    Consulta con una fila (mes, eventos distintos del mes) por cada mes de
+    [desde, hasta) que tiene eventos
+    """
+    return (
+        ConteoDiario.objects.filter(usuario=usuario, fecha__gte=desde, fecha__lt=hasta)
+        .annotate(mes=ExtractMonth('fecha'))
+        .values('mes')
+        .annotate(eventos=Sum('nuevos_en_mes'))
+        .filter(eventos__gt=0)
+        .order_by('mes')
+        .values_list('mes', 'eventos')
+    )
@@ -1,12 +1,40 @@
 
+import copy
+from datetime import date
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.core.exceptions import ValidationError
+from django.forms.models import construct_instance
+from .conflictos import conflictos_de, describir
 from .models import Evento, Usuario
+from .recurrencia import REPETICIONES_MAXIMAS
+
+# Conflictos que se listan al validar un evento
+MAXIMO_CONFLICTOS = 5
 
 class EventoForm(forms.ModelForm):
+    # El intervalo es opcional en el formulario: vacío equivale a 1
+    intervalo = forms.IntegerField(
+        min_value=1, required=False, label="Cada",
+        widget=forms.NumberInput(attrs={"class": "form-control"})
+    )
+    excepciones = forms.CharField(
+        required=False, label="Fechas excluidas",
+        help_text="Fechas a omitir de la serie (AAAA-MM-DD), separadas por comas.",
+        widget=forms.TextInput(attrs={"class": "form-control"})
+    )
+    ignorar_conflictos = forms.BooleanField(
+        required=False, label="Guardar aunque se superponga con otros eventos",
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"})
+    )
+
     class Meta:
         model = Evento
-        fields = ["titulo", "descripcion", "fecha_inicio", "fecha_fin"]
+        fields = [
+            "titulo", "descripcion", "fecha_inicio", "fecha_fin",
+            "recurrencia", "intervalo", "repetir_hasta", "repeticiones", "excepciones",
+        ]
         widgets = {
             "fecha_inicio": forms.DateTimeInput(attrs={
                 "type": "datetime-local",
@@ -22,8 +50,87 @@ class EventoForm(forms.ModelForm):
             "descripcion": forms.Textarea(attrs={
                 "class": "form-control"
             }),
+            "recurrencia": forms.Select(attrs={
+                "class": "form-select"
+            }),
+            "repetir_hasta": forms.DateInput(attrs={
+                "type": "date",
+                "class": "form-control"
+            }),
+            "repeticiones": forms.NumberInput(attrs={
+                "class": "form-control",
+                "min": 1,
+                "max": REPETICIONES_MAXIMAS,
+            }),
         }
 
+    def __init__(self, *args, usuario=None, **kwargs):
+        # Sin usuario no se revisan los conflictos de horario
+        self.usuario = usuario
+        super().__init__(*args, **kwargs)
+        self.fields["recurrencia"].choices = [("", "No se repite")] + list(self.fields["recurrencia"].choices)[1:]
+        if self.instance.pk:
+            self.initial["excepciones"] = ", ".join(self.instance.excepciones or [])
+
+    def clean_intervalo(self):
+        return self.cleaned_data.get("intervalo") or 1
+
+    def clean_excepciones(self):
+        """Convierte el texto en una lista ordenada de fechas ISO"""
+        fechas = set()
+        for valor in self.cleaned_data.get("excepciones", "").split(","):
+            valor = valor.strip()
+            if not valor:
+                continue
+            try:
+                fechas.add(date.fromisoformat(valor).isoformat())
+            except ValueError:
+                raise forms.ValidationError(f"'{valor}' no es una fecha válida (AAAA-MM-DD).")
+        return sorted(fechas)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.usuario is None or self.errors or cleaned_data.get("ignorar_conflictos"):
+            return cleaned_data
+        candidato = construct_instance(self, copy.copy(self.instance), self._meta.fields)
+        candidato.usuario = self.usuario
+        try:
+            candidato.clean()
+        except ValidationError:
+            return cleaned_data  # El modelo reporta el error al validar la instancia
+        conflictos = conflictos_de(candidato)
+        if conflictos:
+            existentes = list({existente.pk: existente for _, existente in conflictos}.values())
+            mensajes = [f"Se superpone con {describir(existente)}." for existente in existentes[:MAXIMO_CONFLICTOS]]
+            if len(existentes) > MAXIMO_CONFLICTOS:
+                mensajes.append(f"Y con {len(existentes) - MAXIMO_CONFLICTOS} eventos más.")
+            raise forms.ValidationError(mensajes)
+        return cleaned_data
+
+class BusquedaForm(forms.Form):
+    q = forms.CharField(
+        max_length=200, label="Buscar",
+        widget=forms.TextInput(attrs={"class": "form-control", "type": "search", "placeholder": "Buscar eventos"})
+    )
+    desde = forms.DateField(
+        required=False, label="Desde",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control"})
+    )
+    hasta = forms.DateField(
+        required=False, label="Hasta",
+        help_text="Incluye el día indicado.",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control"})
+    )
+    pagina = forms.IntegerField(min_value=1, required=False, widget=forms.HiddenInput)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde = cleaned_data.get("desde")
+        hasta = cleaned_data.get("hasta")
+        if desde and hasta and hasta < desde:
+            raise forms.ValidationError("La fecha final no puede ser anterior a la inicial.")
+        return cleaned_data
+
 class CustomUserCreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = Usuario
@@ -0,0 +1,147 @@
+"""
+Generación de documentos iCalendar (RFC 5545) a partir de filas de eventos.
+
+Las funciones trabajan sobre tuplas obtenidas con ``values_list`` y producen
+el documento línea por línea, para poder enviarlo en streaming sin armarlo
+completo en memoria.
+"""
+from datetime import date, datetime, time, timezone as dt_timezone
+
+from django.core import signing
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from .models import Usuario
+
+SALT_SUSCRIPCION = "core.ical.suscripcion"
+PRODID = "-//Didacta//Calendario//ES"
+CAMPOS_ICS = (
+    "id", "titulo", "descripcion", "fecha_inicio", "fecha_fin", "updated_at",
+    "recurrencia", "intervalo", "repetir_hasta", "repeticiones", "excepciones",
+)
+FRECUENCIAS_RRULE = {"diaria": "DAILY", "semanal": "WEEKLY", "mensual": "MONTHLY"}
+
+
+def escapar_texto(valor):
+    """Escapa un valor de texto según la sección 3.3.11 del RFC 5545"""
+    return (
+        valor.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def plegar_linea(linea):
+    """
+    Divide una línea de contenido en tramos de a lo más 75 octetos, sin
+    cortar caracteres UTF-8 multibyte, y la termina en CRLF.
+    """
+    datos = linea.encode("utf-8")
+    if len(datos) <= 75:
+        return linea + "\r\n"
+    tramos = []
+    inicio = 0
+    limite = 75
+    while inicio < len(datos):
+        fin = min(inicio + limite, len(datos))
+        # Retroceder si el corte cae en medio de un carácter multibyte
+        while fin < len(datos) and (datos[fin] & 0xC0) == 0x80:
+            fin -= 1
+        tramos.append(datos[inicio:fin].decode("utf-8"))
+        inicio = fin
+        limite = 74  # Las líneas de continuación empiezan con un espacio
+    return "\r\n ".join(tramos) + "\r\n"
+
+
+def formatear_fecha(valor):
+    return valor.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def generar_rrule(recurrencia, intervalo, repetir_hasta, repeticiones):
+    partes = [f"FREQ={FRECUENCIAS_RRULE[recurrencia]}", f"INTERVAL={intervalo}"]
+    if repetir_hasta:
+        # Fin del último día en la zona horaria activa
+        hasta = timezone.make_aware(datetime.combine(repetir_hasta, time(23, 59, 59)))
+        partes.append(f"UNTIL={formatear_fecha(hasta)}")
+    if repeticiones:
+        partes.append(f"COUNT={repeticiones}")
+    return "RRULE:" + ";".join(partes)
+
+
+def generar_vevent(fila, dominio="didacta"):
+    (pk, titulo, descripcion, fecha_inicio, fecha_fin, modificado,
+     recurrencia, intervalo, repetir_hasta, repeticiones, excepciones) = fila
+    lineas = [
+        "BEGIN:VEVENT",
+        f"UID:evento-{pk}@{dominio}",
+        f"DTSTAMP:{formatear_fecha(modificado)}",
+        f"DTSTART:{formatear_fecha(fecha_inicio)}",
+        f"DTEND:{formatear_fecha(fecha_fin)}",
+        f"SUMMARY:{escapar_texto(titulo)}",
+    ]
+    if descripcion:
+        lineas.append(f"DESCRIPTION:{escapar_texto(descripcion)}")
+    if recurrencia:
+        lineas.append(generar_rrule(recurrencia, intervalo, repetir_hasta, repeticiones))
+        # Las excepciones se guardan como fechas; la hora es la del inicio de la serie
+        hora = timezone.localtime(fecha_inicio).time()
+        for fecha in excepciones or ():
+            excluida = timezone.make_aware(datetime.combine(date.fromisoformat(fecha), hora))
+            lineas.append(f"EXDATE:{formatear_fecha(excluida)}")
+    lineas.append("END:VEVENT")
+    return "".join(plegar_linea(linea) for linea in lineas)
+
+
+def _encabezado(nombre):
+    return (
+        plegar_linea("BEGIN:VCALENDAR")
+        + plegar_linea("VERSION:2.0")
+        + plegar_linea(f"PRODID:{PRODID}")
+        + plegar_linea("CALSCALE:GREGORIAN")
+        + plegar_linea(f"X-WR-CALNAME:{escapar_texto(nombre)}")
+    )
+
+
+def generar_calendario(filas, nombre="Didacta"):
+    """Produce el documento VCALENDAR por partes, un evento a la vez"""
+    yield _encabezado(nombre)
+    for fila in filas:
+        yield generar_vevent(fila)
+    yield plegar_linea("END:VCALENDAR")
+
+
+async def agenerar_calendario(filas, nombre="Didacta"):
+    """
+    Versión asíncrona de generar_calendario para filas leídas con
+    aiterar(): bajo ASGI Django cargaría completo un iterador síncrono
+    antes de enviar el primer byte
+    """
+    yield _encabezado(nombre)
+    async for fila in filas:
+        yield generar_vevent(fila)
+    yield plegar_linea("END:VCALENDAR")
+
+
+def token_suscripcion(usuario):
+    """
+    Token firmado para la URL de suscripción de un usuario. Incluye parte
+    del hash de sesión, así que cambiar la contraseña revoca los enlaces
+    entregados anteriormente.
+    """
+    return signing.dumps(
+        {"u": usuario.pk, "h": usuario.get_session_auth_hash()[:16]}, salt=SALT_SUSCRIPCION
+    )
+
+
+def usuario_desde_token(token):
+    """Retorna el usuario activo dueño del token, o None si no es válido"""
+    try:
+        datos = signing.loads(token, salt=SALT_SUSCRIPCION)
+        usuario = Usuario.objects.get(pk=datos["u"], is_active=True)
+    except (signing.BadSignature, Usuario.DoesNotExist, KeyError, TypeError):
+        return None
+    if not constant_time_compare(usuario.get_session_auth_hash()[:16], datos.get("h", "")):
+        return None
+    return usuario
@@ -0,0 +1,218 @@
+"""
+Importación masiva de eventos desde archivos CSV o iCalendar (.ics).
+
+Los archivos se leen como flujo de líneas y se procesan por lotes: cada lote
+se valida columna por columna con las mismas reglas de ``Evento.clean`` (sin
+llamar a ``full_clean`` por instancia) y se inserta con ``bulk_create``. Todo
+ocurre dentro de una transacción, así que una importación fallida no deja
+eventos a medias.
+"""
+import csv
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import islice
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidar_usuario
+from .conteos import sumar_eventos
+from .models import DURACION_MAXIMA_EVENTO, Evento
+
+FORMATOS = ("csv", "ics")
+TAMANO_LOTE = 1000
+LARGO_TITULO = Evento._meta.get_field("titulo").max_length
+
+
+@dataclass
+class ResultadoImportacion:
+    creados: int = 0
+    rechazados: list = field(default_factory=list)  # (línea, motivo)
+    segundos: float = 0.0
+
+    @property
+    def eventos_por_segundo(self):
+        return self.creados / self.segundos if self.segundos else 0.0
+
+
+def detectar_formato(nombre):
+    return "ics" if nombre.lower().endswith((".ics", ".ical")) else "csv"
+
+
+def leer_csv(lineas):
+    """
+    Filas de un CSV con columnas titulo, descripcion, fecha_inicio y
+    fecha_fin (ISO 8601). Retorna tuplas (línea, datos).
+    """
+    lector = csv.DictReader(lineas)
+    for fila in lector:
+        yield lector.line_num, {
+            "titulo": (fila.get("titulo") or "").strip(),
+            "descripcion": (fila.get("descripcion") or "").strip() or None,
+            "fecha_inicio": (fila.get("fecha_inicio") or "").strip(),
+            "fecha_fin": (fila.get("fecha_fin") or "").strip(),
+        }
+
+
+def _desplegar(lineas):
+    """Une las líneas plegadas de un iCalendar (RFC 5545, sección 3.1)"""
+    actual = None
+    inicio = 0
+    for numero, linea in enumerate(lineas, start=1):
+        linea = linea.rstrip("\r\n")
+        if linea[:1] in (" ", "\t") and actual is not None:
+            actual += linea[1:]
+            continue
+        if actual is not None:
+            yield inicio, actual
+        actual, inicio = linea, numero
+    if actual is not None:
+        yield inicio, actual
+
+
+def _desescapar(valor):
+    resultado = []
+    caracteres = iter(valor)
+    for caracter in caracteres:
+        if caracter == "\\":
+            siguiente = next(caracteres, "")
+            resultado.append("\n" if siguiente in ("n", "N") else siguiente)
+        else:
+            resultado.append(caracter)
+    return "".join(resultado)
+
+
+def _fecha_ics(parametros, valor):
+    """Convierte un DTSTART/DTEND a datetime; None si no se reconoce"""
+    try:
+        if parametros.get("VALUE") == "DATE" or len(valor) == 8:
+            return timezone.make_aware(datetime.strptime(valor, "%Y%m%d")), True
+        if valor.endswith("Z"):
+            return datetime.strptime(valor, "%Y%m%dT%H%M%SZ").replace(tzinfo=ZoneInfo("UTC")), False
+        fecha = datetime.strptime(valor, "%Y%m%dT%H%M%S")
+        if "TZID" in parametros:
+            return fecha.replace(tzinfo=ZoneInfo(parametros["TZID"])), False
+        return timezone.make_aware(fecha), False
+    except (ValueError, ZoneInfoNotFoundError):
+        return None, False
+
+
+def leer_ics(lineas):
+    """
+    Eventos (VEVENT) de un archivo iCalendar. Las fechas se entregan ya
+    convertidas; los eventos de día completo terminan a las 23:59 del último
+    día para no aparecer también en el día siguiente.
+    """
+    evento = None
+    for numero, linea in _desplegar(lineas):
+        nombre, _, valor = linea.partition(":")
+        nombre, *parametros = nombre.split(";")
+        nombre = nombre.upper()
+        parametros = dict(p.split("=", 1) for p in parametros if "=" in p)
+        if nombre == "BEGIN" and valor.upper() == "VEVENT":
+            evento = {"linea": numero, "titulo": "", "descripcion": None,
+                      "fecha_inicio": None, "fecha_fin": None}
+        elif evento is None:
+            continue
+        elif nombre == "SUMMARY":
+            evento["titulo"] = _desescapar(valor).strip()
+        elif nombre == "DESCRIPTION":
+            evento["descripcion"] = _desescapar(valor).strip() or None
+        elif nombre in ("DTSTART", "DTEND"):
+            fecha, dia_completo = _fecha_ics(parametros, valor)
+            if fecha is not None and nombre == "DTEND" and dia_completo:
+                fecha -= timedelta(minutes=1)
+            evento["fecha_inicio" if nombre == "DTSTART" else "fecha_fin"] = fecha or valor
+        elif nombre == "END" and valor.upper() == "VEVENT":
+            yield evento.pop("linea"), evento
+            evento = None
+
+
+def _como_fecha(valor):
+    if isinstance(valor, datetime):
+        return valor
+    if not valor:
+        return None
+    try:
+        fecha = parse_datetime(valor)
+    except ValueError:
+        return None
+    if fecha is not None and timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def validar_lote(lote):
+    """
+    Valida un lote de filas (línea, datos) aplicando cada regla a la columna
+    completa. Retorna (válidas, rechazadas) con rechazadas como (línea, motivo).
+    """
+    lineas = [linea for linea, _ in lote]
+    titulos = [datos["titulo"] for _, datos in lote]
+    inicios = [_como_fecha(datos["fecha_inicio"]) for _, datos in lote]
+    fines = [_como_fecha(datos["fecha_fin"]) for _, datos in lote]
+
+    motivos = [None] * len(lote)
+    reglas = (
+        ([not titulo for titulo in titulos], "El título es obligatorio."),
+        ([len(titulo) > LARGO_TITULO for titulo in titulos],
+         f"El título supera los {LARGO_TITULO} caracteres."),
+        ([inicio is None for inicio in inicios], "La fecha de inicio no es válida."),
+        ([fin is None for fin in fines], "La fecha de fin no es válida."),
+        # Misma regla que Evento.clean
+        ([inicio is not None and fin is not None and fin <= inicio for inicio, fin in zip(inicios, fines)],
+         "La fecha de fin debe ser posterior a la fecha de inicio."),
+        ([inicio is not None and fin is not None and fin - inicio > DURACION_MAXIMA_EVENTO
+          for inicio, fin in zip(inicios, fines)],
+         f"Un evento no puede durar más de {DURACION_MAXIMA_EVENTO.days} días."),
+    )
+    for fallas, motivo in reglas:
+        for posicion, falla in enumerate(fallas):
+            if falla and motivos[posicion] is None:
+                motivos[posicion] = motivo
+
+    validas = []
+    rechazadas = []
+    for posicion, motivo in enumerate(motivos):
+        if motivo:
+            rechazadas.append((lineas[posicion], motivo))
+        else:
+            validas.append({
+                "titulo": titulos[posicion],
+                "descripcion": lote[posicion][1]["descripcion"],
+                "fecha_inicio": inicios[posicion],
+                "fecha_fin": fines[posicion],
+            })
+    return validas, rechazadas
+
+
+def importar_eventos(lineas, usuario, formato="csv", tamano_lote=TAMANO_LOTE):
+    """
+    Importa los eventos de `lineas` (un iterable de líneas de texto) para
+    `usuario`. Retorna un ResultadoImportacion con la cantidad creada, las
+    filas rechazadas y el tiempo empleado.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+    filas = leer_ics(lineas) if formato == "ics" else leer_csv(lineas)
+    resultado = ResultadoImportacion()
+    inicio = time.perf_counter()
+
+    with transaction.atomic():
+        while lote := list(islice(filas, tamano_lote)):
+            validas, rechazadas = validar_lote(lote)
+            resultado.rechazados.extend(rechazadas)
+            creados = Evento.objects.bulk_create(
+                [Evento(usuario=usuario, **datos) for datos in validas],
+                batch_size=tamano_lote,
+            )
+            resultado.creados += len(validas)
+            # bulk_create no emite señales: actualizar los conteos y la caché a mano
+            sumar_eventos(creados)
+        transaction.on_commit(lambda: invalidar_usuario(usuario.pk))
+
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
@@ -0,0 +1,192 @@
+"""
+Límite de intentos de inicio de sesión con token buckets.
+
+Cada intento consume una ficha de dos buckets: uno por RUT y otro por IP del
+cliente (las IPv6 se agrupan por /64, que es lo que suele tener un solo
+cliente). Detrás de un proxy inverso, REMOTE_ADDR es la IP del proxy y todos
+los clientes compartirían el bucket: los proxies se declaran en
+PROXIES_CONFIABLES y la IP del cliente se toma de X-Forwarded-For. Si el
+cliente no se puede determinar, el intento solo consume del bucket del RUT.
+Si alguno está vacío el intento se rechaza con 429 y Retry-After
+antes de calcular el hash de la contraseña, que es lo caro (PBKDF2). Un
+inicio de sesión exitoso devuelve las fichas del RUT.
+
+Un bucket de capacidad N y periodo S admite ráfagas de N intentos y se
+recarga a N/S fichas por segundo. Se guarda en la caché ``limites`` como
+(fichas, instante) y la recarga se calcula al leerlo, así que no hay tareas
+periódicas. La caché debe ser compartida entre procesos (p. ej. Redis) para
+que el límite sea global; leer y escribir no es atómico, por lo que dos
+intentos simultáneos pueden consumir la misma ficha y dejar pasar unos pocos
+intentos de más.
+
+Al rechazar, cada proceso recuerda hasta cuándo estará vacío el bucket y
+rechaza los intentos siguientes sin consultar la caché, así que una ráfaga
+contra un mismo RUT o IP cuesta una búsqueda en un diccionario por request.
+"""
+import hashlib
+import ipaddress
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+CACHE_LIMITES = 'limites'
+# Buckets vacíos que recuerda cada proceso; al superarlo se olvidan los vencidos
+MAXIMO_BLOQUEOS = 10_000
+
+Limite = namedtuple('Limite', ['capacidad', 'periodo'])
+
+_bloqueos = {}  # clave -> instante (time.time()) hasta el que el bucket está vacío
+_lock = threading.Lock()
+
+
+def parsear_limite(texto):
+    """
+    Convierte "N/S" (N intentos cada S segundos) en un Limite. Retorna None
+    si está vacío o es "0", que desactivan el límite.
+    """
+    texto = (texto or '').strip()
+    if texto in ('', '0'):
+        return None
+    try:
+        capacidad, periodo = texto.split('/')
+        limite = Limite(int(capacidad), float(periodo))
+    except ValueError:
+        raise ImproperlyConfigured(f"Límite inválido {texto!r}: se espera 'intentos/segundos', p. ej. '5/300'.")
+    if limite.capacidad < 1 or limite.periodo <= 0:
+        raise ImproperlyConfigured(f"Límite inválido {texto!r}: ambos valores deben ser positivos.")
+    return limite
+
+
+@lru_cache(maxsize=8)
+def _redes(proxies):
+    try:
+        return tuple(ipaddress.ip_network(red.strip(), strict=False) for red in proxies)
+    except ValueError as error:
+        raise ImproperlyConfigured(f"PROXIES_CONFIABLES inválido: {error}")
+
+
+def _ip(direccion):
+    try:
+        return ipaddress.ip_address(direccion.strip())
+    except ValueError:
+        return None
+
+
+def _es_proxy(ip, redes):
+    return ip is not None and any(ip in red for red in redes)
+
+
+def ip_cliente(request):
+    """
+    IP del cliente, con las IPv6 reducidas a su red /64, o None si no se
+    conoce. Si REMOTE_ADDR es uno de PROXIES_CONFIABLES, el cliente es la
+    última dirección de X-Forwarded-For que no es un proxy confiable (las
+    anteriores las puede escribir el propio cliente).
+    """
+    redes = _redes(tuple(settings.PROXIES_CONFIABLES))
+    ip = _ip(request.META.get('REMOTE_ADDR', ''))
+    if _es_proxy(ip, redes):
+        saltos = [salto for salto in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if salto.strip()]
+        ip = None
+        for salto in reversed(saltos):
+            ip = _ip(salto)
+            if not _es_proxy(ip, redes):
+                break
+        if ip is None or _es_proxy(ip, redes):
+            return None
+    if ip is None:
+        return None
+    if ip.version == 6:
+        if ip.ipv4_mapped:
+            return str(ip.ipv4_mapped)
+        return str(ipaddress.ip_network(f'{ip}/64', strict=False))
+    return str(ip)
+
+
+def _clave_rut(rut):
+    # El RUT viene del formulario sin validar: se resume para acotar la clave
+    normalizado = rut.strip().lower().encode()
+    return f'login:rut:{hashlib.sha256(normalizado).hexdigest()[:32]}'
+
+
+def buckets_login(request, rut):
+    """Pares (clave, Limite) que consume un intento de inicio de sesión"""
+    buckets = []
+    limite_rut = parsear_limite(settings.LIMITE_LOGIN_RUT)
+    if limite_rut:
+        buckets.append((_clave_rut(rut), limite_rut))
+    limite_ip = parsear_limite(settings.LIMITE_LOGIN_IP)
+    ip = ip_cliente(request) if limite_ip else None
+    if ip:
+        buckets.append((f'login:ip:{ip}', limite_ip))
+    return buckets
+
+
+def _recargar(estado, limite, ahora):
+    """Fichas disponibles de un bucket guardado como (fichas, instante)"""
+    if estado is None:
+        return float(limite.capacidad)
+    fichas, instante = estado
+    return min(float(limite.capacidad), fichas + max(0.0, ahora - instante) * limite.capacidad / limite.periodo)
+
+
+def _bloquear(clave, hasta, ahora):
+    with _lock:
+        if len(_bloqueos) >= MAXIMO_BLOQUEOS:
+            for vencida in [c for c, fin in _bloqueos.items() if fin <= ahora]:
+                del _bloqueos[vencida]
+            if len(_bloqueos) >= MAXIMO_BLOQUEOS:
+                _bloqueos.clear()
+        _bloqueos[clave] = hasta
+
+
+def consumir(buckets, ahora=None):
+    """
+    Consume una ficha de cada bucket y retorna 0. Si alguno está vacío no
+    consume ninguna y retorna los segundos que faltan para poder reintentar.
+    """
+    if not buckets:
+        return 0
+    ahora = time.time() if ahora is None else ahora
+    espera = max(_bloqueos.get(clave, 0) - ahora for clave, _ in buckets)
+    if espera > 0:
+        return espera
+
+    cache = caches[CACHE_LIMITES]
+    estados = cache.get_many([clave for clave, _ in buckets])
+    fichas = {clave: _recargar(estados.get(clave), limite, ahora) for clave, limite in buckets}
+    faltantes = {
+        clave: (1 - fichas[clave]) * limite.periodo / limite.capacidad
+        for clave, limite in buckets if fichas[clave] < 1
+    }
+    if faltantes:
+        for clave, segundos in faltantes.items():
+            _bloquear(clave, ahora + segundos, ahora)
+        return max(faltantes.values())
+    # Pasado un periodo el bucket está lleno, igual que si no existiera
+    cache.set_many(
+        {clave: (fichas[clave] - 1, ahora) for clave, _ in buckets},
+        timeout=max(limite.periodo for _, limite in buckets),
+    )
+    return 0
+
+
+def reiniciar(clave):
+    """Llena un bucket, p. ej. el de un RUT después de un inicio de sesión exitoso"""
+    caches[CACHE_LIMITES].delete(clave)
+    _bloqueos.pop(clave, None)
+
+
+def reiniciar_login(rut):
+    reiniciar(_clave_rut(rut))
+
+
+def reiniciar_todos():
+    """Llena todos los buckets (para pruebas y benchmarks)"""
+    caches[CACHE_LIMITES].clear()
+    _bloqueos.clear()
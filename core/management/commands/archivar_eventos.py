@@ -0,0 +1,47 @@
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archivo import archivar_lote, corte_por_antiguedad, fijar_corte
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve por lotes a la tabla de archivo los eventos que terminaron antes "
+        "del corte. Cada lote es una transacción corta; las vistas del calendario "
+        "siguen mostrando los eventos archivados en los periodos anteriores al corte"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--antes-de", type=date.fromisoformat,
+            help=(
+                "Fecha de corte (AAAA-MM-DD). Por defecto, el primer día del mes "
+                f"de hace ARCHIVO_MESES meses ({settings.ARCHIVO_MESES})"
+            ),
+        )
+        parser.add_argument(
+            "--lote", type=int, default=settings.ARCHIVO_LOTE,
+            help=f"Eventos movidos por lote (por defecto {settings.ARCHIVO_LOTE})",
+        )
+        parser.add_argument(
+            "--pausa", type=float, default=0.0,
+            help="Segundos de espera entre lotes para dejar pasar otras escrituras",
+        )
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("El tamaño de lote debe ser positivo.")
+        fecha = options["antes_de"] or corte_por_antiguedad(settings.ARCHIVO_MESES)
+        try:
+            corte = fijar_corte(fecha)
+        except ValueError as error:
+            raise CommandError(str(error))
+        total = 0
+        while movidos := archivar_lote(corte, options["lote"]):
+            total += movidos
+            if options["pausa"]:
+                time.sleep(options["pausa"])
+        self.stdout.write(self.style.SUCCESS(f"Archivados {total} eventos anteriores al {fecha:%Y-%m-%d}."))
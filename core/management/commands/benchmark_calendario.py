@@ -0,0 +1,80 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.benchmarks import ESCALAS, REPETICIONES, ejecutar, medir_login
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide consultas, latencia y memoria de los endpoints del calendario sobre "
+        "una base de datos de prueba y falla si alguno excede su presupuesto"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--escalas", type=int, nargs="+", default=list(ESCALAS),
+            help="Cantidades de eventos a generar (por defecto %(default)s)",
+        )
+        parser.add_argument(
+            "--repeticiones", type=int, default=REPETICIONES,
+            help="Requests por endpoint para calcular la latencia (por defecto %(default)s)",
+        )
+        parser.add_argument("--json", help="Guarda los resultados en este archivo")
+        parser.add_argument(
+            "--login", action="store_true",
+            help="Mide también la latencia de un inicio de sesión legítimo durante un ataque de fuerza bruta",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeticiones"] < 1 or min(options["escalas"]) < 1:
+            raise CommandError("Las escalas y las repeticiones deben ser positivas.")
+
+        # Las mediciones nunca tocan la base de datos real
+        setup_test_environment()
+        nombre_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        resultados = []
+        try:
+            for escala in options["escalas"]:
+                call_command("flush", interactive=False, verbosity=0)
+                self.stdout.write(f"\n{escala} eventos")
+                self.stdout.write(
+                    f"{'endpoint':<14}{'consultas':>12}{'p50 ms':>10}{'p95 ms':>10}{'memoria KB':>12}"
+                    f"{'KB':>10}{'KB comp.':>10}"
+                )
+                for resultado in ejecutar(escala, options["repeticiones"]):
+                    resultados.append(resultado)
+                    linea = (
+                        f"{resultado.endpoint:<14}"
+                        f"{f'{resultado.consultas}/{resultado.presupuesto}':>12}"
+                        f"{resultado.p50_ms:>10.1f}{resultado.p95_ms:>10.1f}"
+                        f"{resultado.memoria_pico_kb:>12.0f}"
+                        f"{resultado.cuerpo_kb:>10.1f}{resultado.comprimido_kb:>10.1f}"
+                    )
+                    self.stdout.write(self.style.ERROR(linea) if resultado.excedido else linea)
+            if options["login"]:
+                self.stdout.write("\nInicio de sesión legítimo durante un ataque")
+                self.stdout.write(f"{'escenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'rechazados':>14}")
+                for resultado in medir_login():
+                    self.stdout.write(
+                        f"{resultado.escenario:<20}{resultado.p50_ms:>10.1f}{resultado.p95_ms:>10.1f}"
+                        f"{f'{resultado.rechazados}/{resultado.intentos_ataque}':>14}"
+                    )
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        if options["json"]:
+            with open(options["json"], "w", encoding="utf-8") as archivo:
+                json.dump([vars(resultado) for resultado in resultados], archivo, indent=2)
+
+        excedidos = [resultado for resultado in resultados if resultado.excedido]
+        if excedidos:
+            raise CommandError("Presupuesto de consultas excedido: " + ", ".join(
+                f"{r.endpoint} ({r.consultas} > {r.presupuesto} con {r.escala} eventos)" for r in excedidos
+            ))
+        self.stdout.write(self.style.SUCCESS("\nTodos los endpoints dentro del presupuesto."))
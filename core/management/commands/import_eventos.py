@@ -0,0 +1,48 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importacion import FORMATOS, TAMANO_LOTE, detectar_formato, importar_eventos
+from core.models import Usuario
+
+
+class Command(BaseCommand):
+    help = "Importa eventos desde un archivo CSV o iCalendar (.ics) para un usuario"
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del archivo a importar")
+        parser.add_argument("--rut", required=True, help="RUT del usuario dueño de los eventos")
+        parser.add_argument(
+            "--formato", choices=FORMATOS,
+            help="Formato del archivo; por defecto se deduce de la extensión",
+        )
+        parser.add_argument(
+            "--lote", type=int, default=TAMANO_LOTE,
+            help=f"Cantidad de filas por inserción (por defecto {TAMANO_LOTE})",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            usuario = Usuario.objects.get(rut=options["rut"])
+        except Usuario.DoesNotExist:
+            raise CommandError(f"No existe un usuario con RUT {options['rut']}.")
+        if options["lote"] < 1:
+            raise CommandError("El tamaño de lote debe ser positivo.")
+
+        formato = options["formato"] or detectar_formato(options["archivo"])
+        try:
+            with open(options["archivo"], encoding="utf-8-sig", newline="") as archivo:
+                resultado = importar_eventos(archivo, usuario, formato, options["lote"])
+        except OSError as error:
+            raise CommandError(f"No se pudo leer el archivo: {error}")
+        except (UnicodeDecodeError, csv.Error) as error:
+            # La importación es una sola transacción: no se guardó ningún evento
+            raise CommandError(f"Archivo rechazado, no se importó ningún evento: {error}")
+
+        for linea, motivo in resultado.rechazados:
+            self.stderr.write(f"Línea {linea}: {motivo}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Importados {resultado.creados} eventos en {resultado.segundos:.2f} s "
+            f"({resultado.eventos_por_segundo:.0f} eventos/s); "
+            f"{len(resultado.rechazados)} filas rechazadas."
+        ))
@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+LOTE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina las sesiones expiradas por lotes. A diferencia de clearsessions, "
+        "cada lote es una transacción corta, así que en SQLite no bloquea las "
+        "escrituras de la aplicación durante toda la limpieza"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote", type=int, default=LOTE,
+            help=f"Sesiones eliminadas por lote (por defecto {LOTE})",
+        )
+        parser.add_argument(
+            "--pausa", type=float, default=0.0,
+            help="Segundos de espera entre lotes para dejar pasar otras escrituras",
+        )
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("El tamaño de lote debe ser positivo.")
+        # Las copias en la caché de sesiones expiran por su propio timeout
+        ahora = timezone.now()
+        total = 0
+        while True:
+            claves = list(
+                Session.objects.filter(expire_date__lt=ahora)
+                .values_list("session_key", flat=True)[:options["lote"]]
+            )
+            if not claves:
+                break
+            total += Session.objects.filter(session_key__in=claves).delete()[0]
+            if options["pausa"]:
+                time.sleep(options["pausa"])
+        self.stdout.write(self.style.SUCCESS(f"Eliminadas {total} sesiones expiradas."))
@@ -0,0 +1,109 @@
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from core.models import Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga contra un servidor en ejecución (WSGI o ASGI): varios "
+        "clientes concurrentes piden la misma URL durante un tiempo fijo"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="URL completa, p. ej. http://127.0.0.1:8000/calendario/")
+        parser.add_argument("-c", "--concurrencia", type=int, default=32, help="Clientes simultáneos")
+        parser.add_argument("-d", "--duracion", type=float, default=10.0, help="Segundos de prueba")
+        parser.add_argument(
+            "--rut", help="Crea una sesión para este usuario y la envía como cookie "
+                          "(el servidor debe usar la misma base de datos)",
+        )
+        parser.add_argument(
+            "--pausa", type=float, default=0.0,
+            help="Segundos que cada cliente espera entre requests, para simular clientes lentos",
+        )
+
+    def _cookie_sesion(self, rut):
+        try:
+            usuario = Usuario.objects.get(rut=rut)
+        except Usuario.DoesNotExist:
+            raise CommandError(f"No existe un usuario con RUT {rut}.")
+        sesion = import_string(f"{settings.SESSION_ENGINE}.SessionStore")()
+        sesion[SESSION_KEY] = str(usuario.pk)
+        sesion[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sesion[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sesion.save()
+        return f"{settings.SESSION_COOKIE_NAME}={sesion.session_key}"
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise CommandError("La URL debe ser http:// o https:// con un host.")
+        if options["concurrencia"] < 1 or options["duracion"] <= 0:
+            raise CommandError("La concurrencia y la duración deben ser positivas.")
+        ruta = (url.path or "/") + (f"?{url.query}" if url.query else "")
+        cabeceras = {"Cookie": self._cookie_sesion(options["rut"])} if options["rut"] else {}
+        clase = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+
+        latencias = []
+        estados = {}
+        errores = []
+        lock = threading.Lock()
+        fin = time.monotonic() + options["duracion"]
+
+        def cliente():
+            propias, propios_estados = [], {}
+            conexion = clase(url.hostname, url.port, timeout=30)
+            while time.monotonic() < fin:
+                inicio = time.perf_counter()
+                try:
+                    conexion.request("GET", ruta, headers=cabeceras)
+                    respuesta = conexion.getresponse()
+                    respuesta.read()
+                except (OSError, http.client.HTTPException) as error:
+                    with lock:
+                        errores.append(error)
+                    conexion.close()
+                    conexion = clase(url.hostname, url.port, timeout=30)
+                    continue
+                propias.append(time.perf_counter() - inicio)
+                propios_estados[respuesta.status] = propios_estados.get(respuesta.status, 0) + 1
+                if options["pausa"]:
+                    time.sleep(options["pausa"])
+            conexion.close()
+            with lock:
+                latencias.extend(propias)
+                for estado, cantidad in propios_estados.items():
+                    estados[estado] = estados.get(estado, 0) + cantidad
+
+        hilos = [threading.Thread(target=cliente) for _ in range(options["concurrencia"])]
+        inicio = time.monotonic()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        transcurrido = time.monotonic() - inicio
+
+        if not latencias:
+            raise CommandError(f"Ningún request se completó ({len(errores)} errores).")
+        latencias.sort()
+        self.stdout.write(
+            f"{len(latencias)} requests en {transcurrido:.1f} s con {options['concurrencia']} clientes: "
+            f"{len(latencias) / transcurrido:.1f} req/s"
+        )
+        self.stdout.write(
+            f"latencia p50 {statistics.median(latencias) * 1000:.1f} ms, "
+            f"p95 {latencias[round(0.95 * (len(latencias) - 1))] * 1000:.1f} ms, "
+            f"máx {latencias[-1] * 1000:.1f} ms"
+        )
+        self.stdout.write("estados: " + ", ".join(f"{e}: {c}" for e, c in sorted(estados.items())))
+        if errores:
+            self.stderr.write(f"{len(errores)} errores de conexión (el primero: {errores[0]})")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.busqueda import reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea el índice de búsqueda de eventos si falta (tabla FTS5 y sus "
+        "triggers en SQLite, columna tsvector e índice GIN en PostgreSQL) y, "
+        "en SQLite, lo recalcula desde la tabla de eventos"
+    )
+
+    def handle(self, *args, **options):
+        reconstruir()
+        self.stdout.write(self.style.SUCCESS("Índice de búsqueda reconstruido."))
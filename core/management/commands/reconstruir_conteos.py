@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.conteos import reconstruir
+from core.models import Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula desde los eventos la tabla de conteos diarios (ConteoDiario). "
+        "Necesario si se cargaron eventos sin señales o si cambió TIME_ZONE"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rut", help="Reconstruir solo los conteos de este usuario")
+
+    def handle(self, *args, **options):
+        usuarios = None
+        if options["rut"]:
+            usuarios = Usuario.objects.filter(rut=options["rut"])
+            if not usuarios.exists():
+                raise CommandError(f"No existe un usuario con RUT {options['rut']}.")
+        filas = reconstruir(usuarios)
+        self.stdout.write(self.style.SUCCESS(f"Reconstruidos {filas} conteos diarios."))
@@ -0,0 +1,177 @@
+"""
+Mapa de calor anual: ocupación de cada día del año (cantidad de eventos y
+horas ocupadas) al estilo del gráfico de contribuciones de GitHub.
+
+Los eventos se leen como pares de enteros (segundos desde 1970, calculados
+por la base de datos) y todo el cálculo se hace con operaciones de NumPy
+sobre esos arreglos, sin crear un datetime por evento:
+
+- El día local de cada instante sale de ``searchsorted`` sobre los límites
+  de los días del año, que respetan los cambios de hora de la zona horaria
+  activa (ver ``a_utc``).
+- La cantidad de eventos por día usa un arreglo de diferencias: +1 el día de
+  inicio, -1 el día siguiente al de término, y una suma acumulada. Así un
+  evento multi-día cuenta en cada día que abarca.
+- Las horas ocupadas usan sumas prefijas sobre los inicios y términos
+  ordenados (ver ``segundos_cubiertos``).
+
+Las series recurrentes se expanden con ``inicios_locales`` (que memoriza la
+expansión) directamente a arreglos de segundos, sin copiar el evento por
+cada ocurrencia.
+"""
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import chain
+
+import numpy as np
+from django.db.models import BigIntegerField, Func
+from django.utils import timezone
+
+from .archivo import con_archivo
+from .models import rango_datetimes
+from .recurrencia import inicios_locales
+
+SEGUNDOS_HORA = 3600
+SEGUNDOS_DIA = 86400
+# Campos que necesita la expansión de una serie
+CAMPOS_SERIE = (
+    "fecha_inicio", "fecha_fin", "recurrencia", "intervalo", "repetir_hasta", "repeticiones", "excepciones",
+)
+
+
+class SegundosEpoch(Func):
+    """Segundos desde 1970 (UTC) de un DateTimeField, calculados en la base"""
+    output_field = BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Django guarda los datetimes en UTC; julianday evita el '%' de strftime
+        return self.as_sql(
+            compiler, connection,
+            template="CAST(ROUND((julianday(%(expressions)s) - 2440587.5) * 86400) AS INTEGER)",
+            **extra_context,
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="EXTRACT(EPOCH FROM %(expressions)s)::bigint", **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="UNIX_TIMESTAMP(%(expressions)s)", **extra_context)
+
+
+@lru_cache(maxsize=16)
+def _desfases(year, zona):
+    """
+    Diferencia en segundos entre la hora local y UTC al comienzo de cada hora
+    local del año (y de la primera hora del año siguiente). Los cambios de
+    hora ocurren en horas exactas, así que basta con esta resolución.
+    """
+    primero = datetime(year, 1, 1)
+    horas = (date(year + 1, 1, 1) - date(year, 1, 1)).days * 24 + 1
+    return np.array(
+        [timezone.make_aware(primero + timedelta(hours=hora), zona).utcoffset().total_seconds() for hora in range(horas)],
+        dtype=np.int64,
+    )
+
+
+def _segundos(valor):
+    """Segundos desde 1970 de una fecha u hora local, tratada como si fuera UTC"""
+    return np.datetime64(valor, "s").astype(np.int64)
+
+
+def a_utc(locales, year):
+    """
+    Convierte horas locales del año (arreglo de segundos desde 1970 como si
+    fueran UTC) a segundos desde 1970 reales. Fuera del año se usa la
+    diferencia horaria de su primera o última hora.
+    """
+    desfases = _desfases(year, timezone.get_current_timezone())
+    horas = np.clip((locales - _segundos(date(year, 1, 1))) // SEGUNDOS_HORA, 0, len(desfases) - 1)
+    return locales - desfases[horas]
+
+
+def limites_dias(year):
+    """
+    Segundos desde 1970 del comienzo de cada día local del año, más el del
+    1 de enero siguiente (un arreglo de largo días + 1)
+    """
+    dias = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+    return a_utc(_segundos(date(year, 1, 1)) + SEGUNDOS_DIA * np.arange(dias + 1), year)
+
+
+def segundos_cubiertos(inicios, fines, instantes):
+    """
+    Para cada instante t, la suma sobre los eventos de la parte de
+    [inicio, fin) anterior a t. Cada evento que comenzó antes de t aporta
+    t - inicio, y si además terminó antes de t se le descuenta t - fin, así
+    que basta con contar y sumar los inicios y términos menores que t.
+    """
+    inicios = np.sort(inicios)
+    fines = np.sort(fines)
+    suma_inicios = np.concatenate(([0], np.cumsum(inicios)))
+    suma_fines = np.concatenate(([0], np.cumsum(fines)))
+    antes = np.searchsorted(inicios, instantes)
+    terminados = np.searchsorted(fines, instantes)
+    return (antes * instantes - suma_inicios[antes]) - (terminados * instantes - suma_fines[terminados])
+
+
+def ocupacion(inicios, fines, limites):
+    """
+    Cantidad de eventos y segundos ocupados en cada día delimitado por
+    `limites`. Los segundos de eventos simultáneos se suman.
+    """
+    dias = len(limites) - 1
+    if not len(inicios):
+        return np.zeros(dias, dtype=np.int64), np.zeros(dias, dtype=np.int64)
+    # Igual que fecha_local: un evento que termina a medianoche cuenta en ese día
+    primero = np.clip(np.searchsorted(limites, inicios, side="right") - 1, 0, dias - 1)
+    ultimo = np.clip(np.searchsorted(limites, fines, side="right") - 1, 0, dias - 1)
+    diferencias = np.bincount(primero, minlength=dias + 1) - np.bincount(ultimo + 1, minlength=dias + 1)
+    eventos = np.cumsum(diferencias)[:dias]
+    segundos = np.diff(segundos_cubiertos(inicios, fines, limites))
+    return eventos, segundos
+
+
+def pares_series(series, year):
+    """
+    Pares (inicio, fin) en segundos desde 1970 de las ocurrencias de las
+    series en el año. Igual que ``ocurrencias``, el fin es la hora local de
+    inicio más la duración.
+    """
+    desde, hasta = rango_datetimes(date(year, 1, 1), date(year + 1, 1, 1))
+    inicios, duraciones = [], []
+    for serie in series:
+        locales = np.array(inicios_locales(serie, desde, hasta), dtype="datetime64[s]").astype(np.int64)
+        duracion = (serie.fecha_fin - serie.fecha_inicio).total_seconds()
+        inicios.append(locales)
+        duraciones.append(np.full(len(locales), duracion, dtype=np.int64))
+    if not inicios:
+        return np.empty((0, 2), dtype=np.int64)
+    inicios = np.concatenate(inicios)
+    fines = inicios + np.concatenate(duraciones)
+    return np.column_stack((a_utc(inicios, year), a_utc(fines, year)))
+
+
+def mapa_calor(filtrar, year):
+    """
+    Ocupación por día en el año de los eventos que deja `filtrar` (una función
+    que recibe y retorna un queryset, p. ej. para quedarse con los de un
+    usuario), incluidos los archivados si el año es anterior al corte. Retorna
+    dos arreglos con un valor por día: cantidad de eventos y horas ocupadas.
+    """
+    limites = limites_dias(year)
+    desde = date(year, 1, 1)
+
+    def del_anio(eventos):
+        return filtrar(eventos).overlapping(desde, date(year + 1, 1, 1))
+
+    filas = con_archivo(lambda eventos: del_anio(eventos).filter(recurrencia="").annotate(
+        inicio_epoch=SegundosEpoch("fecha_inicio"), fin_epoch=SegundosEpoch("fecha_fin")
+    ).values_list("inicio_epoch", "fin_epoch"), desde)
+    pares = np.fromiter(chain.from_iterable(filas.iterator(chunk_size=2000)), dtype=np.int64).reshape(-1, 2)
+    series = con_archivo(lambda eventos: del_anio(eventos).exclude(recurrencia="").only(*CAMPOS_SERIE), desde)
+    pares = np.concatenate((pares, pares_series(series, year)))
+
+    cantidades, segundos = ocupacion(pares[:, 0], pares[:, 1], limites)
+    return cantidades, segundos / 3600
@@ -0,0 +1,249 @@
+"""
+Métricas de la aplicación en el formato de texto de Prometheus.
+
+Cada proceso acumula sus contadores e histogramas en memoria. Si se
+configura ``METRICAS_DIRECTORIO``, cada proceso vuelca además su estado a un
+archivo propio (``metricas-<pid>.json``) como máximo una vez por
+``METRICAS_INTERVALO`` segundos, y el endpoint suma los archivos de todos los
+procesos. Así el resultado no depende de qué worker atienda el scrape. El
+directorio debe vaciarse al reiniciar el servicio, igual que con el modo
+multiproceso de prometheus_client.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# nombre: (tipo, descripción, buckets)
+DEFINICIONES = {
+    "didacta_request_duracion_segundos": (
+        "histogram", "Latencia de los requests por nombre de URL.", BUCKETS_SEGUNDOS
+    ),
+    "didacta_request_consultas": (
+        "histogram", "Consultas SQL por request y nombre de URL.", BUCKETS_CONSULTAS
+    ),
+    "didacta_cache_calendario_total": (
+        "counter", "Lecturas de la caché del calendario por vista y resultado.", None
+    ),
+    "didacta_login_intentos_total": (
+        "counter", "Intentos de inicio de sesión por resultado.", None
+    ),
+}
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+
+class Registro:
+    """Contadores e histogramas del proceso actual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Separado de _lock para no detener los registros durante la escritura
+        self._lock_volcado = threading.Lock()
+        self._pid = os.getpid()
+        self._ultimo_volcado = 0.0
+        self._contadores = {}  # (nombre, etiquetas) -> valor
+        self._histogramas = {}  # (nombre, etiquetas) -> [cuentas por bucket..., +Inf, suma]
+
+    def _verificar_proceso(self):
+        # Un worker creado con fork no debe heredar los valores del proceso padre
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._contadores.clear()
+            self._histogramas.clear()
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._verificar_proceso()
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        buckets = DEFINICIONES[nombre][2]
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._verificar_proceso()
+            datos = self._histogramas.get(clave)
+            if datos is None:
+                datos = self._histogramas[clave] = [0] * (len(buckets) + 1) + [0.0]
+            datos[bisect_left(buckets, valor)] += 1
+            datos[-1] += valor
+
+    def estado(self):
+        with self._lock:
+            self._verificar_proceso()
+            return {
+                "contadores": [[n, list(e), v] for (n, e), v in self._contadores.items()],
+                "histogramas": [[n, list(e), list(d)] for (n, e), d in self._histogramas.items()],
+            }
+
+    def toca_volcar(self):
+        """True si hay directorio y pasó METRICAS_INTERVALO desde el último volcado"""
+        return bool(getattr(settings, "METRICAS_DIRECTORIO", None)) and (
+            time.monotonic() - self._ultimo_volcado >= settings.METRICAS_INTERVALO
+        )
+
+    def volcar(self, forzar=False):
+        """
+        Escribe el estado del proceso en el directorio compartido, si hay uno.
+        Si otro hilo ya está volcando, un volcado no forzado se omite. Un error
+        de escritura se registra y no llega al request.
+        """
+        directorio = getattr(settings, "METRICAS_DIRECTORIO", None)
+        if not directorio or not self._lock_volcado.acquire(blocking=forzar):
+            return
+        temporal = None
+        try:
+            if not forzar and not self.toca_volcar():
+                return
+            self._ultimo_volcado = time.monotonic()
+            destino = Path(directorio) / f"metricas-{os.getpid()}.json"
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=directorio, prefix=f"metricas-{os.getpid()}-", suffix=".tmp", delete=False
+            ) as archivo:
+                temporal = archivo.name
+                json.dump(self.estado(), archivo)
+            # os.replace es atómico: quien lee nunca ve un archivo a medio escribir
+            os.replace(temporal, destino)
+            temporal = None
+        except OSError:
+            logger.warning("No se pudieron volcar las métricas en %s", directorio, exc_info=True)
+        finally:
+            if temporal is not None:
+                try:
+                    os.remove(temporal)
+                except OSError:
+                    pass
+            self._lock_volcado.release()
+
+
+registro = Registro()
+atexit.register(registro.volcar, forzar=True)
+
+
+def _observar_request(vista, metodo, segundos, consultas):
+    registro.observar("didacta_request_duracion_segundos", segundos, vista=vista, metodo=metodo)
+    registro.observar("didacta_request_consultas", consultas, vista=vista)
+
+
+def registrar_request(vista, metodo, segundos, consultas):
+    _observar_request(vista, metodo, segundos, consultas)
+    registro.volcar()
+
+
+async def aregistrar_request(vista, metodo, segundos, consultas):
+    """Igual que registrar_request, pero el volcado se escribe fuera del event loop"""
+    _observar_request(vista, metodo, segundos, consultas)
+    if registro.toca_volcar():
+        await sync_to_async(registro.volcar, thread_sensitive=False)()
+
+
+def registrar_cache(vista, acierto):
+    registro.incrementar("didacta_cache_calendario_total", vista=vista, resultado="hit" if acierto else "miss")
+
+
+def registrar_login(exitoso):
+    registro.incrementar("didacta_login_intentos_total", resultado="exito" if exitoso else "fallo")
+
+
+def _estados():
+    """Estado de todos los procesos; solo el propio si no hay directorio"""
+    directorio = getattr(settings, "METRICAS_DIRECTORIO", None)
+    if not directorio:
+        return [registro.estado()]
+    registro.volcar(forzar=True)
+    estados = []
+    for archivo in Path(directorio).glob("metricas-*.json"):
+        try:
+            estados.append(json.loads(archivo.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue  # El proceso pudo terminar mientras se leía
+    return estados
+
+
+def combinar(estados):
+    """Suma los contadores e histogramas de varios procesos"""
+    contadores = {}
+    histogramas = {}
+    for estado in estados:
+        for nombre, etiquetas, valor in estado["contadores"]:
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            contadores[clave] = contadores.get(clave, 0) + valor
+        for nombre, etiquetas, datos in estado["histogramas"]:
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            acumulado = histogramas.get(clave)
+            histogramas[clave] = datos if acumulado is None else [a + b for a, b in zip(acumulado, datos)]
+    return contadores, histogramas
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ""
+    valores = (
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pares
+    )
+    return "{" + ",".join(valores) + "}"
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def sesiones_activas():
+    from django.contrib.sessions.models import Session
+    return Session.objects.filter(expire_date__gt=timezone.now()).count()
+
+
+def generar_texto():
+    contadores, histogramas = combinar(_estados())
+    lineas = []
+    for nombre, (tipo, descripcion, buckets) in DEFINICIONES.items():
+        lineas += [f"# HELP {nombre} {descripcion}", f"# TYPE {nombre} {tipo}"]
+        if tipo == "counter":
+            for (metrica, etiquetas), valor in sorted(contadores.items()):
+                if metrica == nombre:
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas)} {_numero(valor)}")
+            continue
+        for (metrica, etiquetas), datos in sorted(histogramas.items()):
+            if metrica != nombre:
+                continue
+            acumulado = 0
+            for limite, cuenta in zip(buckets + ("+Inf",), datos):
+                acumulado += cuenta
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', limite),))} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {_numero(datos[-1])}")
+            lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {acumulado}")
+    lineas += [
+        "# HELP didacta_sesiones_activas Sesiones que aún no expiran.",
+        "# TYPE didacta_sesiones_activas gauge",
+        f"didacta_sesiones_activas {sesiones_activas()}",
+    ]
+    return "\n".join(lineas) + "\n"
+
+
+def metricas_view(request):
+    """
+    GET /metrics
+
+    Solo responde a un superusuario o a las IPs de METRICAS_IPS_PERMITIDAS
+    (vacía por defecto).
+    """
+    permitido = request.META.get("REMOTE_ADDR") in settings.METRICAS_IPS_PERMITIDAS
+    if not (permitido or request.user.is_superuser):
+        return HttpResponseForbidden()
+    return HttpResponse(generar_texto(), content_type=CONTENT_TYPE)
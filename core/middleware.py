@@ -1,19 +1,37 @@
+import contextvars
+import functools
+import heapq
+import json
+import logging
+import time
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.contrib import messages
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
 from django.shortcuts import redirect
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metricas
+
+try:
+    import brotli
+except ImportError:  # Sin brotli solo se usa gzip
+    brotli = None
 
 
-class AuthenticationRedirectMiddleware:
+class AuthenticationRedirectMiddleware(MiddlewareMixin):
     """
     Middleware que maneja las redirecciones de usuarios no autenticados
-    y muestra mensajes informativos.
+    y muestra mensajes informativos. MiddlewareMixin lo hace compatible con
+    ASGI: process_view corre en un hilo, donde puede usar la sesión.
     """
-    
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        response = self.get_response(request)
-        return response
 
     def process_view(self, request, view_func, view_args, view_kwargs):
         """
@@ -25,8 +43,385 @@ class AuthenticationRedirectMiddleware:
             request.path not in ['/calendario/login/', '/calendario/register/']):
             
             messages.warning(request, 'Debes iniciar sesión para acceder a esta página.')
-            # Guardar la URL a la que intentaba acceder
-            request.session['next_url'] = request.get_full_path()
+            # Guardar la URL a la que intentaba acceder, sin reescribir la sesión si no cambió
+            if request.session.get('next_url') != request.get_full_path():
+                request.session['next_url'] = request.get_full_path()
             return redirect('/calendario/login/')
         
-        return None
\ No newline at end of file
+        return None
+
+
+# Medición del request en curso; la leen el wrapper de SQL y el de plantillas
+_medicion_actual = contextvars.ContextVar("medicion_actual", default=None)
+logger_perfilamiento = logging.getLogger("core.perfilamiento")
+
+
+class Medicion:
+    """Tiempos acumulados durante un request"""
+
+    CONSULTAS_LENTAS = 5
+    LARGO_SQL = 500
+
+    def __init__(self):
+        self.consultas = 0
+        self.sql = 0.0
+        self.plantillas = 0.0
+        self.profundidad_plantillas = 0
+        self.lentas = []  # heap de (segundos, orden, sql)
+
+    def registrar_consulta(self, sql, segundos):
+        self.consultas += 1
+        self.sql += segundos
+        entrada = (segundos, self.consultas, sql[:self.LARGO_SQL])
+        if len(self.lentas) < self.CONSULTAS_LENTAS:
+            heapq.heappush(self.lentas, entrada)
+        else:
+            heapq.heappushpop(self.lentas, entrada)
+
+    def consultas_lentas(self):
+        return [
+            {"sql": sql, "ms": round(segundos * 1000, 2)}
+            for segundos, _, sql in sorted(self.lentas, reverse=True)
+        ]
+
+
+def _instalar_en_conexiones(wrapper):
+    """
+    Agrega `wrapper` a las conexiones al inicio de cada request. No basta con
+    un execute_wrapper dentro del middleware porque bajo ASGI el ORM corre
+    en otro hilo, con sus propias conexiones; los receptores síncronos de
+    request_started corren en ese mismo hilo. El wrapper encuentra la
+    medición del request en una ContextVar, que asgiref propaga entre hilos.
+    """
+    def instalar(**kwargs):
+        for conexion in connections.all():
+            if wrapper not in conexion.execute_wrappers:
+                conexion.execute_wrappers.append(wrapper)
+
+    request_started.connect(instalar, weak=False, dispatch_uid=f"core.middleware.{wrapper.__name__}")
+
+
+def _medir_sql(execute, sql, params, many, context):
+    medicion = _medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.registrar_consulta(sql, time.perf_counter() - inicio)
+
+
+def _instrumentar_plantillas():
+    """
+    Envuelve el render de las plantillas del backend de Django una sola vez
+    por proceso. Solo se mide el render más externo, para no contar dos veces
+    las plantillas renderizadas dentro de otras.
+    """
+    if getattr(DjangoTemplate.render, "instrumentado", False):
+        return
+    render_original = DjangoTemplate.render
+
+    @functools.wraps(render_original)
+    def render(self, context=None, request=None):
+        medicion = _medicion_actual.get()
+        if medicion is None:
+            return render_original(self, context, request)
+        medicion.profundidad_plantillas += 1
+        inicio = time.perf_counter()
+        try:
+            return render_original(self, context, request)
+        finally:
+            medicion.profundidad_plantillas -= 1
+            if not medicion.profundidad_plantillas:
+                medicion.plantillas += time.perf_counter() - inicio
+
+    render.instrumentado = True
+    DjangoTemplate.render = render
+
+
+class PerfilamientoMiddleware:
+    """
+    Mide cada request y separa el tiempo total en SQL, render de plantillas y
+    resto de la vista. Los resultados se agregan como cabecera Server-Timing
+    y se escriben como una línea JSON en el logger ``core.perfilamiento``.
+
+    Se activa con ``PERFILAMIENTO = True``; si está desactivado, Django lo
+    quita de la cadena y no tiene ningún costo. En respuestas en streaming
+    solo se mide hasta que la vista retorna, no el envío del contenido.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PERFILAMIENTO", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.umbral = getattr(settings, "PERFILAMIENTO_UMBRAL_MS", 0) / 1000
+        _instrumentar_plantillas()
+        _instalar_en_conexiones(_medir_sql)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        return self._registrar(request, response, medicion, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        return self._registrar(request, response, medicion, time.perf_counter() - inicio)
+
+    def _registrar(self, request, response, medicion, total):
+        vista = max(0.0, total - medicion.sql - medicion.plantillas)
+        response.headers["Server-Timing"] = ", ".join([
+            f'sql;dur={medicion.sql * 1000:.1f};desc="{medicion.consultas} consultas"',
+            f"plantillas;dur={medicion.plantillas * 1000:.1f}",
+            f"vista;dur={vista * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+        if total >= self.umbral:
+            match = request.resolver_match
+            logger_perfilamiento.info(json.dumps({
+                "fecha": timezone.now().isoformat(),
+                "metodo": request.method,
+                "ruta": request.path,
+                "vista": match.view_name if match else None,
+                "estado": response.status_code,
+                "total_ms": round(total * 1000, 2),
+                "vista_ms": round(vista * 1000, 2),
+                "sql_ms": round(medicion.sql * 1000, 2),
+                "sql_consultas": medicion.consultas,
+                "plantillas_ms": round(medicion.plantillas * 1000, 2),
+                "consultas_lentas": medicion.consultas_lentas(),
+            }, ensure_ascii=False))
+        return response
+
+
+# Contador de consultas del request en curso para MetricasMiddleware
+_consultas_request = contextvars.ContextVar("consultas_request", default=None)
+
+
+def _contar_sql(execute, sql, params, many, context):
+    contador = _consultas_request.get()
+    if contador is not None:
+        contador[0] += 1
+    return execute(sql, params, many, context)
+
+
+class MetricasMiddleware:
+    """
+    Registra la latencia y la cantidad de consultas de cada request,
+    etiquetadas por el nombre de la URL (ver ``core.metricas``). Los requests
+    que no coinciden con ninguna URL se agrupan en "sin_ruta" para no crear
+    una serie por cada ruta inexistente.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICAS", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        _instalar_en_conexiones(_contar_sql)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        contador = [0]
+        token = _consultas_request.set(contador)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _consultas_request.reset(token)
+        self._registrar(request, time.perf_counter() - inicio, contador[0])
+        return response
+
+    async def __acall__(self, request):
+        contador = [0]
+        token = _consultas_request.set(contador)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _consultas_request.reset(token)
+        await metricas.aregistrar_request(
+            self._vista(request), request.method, time.perf_counter() - inicio, contador[0]
+        )
+        return response
+
+    def _vista(self, request):
+        match = request.resolver_match
+        return match.view_name if match else "sin_ruta"
+
+    def _registrar(self, request, segundos, consultas):
+        metricas.registrar_request(self._vista(request), request.method, segundos, consultas)
+
+
+# Tipos de contenido que vale la pena comprimir
+TIPOS_COMPRIMIBLES = (
+    "text/", "application/json", "application/javascript", "application/xml", "image/svg+xml",
+)
+# En streaming se fuerza la salida del compresor cada vez que entra esta
+# cantidad de bytes; entre medio zlib y brotli retienen lo que no llena su búfer
+BLOQUE_STREAMING = 16 * 1024
+
+
+def elegir_codificacion(accept_encoding):
+    """
+    Codificación a usar según Accept-Encoding ("br", "gzip" o None). Se
+    respetan los pesos q (q=0 la rechaza) y ante un empate se prefiere br.
+    """
+    pesos = {}
+    for parte in accept_encoding.lower().split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        peso = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, valor = parametro.strip().partition("=")
+            if clave == "q":
+                try:
+                    peso = float(valor)
+                except ValueError:
+                    peso = 0.0
+        pesos[nombre.strip()] = peso
+    elegida, mayor = None, 0.0
+    for nombre in ("br", "gzip") if brotli is not None else ("gzip",):
+        peso = pesos.get(nombre, pesos.get("*", 0.0))
+        if peso > mayor:
+            elegida, mayor = nombre, peso
+    return elegida
+
+
+class _Compresor:
+    """Interfaz común para comprimir por partes con gzip o brotli"""
+
+    def __init__(self, codificacion, nivel):
+        self.codificacion = codificacion
+        if codificacion == "br":
+            self._brotli = brotli.Compressor(quality=nivel, mode=brotli.MODE_TEXT)
+        else:
+            # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib
+            self._zlib = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+
+    def comprimir(self, datos):
+        if self.codificacion == "br":
+            return self._brotli.process(datos)
+        return self._zlib.compress(datos)
+
+    def vaciar(self):
+        """Entrega todo lo comprimido hasta ahora sin terminar el flujo"""
+        if self.codificacion == "br":
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self):
+        if self.codificacion == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompresionMiddleware(MiddlewareMixin):
+    """
+    Comprime las respuestas de texto (HTML, JSON, iCalendar...) con brotli
+    o gzip según Accept-Encoding, como GZipMiddleware de Django pero con
+    brotli y nivel configurable (``COMPRESION_NIVEL_BROTLI`` y
+    ``COMPRESION_NIVEL_GZIP``).
+
+    Se omiten las respuestas ya comprimidas, las de tipos que no se
+    benefician y las menores a ``COMPRESION_MINIMO`` bytes. Las respuestas
+    en streaming (síncronas o asíncronas) se comprimen a medida que se
+    envían, sin acumular el contenido. Un ETag fuerte pasa a ser débil,
+    porque el cuerpo ya no es idéntico byte a byte; la comparación de
+    If-None-Match de Django es débil, así que los 304 siguen funcionando.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "COMPRESION", True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.minimo = getattr(settings, "COMPRESION_MINIMO", 200)
+        self.niveles = {
+            "br": getattr(settings, "COMPRESION_NIVEL_BROTLI", 5),
+            "gzip": getattr(settings, "COMPRESION_NIVEL_GZIP", 6),
+        }
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding") or response.status_code in (204, 304):
+            return response
+        if not response.streaming and len(response.content) < self.minimo:
+            return response
+        tipo = response.get("Content-Type", "").split(";")[0].strip().lower()
+        if not tipo.startswith(TIPOS_COMPRIMIBLES):
+            return response
+        if "no-transform" in response.get("Cache-Control", "").lower():
+            return response
+
+        # Varía según Accept-Encoding aunque este cliente no acepte compresión
+        patch_vary_headers(response, ("Accept-Encoding",))
+        codificacion = elegir_codificacion(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if codificacion is None:
+            return response
+
+        compresor = _Compresor(codificacion, self.niveles[codificacion])
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._comprimir_async(compresor, response.streaming_content)
+            else:
+                response.streaming_content = self._comprimir(compresor, response.streaming_content)
+            del response.headers["Content-Length"]
+        else:
+            comprimido = compresor.comprimir(response.content) + compresor.terminar()
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response.headers["Content-Length"] = str(len(comprimido))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = codificacion
+        return response
+
+    @staticmethod
+    def _comprimir(compresor, partes):
+        pendiente = 0
+        for parte in partes:
+            salida = compresor.comprimir(parte)
+            pendiente += len(parte)
+            if pendiente >= BLOQUE_STREAMING:
+                salida += compresor.vaciar()
+                pendiente = 0
+            if salida:
+                yield salida
+        yield compresor.terminar()
+
+    @staticmethod
+    async def _comprimir_async(compresor, partes):
+        pendiente = 0
+        async for parte in partes:
+            salida = compresor.comprimir(parte)
+            pendiente += len(parte)
+            if pendiente >= BLOQUE_STREAMING:
+                salida += compresor.vaciar()
+                pendiente = 0
+            if salida:
+                yield salida
+        yield compresor.terminar()
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_evento_options_alter_evento_descripcion_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['usuario', 'fecha_inicio'], name='evento_usuario_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['usuario', 'fecha_fin'], name='evento_usuario_fin_idx'),
+        ),
+    ]
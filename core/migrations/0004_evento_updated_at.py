@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_evento_indices_rango'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evento',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Última modificación'),
+            preserve_default=False,
+        ),
+    ]
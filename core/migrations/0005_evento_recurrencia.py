@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_evento_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evento',
+            name='excepciones',
+            field=models.JSONField(blank=True, default=list, verbose_name='Fechas excluidas'),
+        ),
+        migrations.AddField(
+            model_name='evento',
+            name='fin_serie',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='evento',
+            name='intervalo',
+            field=models.PositiveSmallIntegerField(default=1, verbose_name='Cada'),
+        ),
+        migrations.AddField(
+            model_name='evento',
+            name='recurrencia',
+            field=models.CharField(blank=True, choices=[('diaria', 'Diaria'), ('semanal', 'Semanal'), ('mensual', 'Mensual')], default='', max_length=10, verbose_name='Repetición'),
+        ),
+        migrations.AddField(
+            model_name='evento',
+            name='repeticiones',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Cantidad de repeticiones'),
+        ),
+        migrations.AddField(
+            model_name='evento',
+            name='repetir_hasta',
+            field=models.DateField(blank=True, null=True, verbose_name='Repetir hasta'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:58
+
+from collections import Counter
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def poblar_conteos(apps, schema_editor):
+    """Calcula los conteos de los eventos existentes (ver core.conteos)"""
+    Evento = apps.get_model('core', 'Evento')
+    ConteoDiario = apps.get_model('core', 'ConteoDiario')
+    cantidades = Counter()
+    nuevos = Counter()
+    eventos = Evento.objects.filter(recurrencia='').values_list('usuario_id', 'fecha_inicio', 'fecha_fin')
+    for usuario_id, fecha_inicio, fecha_fin in eventos.iterator(chunk_size=1000):
+        dia = timezone.localtime(fecha_inicio).date()
+        fin = timezone.localtime(fecha_fin).date()
+        nuevos[usuario_id, dia] += 1
+        while True:
+            cantidades[usuario_id, dia] += 1
+            if dia >= fin:
+                break
+            dia += timedelta(days=1)
+            if dia.day == 1:
+                nuevos[usuario_id, dia] += 1
+    ConteoDiario.objects.bulk_create(
+        [
+            ConteoDiario(usuario_id=usuario_id, fecha=dia, cantidad=cantidad, nuevos_en_mes=nuevos[usuario_id, dia])
+            for (usuario_id, dia), cantidad in cantidades.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_evento_recurrencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConteoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('cantidad', models.IntegerField(default=0, verbose_name='Eventos del día')),
+                ('nuevos_en_mes', models.IntegerField(default=0, verbose_name='Eventos que comienzan en el mes')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conteos_diarios', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Conteo diario',
+                'verbose_name_plural': 'Conteos diarios',
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'fecha'), name='conteo_usuario_fecha_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_conteos, migrations.RunPython.noop),
+    ]
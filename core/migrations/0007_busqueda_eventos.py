@@ -0,0 +1,79 @@
+from django.db import migrations
+
+# Ver core.busqueda: el índice depende del motor de base de datos
+SQLITE = [
+    """
+    CREATE VIRTUAL TABLE core_evento_fts USING fts5(
+        titulo, descripcion,
+        content='core_evento', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER core_evento_fts_insertar AFTER INSERT ON core_evento BEGIN
+        INSERT INTO core_evento_fts(rowid, titulo, descripcion)
+        VALUES (new.id, new.titulo, new.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER core_evento_fts_eliminar AFTER DELETE ON core_evento BEGIN
+        INSERT INTO core_evento_fts(core_evento_fts, rowid, titulo, descripcion)
+        VALUES ('delete', old.id, old.titulo, old.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER core_evento_fts_actualizar
+    AFTER UPDATE OF titulo, descripcion ON core_evento BEGIN
+        INSERT INTO core_evento_fts(core_evento_fts, rowid, titulo, descripcion)
+        VALUES ('delete', old.id, old.titulo, old.descripcion);
+        INSERT INTO core_evento_fts(rowid, titulo, descripcion)
+        VALUES (new.id, new.titulo, new.descripcion);
+    END
+    """,
+    # Indexa los eventos existentes
+    "INSERT INTO core_evento_fts(core_evento_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERTIR = [
+    "DROP TRIGGER core_evento_fts_actualizar",
+    "DROP TRIGGER core_evento_fts_eliminar",
+    "DROP TRIGGER core_evento_fts_insertar",
+    "DROP TABLE core_evento_fts",
+]
+
+POSTGRESQL = [
+    """
+    ALTER TABLE core_evento ADD COLUMN busqueda tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX core_evento_busqueda ON core_evento USING GIN (busqueda)",
+]
+POSTGRESQL_REVERTIR = [
+    "DROP INDEX core_evento_busqueda",
+    "ALTER TABLE core_evento DROP COLUMN busqueda",
+]
+
+
+def _ejecutar(schema_editor, por_motor):
+    for sentencia in por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sentencia)
+
+
+def crear_indice(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQLITE, 'postgresql': POSTGRESQL})
+
+
+def eliminar_indice(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQLITE_REVERTIR, 'postgresql': POSTGRESQL_REVERTIR})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_conteodiario'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_busqueda_eventos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteArchivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha de corte')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Última modificación')),
+            ],
+            options={
+                'verbose_name': 'Corte de archivo',
+                'verbose_name_plural': 'Cortes de archivo',
+            },
+        ),
+        migrations.CreateModel(
+            name='EventoArchivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=200, verbose_name='Título')),
+                ('descripcion', models.TextField(blank=True, null=True, verbose_name='Descripción')),
+                ('fecha_inicio', models.DateTimeField(verbose_name='Fecha de inicio')),
+                ('fecha_fin', models.DateTimeField(verbose_name='Fecha de fin')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Última modificación')),
+                ('recurrencia', models.CharField(blank=True, choices=[('diaria', 'Diaria'), ('semanal', 'Semanal'), ('mensual', 'Mensual')], default='', max_length=10, verbose_name='Repetición')),
+                ('intervalo', models.PositiveSmallIntegerField(default=1, verbose_name='Cada')),
+                ('repetir_hasta', models.DateField(blank=True, null=True, verbose_name='Repetir hasta')),
+                ('repeticiones', models.PositiveIntegerField(blank=True, null=True, verbose_name='Cantidad de repeticiones')),
+                ('excepciones', models.JSONField(blank=True, default=list, verbose_name='Fechas excluidas')),
+                ('fin_serie', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos_archivados', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Evento archivado',
+                'verbose_name_plural': 'Eventos archivados',
+                'ordering': ['fecha_inicio'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['usuario', 'fecha_inicio'], name='archivado_usuario_inicio_idx'), models.Index(fields=['usuario', 'fecha_fin'], name='archivado_usuario_fin_idx')],
+            },
+        ),
+    ]
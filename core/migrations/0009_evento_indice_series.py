@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_evento_archivo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(condition=models.Q(('recurrencia', ''), _negated=True), fields=['usuario', 'fecha_inicio'], name='evento_serie_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoarchivado',
+            index=models.Index(condition=models.Q(('recurrencia', ''), _negated=True), fields=['usuario', 'fecha_inicio'], name='archivado_serie_inicio_idx'),
+        ),
+    ]
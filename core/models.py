@@ -1,8 +1,16 @@
 
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.db.models.functions import RowNumber, TruncMonth
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .recurrencia import ANOS_MAXIMOS_SERIE, FRECUENCIAS, REPETICIONES_MAXIMAS, calcular_fin_serie
+
 class UsuarioManager(BaseUserManager):
     def create_user(self, rut, password=None, **extra_fields):
         if not rut:
@@ -35,28 +43,177 @@ class Usuario(AbstractUser):
     def __str__(self) -> str:
         return str(self.rut)
 
-class Evento(models.Model):
+def _como_datetime(valor):
+    """Convierte una fecha en la medianoche de ese día en la zona horaria activa"""
+    if isinstance(valor, datetime):
+        return valor
+    return timezone.make_aware(datetime.combine(valor, time.min))
+
+# Duración máxima de un evento único (las series la aplican a cada ocurrencia).
+# Acota por abajo la búsqueda por fecha_inicio de overlapping: un evento que
+# ocurre en [start, end) comenzó después de start - DURACION_MAXIMA_EVENTO,
+# así que el índice (usuario, fecha_inicio) recorre un rango acotado y no toda
+# la historia del usuario. Lo más largo se registra como serie.
+DURACION_MAXIMA_EVENTO = timedelta(days=62)
+
+def rango_datetimes(start, end):
+    """Extremos de un rango de fechas como datetimes con zona horaria"""
+    return _como_datetime(start), _como_datetime(end)
+
+class EventoQuerySet(models.QuerySet):
+    def overlapping(self, start, end):
+        """
+        Eventos que ocurren dentro del rango semiabierto [start, end).
+
+        Acepta fechas o datetimes; las fechas se interpretan como medianoche en
+        la zona horaria activa. Se compara directamente contra las columnas
+        para que la consulta pueda usar los índices. Un evento que termina
+        justo a medianoche de `start` se considera dentro del rango, igual que
+        con `__date__gte`.
+
+        Las series recurrentes se incluyen si alguna de sus ocurrencias puede
+        caer en el rango; usar `recurrencia.expandir_eventos` para obtenerlas.
+
+        Los eventos únicos se buscan por un rango acotado de fecha_inicio (ver
+        DURACION_MAXIMA_EVENTO) y las series en otra subconsulta, unidas con
+        UNION ALL y cada una con su índice: con un OR en la misma consulta
+        la condición sobre las series impide usar un rango de índice para los
+        eventos únicos. El resultado es un queryset nuevo que selecciona por id
+        las filas encontradas; los filtros previos se aplican en las
+        subconsultas.
+        """
+        start, end = rango_datetimes(start, end)
+        unicos = self.filter(
+            recurrencia='',
+            fecha_inicio__gte=start - DURACION_MAXIMA_EVENTO,
+            fecha_inicio__lt=end,
+            fecha_fin__gte=start,
+        )
+        series = self.filter(
+            ~models.Q(recurrencia=''),
+            models.Q(fin_serie__isnull=True) | models.Q(fin_serie__gte=start),
+            fecha_inicio__lt=end,
+        )
+        ids = unicos.values('pk').order_by().union(series.values('pk').order_by(), all=True)
+        return self.model._default_manager.filter(pk__in=ids)
+
+    def primeros_por_mes(self, start, end, cantidad):
+        """
+        Los `cantidad` primeros eventos no recurrentes que comienzan en cada
+        mes de [start, end), numerados con una función de ventana para no
+        cargar el resto
+        """
+        return self.filter(
+            recurrencia='', fecha_inicio__gte=_como_datetime(start), fecha_inicio__lt=_como_datetime(end)
+        ).annotate(
+            posicion=models.Window(
+                RowNumber(),
+                partition_by=TruncMonth('fecha_inicio'),
+                order_by=[models.F('fecha_inicio').asc(), models.F('id').asc()],
+            )
+        ).filter(posicion__lte=cantidad).order_by('fecha_inicio', 'id')
+
+    def ocupan_varios_meses(self):
+        """
+        Eventos que pueden aparecer en un mes distinto al de su inicio: los que
+        abarcan más de un mes y las series recurrentes
+        """
+        return self.annotate(
+            mes_inicio=TruncMonth('fecha_inicio'), mes_fin=TruncMonth('fecha_fin')
+        ).filter(~models.Q(recurrencia='') | ~models.Q(mes_inicio=models.F('mes_fin')))
+
+    RESUMEN_CAMBIOS = {
+        'cantidad': models.Count('id'),
+        'ultima_modificacion': models.Max('updated_at'),
+    }
+
+    def resumen_cambios(self):
+        """
+        Cantidad de eventos y fecha de la última modificación, usados para
+        detectar cambios en un periodo sin cargar los eventos
+        """
+        return self.aggregate(**self.RESUMEN_CAMBIOS)
+
+    async def aresumen_cambios(self):
+        return await self.aaggregate(**self.RESUMEN_CAMBIOS)
+
+    async def aiterar(self, chunk_size):
+        """
+        Reemplazo de aiterator() para ``values_list``: en Django 5.2 ese
+        iterable ejecuta la consulta al crearlo, es decir en el event loop
+        (SynchronousOnlyOperation). Aquí se crea el generador perezoso de
+        iterator() y se avanza de a un lote en un hilo.
+        """
+        filas = self.iterator(chunk_size=chunk_size)
+        while lote := await sync_to_async(lambda: list(islice(filas, chunk_size)))():
+            for fila in lote:
+                yield fila
+
+class EventoBase(models.Model):
+    """
+    Campos y comportamiento comunes a los eventos activos (Evento) y a los
+    archivados (EventoArchivado), que tienen las mismas columnas.
+    """
     titulo = models.CharField(max_length=200, verbose_name=_("Título"))
     descripcion = models.TextField(blank=True, null=True, verbose_name=_("Descripción"))
     fecha_inicio = models.DateTimeField(verbose_name=_("Fecha de inicio"))
     fecha_fin = models.DateTimeField(verbose_name=_("Fecha de fin"))
-    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='eventos', verbose_name=_("Usuario"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Última modificación"))
+
+    # Regla de recurrencia (subconjunto de RRULE): la serie se guarda una sola vez
+    # y las ocurrencias se calculan al mostrar cada periodo
+    recurrencia = models.CharField(max_length=10, choices=FRECUENCIAS, blank=True, default='', verbose_name=_("Repetición"))
+    intervalo = models.PositiveSmallIntegerField(default=1, verbose_name=_("Cada"))
+    repetir_hasta = models.DateField(blank=True, null=True, verbose_name=_("Repetir hasta"))
+    repeticiones = models.PositiveIntegerField(blank=True, null=True, verbose_name=_("Cantidad de repeticiones"))
+    excepciones = models.JSONField(default=list, blank=True, verbose_name=_("Fechas excluidas"))
+    # Fin de la última ocurrencia; nulo si la serie no tiene fin
+    fin_serie = models.DateTimeField(blank=True, null=True, editable=False)
 
-    objects = models.Manager()  # Agregar explícitamente el manager
+    objects = EventoQuerySet.as_manager()
 
     class Meta:
-        verbose_name = _("Evento")
-        verbose_name_plural = _("Eventos")
+        abstract = True
         ordering = ['fecha_inicio']
 
     def __str__(self):
         return self.titulo
 
     def clean(self):
-        """Validar que la fecha de fin sea posterior a la fecha de inicio"""
+        """Validar que la fecha de fin sea posterior a la fecha de inicio y la regla de repetición"""
         from django.core.exceptions import ValidationError
         if self.fecha_inicio and self.fecha_fin and self.fecha_fin <= self.fecha_inicio:
             raise ValidationError(_("La fecha de fin debe ser posterior a la fecha de inicio."))
+        if self.fecha_inicio and self.fecha_fin and self.fecha_fin - self.fecha_inicio > DURACION_MAXIMA_EVENTO:
+            raise ValidationError(
+                _("Un evento no puede durar más de %(dias)s días; use una repetición.")
+                % {"dias": DURACION_MAXIMA_EVENTO.days}
+            )
+        if self.recurrencia:
+            if self.intervalo < 1:
+                raise ValidationError(_("El intervalo de repetición debe ser al menos 1."))
+            if self.repetir_hasta and self.repeticiones:
+                raise ValidationError(_("Indique una fecha límite o una cantidad de repeticiones, no ambas."))
+            if self.repetir_hasta and self.fecha_inicio and self.repetir_hasta < self.fecha_inicio.date():
+                raise ValidationError(_("La fecha límite debe ser posterior al inicio del evento."))
+            if self.repeticiones and self.repeticiones > REPETICIONES_MAXIMAS:
+                raise ValidationError(
+                    _("Una serie puede tener a lo más %(maximo)s repeticiones.") % {"maximo": REPETICIONES_MAXIMAS}
+                )
+            if (self.repetir_hasta and self.fecha_inicio
+                    and self.repetir_hasta.year - self.fecha_inicio.year > ANOS_MAXIMOS_SERIE):
+                raise ValidationError(
+                    _("La fecha límite no puede ser posterior al año %(year)s.")
+                    % {"year": self.fecha_inicio.year + ANOS_MAXIMOS_SERIE}
+                )
+
+    def save(self, *args, **kwargs):
+        self.fin_serie = calcular_fin_serie(self) if self.recurrencia else None
+        super().save(*args, **kwargs)
+
+    @property
+    def es_recurrente(self):
+        return bool(self.recurrencia)
 
     def es_evento_multidia(self):
         """Retorna True si el evento dura más de un día"""
@@ -71,3 +228,78 @@ class Evento(models.Model):
         return self.fecha_inicio.date() <= fecha <= self.fecha_fin.date()
 
 
+# El usuario se declara en cada modelo concreto (cada uno con su related_name)
+# y en la misma posición, para que las columnas de ambas tablas coincidan en
+# las consultas con UNION de core.archivo
+class Evento(EventoBase):
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='eventos', verbose_name=_("Usuario"))
+
+    class Meta(EventoBase.Meta):
+        verbose_name = _("Evento")
+        verbose_name_plural = _("Eventos")
+        indexes = [
+            models.Index(fields=['usuario', 'fecha_inicio'], name='evento_usuario_inicio_idx'),
+            models.Index(fields=['usuario', 'fecha_fin'], name='evento_usuario_fin_idx'),
+            # Solo las series: overlapping las busca aparte de los eventos únicos
+            models.Index(fields=['usuario', 'fecha_inicio'], condition=~models.Q(recurrencia=''),
+                         name='evento_serie_inicio_idx'),
+        ]
+
+
+class EventoArchivado(EventoBase):
+    """
+    Evento de un periodo anterior al corte de archivo (ver ``core.archivo``).
+    Conserva el id que tenía como Evento y no se edita desde la aplicación.
+    """
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='eventos_archivados', verbose_name=_("Usuario"))
+
+    class Meta(EventoBase.Meta):
+        verbose_name = _("Evento archivado")
+        verbose_name_plural = _("Eventos archivados")
+        indexes = [
+            models.Index(fields=['usuario', 'fecha_inicio'], name='archivado_usuario_inicio_idx'),
+            models.Index(fields=['usuario', 'fecha_fin'], name='archivado_usuario_fin_idx'),
+            models.Index(fields=['usuario', 'fecha_inicio'], condition=~models.Q(recurrencia=''),
+                         name='archivado_serie_inicio_idx'),
+        ]
+
+
+class CorteArchivo(models.Model):
+    """
+    Fila única con la fecha de corte del archivo: los eventos que terminan
+    antes de `fecha` (y las series que terminan antes) pueden estar en
+    EventoArchivado. La mantiene ``manage.py archivar_eventos``.
+    """
+    fecha = models.DateTimeField(verbose_name=_("Fecha de corte"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Última modificación"))
+
+    class Meta:
+        verbose_name = _("Corte de archivo")
+        verbose_name_plural = _("Cortes de archivo")
+
+    def __str__(self):
+        return f"{self.fecha:%Y-%m-%d %H:%M}"
+
+
+class ConteoDiario(models.Model):
+    """
+    Cantidad de eventos de un usuario en un día (en la zona horaria activa),
+    mantenida por ``core.conteos``. `nuevos_en_mes` cuenta los eventos cuyo
+    primer día dentro del mes es este, así que su suma por mes da la cantidad
+    de eventos distintos del mes. Las series recurrentes no se incluyen.
+    """
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='conteos_diarios', verbose_name=_("Usuario"))
+    fecha = models.DateField(verbose_name=_("Fecha"))
+    # Sin restricción de positivos: un conteo desfasado se corrige con reconstruir_conteos
+    cantidad = models.IntegerField(default=0, verbose_name=_("Eventos del día"))
+    nuevos_en_mes = models.IntegerField(default=0, verbose_name=_("Eventos que comienzan en el mes"))
+
+    class Meta:
+        verbose_name = _("Conteo diario")
+        verbose_name_plural = _("Conteos diarios")
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'fecha'], name='conteo_usuario_fecha_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario} {self.fecha}: {self.cantidad}"
@@ -0,0 +1,213 @@
+"""
+Expansión de eventos recurrentes.
+
+Una serie se guarda como un único ``Evento`` con su regla (frecuencia,
+intervalo, fecha límite o cantidad de repeticiones y fechas excluidas). Las
+ocurrencias se calculan solo para la ventana que se va a mostrar, saltando
+directamente a la primera ocurrencia relevante en lugar de recorrer la serie
+desde el principio.
+"""
+import copy
+from datetime import timedelta
+from functools import lru_cache
+
+from django.utils import timezone
+
+DIARIA = "diaria"
+SEMANAL = "semanal"
+MENSUAL = "mensual"
+FRECUENCIAS = (
+    (DIARIA, "Diaria"),
+    (SEMANAL, "Semanal"),
+    (MENSUAL, "Mensual"),
+)
+
+# Cotas de una serie acotada (ver EventoBase.clean): su fin se calcula al
+# guardar y la revisión de conflictos recorre sus ocurrencias
+REPETICIONES_MAXIMAS = 1000
+ANOS_MAXIMOS_SERIE = 10
+
+
+def _sumar_meses(fecha_hora, meses):
+    """Mismo día y hora `meses` después; None si ese día no existe en el mes"""
+    total = fecha_hora.month - 1 + meses
+    try:
+        return fecha_hora.replace(year=fecha_hora.year + total // 12, month=total % 12 + 1)
+    except ValueError:
+        return None
+
+
+def _paso(frecuencia, intervalo):
+    return timedelta(days=intervalo) if frecuencia == DIARIA else timedelta(weeks=intervalo)
+
+
+def _primer_indice(frecuencia, intervalo, inicio, duracion, desde):
+    """Índice de la primera ocurrencia que podría terminar dentro de la ventana"""
+    limite = desde - duracion
+    if limite <= inicio:
+        return 0
+    if frecuencia == MENSUAL:
+        meses = (limite.year - inicio.year) * 12 + limite.month - inicio.month
+        return max(0, meses // intervalo - 1)
+    return (limite - inicio) // _paso(frecuencia, intervalo)
+
+
+def _ultimo_indice(frecuencia, intervalo, inicio, hasta_fecha, repeticiones):
+    """
+    Índice de la última ocurrencia de una serie acotada por fecha límite o
+    por cantidad, o -1 si no tiene ninguna. Las series diarias y semanales se
+    calculan directamente; las mensuales recorren a lo más los meses que no
+    tienen el día de inicio. Como en RRULE COUNT, esos meses no cuentan como
+    repetición.
+    """
+    if hasta_fecha:
+        if frecuencia != MENSUAL:
+            return max(-1, (hasta_fecha - inicio.date()).days // _paso(frecuencia, intervalo).days)
+        indice = ((hasta_fecha.year - inicio.year) * 12 + hasta_fecha.month - inicio.month) // intervalo
+        while indice >= 0:
+            actual = _sumar_meses(inicio, indice * intervalo)
+            if actual is not None and actual.date() <= hasta_fecha:
+                break
+            indice -= 1
+        return indice
+    if frecuencia != MENSUAL or inicio.day <= 28:
+        return repeticiones - 1
+    ultimo = -1
+    indice = 0
+    while repeticiones:
+        # Fuera del rango de datetime la serie termina antes
+        if _sumar_meses(inicio.replace(day=1), indice * intervalo) is None:
+            break
+        if _sumar_meses(inicio, indice * intervalo) is not None:
+            ultimo = indice
+            repeticiones -= 1
+        indice += 1
+    return ultimo
+
+
+def _inicio_indice(frecuencia, intervalo, inicio, indice):
+    """Inicio de la ocurrencia `indice`; None si cae fuera del rango de datetime"""
+    if frecuencia == MENSUAL:
+        return _sumar_meses(inicio, indice * intervalo)
+    try:
+        return inicio + indice * _paso(frecuencia, intervalo)
+    except OverflowError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def inicios_en_ventana(frecuencia, intervalo, inicio, duracion, hasta_fecha, repeticiones, excepciones, desde, hasta):
+    """
+    Inicios (datetimes locales sin zona) de las ocurrencias que se cruzan con
+    [desde, hasta). Los meses que no tienen el día de inicio se omiten y no
+    cuentan como repetición.
+
+    El resultado se memoriza por proceso. La clave contiene todos los
+    parámetros de la regla, así que editar la serie produce una clave nueva
+    y nunca se reutiliza una expansión anterior.
+    """
+    resultado = []
+    ultimo = None
+    if hasta_fecha or repeticiones:
+        ultimo = _ultimo_indice(frecuencia, intervalo, inicio, hasta_fecha, repeticiones)
+    indice = _primer_indice(frecuencia, intervalo, inicio, duracion, desde)
+    while ultimo is None or indice <= ultimo:
+        if frecuencia == MENSUAL:
+            actual = _sumar_meses(inicio, indice * intervalo)
+            if actual is None:
+                inicio_mes = _sumar_meses(inicio.replace(day=1), indice * intervalo)
+                if inicio_mes is None or inicio_mes >= hasta:
+                    break
+                indice += 1
+                continue
+        else:
+            actual = inicio + indice * _paso(frecuencia, intervalo)
+        if actual >= hasta:
+            break
+        if actual + duracion >= desde and actual.date().isoformat() not in excepciones:
+            resultado.append(actual)
+        indice += 1
+    return tuple(resultado)
+
+
+def _local(valor):
+    return timezone.localtime(valor).replace(tzinfo=None)
+
+
+def _inicios(evento, desde, hasta, excepciones):
+    return inicios_en_ventana(
+        evento.recurrencia,
+        evento.intervalo,
+        _local(evento.fecha_inicio),
+        evento.fecha_fin - evento.fecha_inicio,
+        evento.repetir_hasta,
+        evento.repeticiones,
+        excepciones,
+        desde,
+        hasta,
+    )
+
+
+def calcular_fin_serie(evento):
+    """
+    Fin de la última ocurrencia de una serie acotada, o None si la serie no
+    tiene fin (o termina fuera del rango de datetime). Se calcula sin
+    expandir la serie. Las excepciones no se consideran: basta con una cota
+    superior.
+    """
+    if not (evento.repetir_hasta or evento.repeticiones):
+        return None
+    inicio = _local(evento.fecha_inicio)
+    ultimo = _ultimo_indice(evento.recurrencia, evento.intervalo, inicio, evento.repetir_hasta, evento.repeticiones)
+    if ultimo < 0:
+        return evento.fecha_fin
+    ultimo_inicio = _inicio_indice(evento.recurrencia, evento.intervalo, inicio, ultimo)
+    if ultimo_inicio is None:
+        return None
+    try:
+        return timezone.make_aware(ultimo_inicio) + (evento.fecha_fin - evento.fecha_inicio)
+    except OverflowError:
+        return None
+
+
+def inicios_locales(evento, desde, hasta):
+    """
+    Inicios de las ocurrencias de una serie dentro de [desde, hasta)
+    (datetimes con zona), como datetimes locales sin zona
+    """
+    return _inicios(evento, _local(desde), _local(hasta), tuple(evento.excepciones or ()))
+
+
+def ocurrencias(evento, desde, hasta):
+    """
+    Copias del evento, una por ocurrencia dentro de [desde, hasta) (datetimes
+    con zona). Cada copia conserva el pk de la serie.
+    """
+    duracion = evento.fecha_fin - evento.fecha_inicio
+    resultado = []
+    for inicio in inicios_locales(evento, desde, hasta):
+        ocurrencia = copy.copy(evento)
+        ocurrencia.fecha_inicio = timezone.make_aware(inicio)
+        ocurrencia.fecha_fin = ocurrencia.fecha_inicio + duracion
+        ocurrencia.es_ocurrencia = True
+        resultado.append(ocurrencia)
+    return resultado
+
+
+def expandir_eventos(eventos, desde, hasta):
+    """
+    Reemplaza cada serie por sus ocurrencias dentro de [desde, hasta) y
+    retorna la lista ordenada por fecha de inicio. Los eventos simples se
+    mantienen tal cual.
+    """
+    resultado = []
+    hay_series = False
+    for evento in eventos:
+        if evento.recurrencia:
+            hay_series = True
+            resultado.extend(ocurrencias(evento, desde, hasta))
+        else:
+            resultado.append(evento)
+    if hay_series:
+        resultado.sort(key=lambda evento: evento.fecha_inicio)
+    return resultado
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import conteos
+from .cache import invalidar_usuario
+from .metricas import registrar_login
+from .models import Evento
+
+
+@receiver([post_save, post_delete], sender=Evento)
+def invalidar_cache_calendario(sender, instance, **kwargs):
+    """Invalida los fragmentos cacheados del dueño del evento"""
+    invalidar_usuario(instance.usuario_id)
+
+
+def _estado_conteo(evento):
+    return (evento.usuario_id, evento.fecha_inicio, evento.fecha_fin, evento.recurrencia)
+
+
+@receiver(pre_save, sender=Evento)
+def recordar_estado_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda el estado que tenía el evento en la base para descontarlo después"""
+    instance._conteo_anterior = None
+    if instance.pk and not raw:
+        instance._conteo_anterior = Evento.objects.filter(pk=instance.pk).values_list(
+            'usuario_id', 'fecha_inicio', 'fecha_fin', 'recurrencia'
+        ).first()
+
+
+@receiver(post_save, sender=Evento)
+def actualizar_conteos_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        conteos.registrar_cambio(getattr(instance, '_conteo_anterior', None), _estado_conteo(instance))
+
+
+@receiver(post_delete, sender=Evento)
+def actualizar_conteos_eliminado(sender, instance, **kwargs):
+    conteos.registrar_cambio(_estado_conteo(instance), None)
+
+
+@receiver(user_logged_in)
+def contar_login_exitoso(sender, **kwargs):
+    registrar_login(True)
+
+
+@receiver(user_login_failed)
+def contar_login_fallido(sender, **kwargs):
+    registrar_login(False)
+
+
+@receiver(connection_created)
+def configurar_sqlite(sender, connection, **kwargs):
+    """Aplica SQLITE_PRAGMAS a cada conexión SQLite nueva"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, valor in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {valor}')
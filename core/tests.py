@@ -1,10 +1,22 @@
-from django.test import TestCase, Client
+from django.test import AsyncClient, TestCase, Client, override_settings
+from unittest import mock, skipUnless
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from datetime import datetime, date, timedelta
 from django.utils import timezone
 from django.utils.timezone import make_aware
+import csv
+import json
+import time
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
 from .models import Evento, Usuario
 from .forms import EventoForm, CustomUserCreationForm, CustomAuthenticationForm
 
@@ -523,3 +535,2074 @@ class IntegracionCompleta(TestCase):
         response = self.client.post(reverse('evento_eliminar', args=[evento.pk]))
         self.assertEqual(response.status_code, 302)
         self.assertFalse(Evento.objects.filter(pk=evento.pk).exists())
+
+
+class CalendarioAnualConsultasTest(TestCase):
+    """Pruebas de la vista anual con una cantidad fija de consultas"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        for mes in range(1, 13):
+            Evento.objects.create(
+                titulo=f'Evento Mes {mes}',
+                fecha_inicio=make_aware(datetime(2025, mes, 10, 9, 0)),
+                fecha_fin=make_aware(datetime(2025, mes, 10, 11, 0)),
+                usuario=self.usuario
+            )
+        # Evento que cruza de enero a febrero
+        Evento.objects.create(
+            titulo='Evento Entre Meses',
+            fecha_inicio=make_aware(datetime(2025, 1, 30, 9, 0)),
+            fecha_fin=make_aware(datetime(2025, 2, 2, 17, 0)),
+            usuario=self.usuario
+        )
+        self.client.login(username='12345678-9', password='testpassword123')
+    
+    def test_cantidad_consultas_constante(self):
+        """Prueba que la vista anual no hace una consulta por mes"""
+        # Usuario (la sesión sale de la caché), resumen para el ETag, conteos por
+        # mes, primeros eventos de cada mes y eventos de varios meses o series
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('calendario_anual', args=[2025]))
+        self.assertEqual(response.status_code, 200)
+    
+    def test_agrupacion_y_estadisticas(self):
+        """Prueba el reparto por mes y las estadísticas del año"""
+        response = self.client.get(reverse('calendario_anual', args=[2025]))
+        meses = response.context['meses_con_eventos']
+        self.assertEqual(meses[0]['cantidad'], 2)
+        self.assertEqual(meses[1]['cantidad'], 2)
+        self.assertEqual(meses[2]['cantidad'], 1)
+        self.assertEqual(response.context['total_eventos'], 14)
+        self.assertEqual(response.context['mes_mas_activo'], 'Enero')
+        self.assertEqual(response.context['meses_con_eventos_count'], 12)
+
+
+class EventoQuerySetTest(TestCase):
+    """Pruebas para las consultas de rango de eventos"""
+    
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.evento = Evento.objects.create(
+            titulo='Evento Rango',
+            fecha_inicio=make_aware(datetime(2025, 10, 14, 22, 0)),
+            fecha_fin=make_aware(datetime(2025, 10, 16, 0, 0)),
+            usuario=self.usuario
+        )
+    
+    def test_overlapping_con_fechas(self):
+        """Prueba que el rango por fechas coincide con la semántica por día"""
+        eventos = Evento.objects.filter(usuario=self.usuario)
+        self.assertTrue(eventos.overlapping(date(2025, 10, 14), date(2025, 10, 15)).exists())
+        # Termina exactamente a medianoche del 16: cuenta como parte de ese día
+        self.assertTrue(eventos.overlapping(date(2025, 10, 16), date(2025, 10, 17)).exists())
+        self.assertFalse(eventos.overlapping(date(2025, 10, 13), date(2025, 10, 14)).exists())
+        self.assertFalse(eventos.overlapping(date(2025, 10, 17), date(2025, 10, 18)).exists())
+    
+    def test_overlapping_con_datetimes(self):
+        """Prueba que el extremo final del rango es exclusivo"""
+        eventos = Evento.objects.filter(usuario=self.usuario)
+        inicio = make_aware(datetime(2025, 10, 14, 20, 0))
+        self.assertFalse(eventos.overlapping(inicio, self.evento.fecha_inicio).exists())
+        self.assertTrue(eventos.overlapping(inicio, self.evento.fecha_inicio + timedelta(minutes=1)).exists())
+    
+    def test_consulta_sin_conversion_de_fecha(self):
+        """Prueba que la consulta compara las columnas sin convertirlas a fecha"""
+        consulta = str(Evento.objects.filter(usuario=self.usuario).overlapping(
+            date(2025, 10, 1), date(2025, 11, 1)
+        ).query)
+        self.assertNotIn('django_datetime_cast_date', consulta)
+        self.assertNotIn('::date', consulta)
+    
+    @skipUnless(connection.vendor == 'sqlite', 'Plan de consulta de SQLite')
+    def test_series_con_su_propio_indice(self):
+        """Prueba que las series se buscan aparte, con el índice parcial de series"""
+        plan = Evento.objects.filter(usuario=self.usuario).overlapping(date(2025, 10, 1), date(2025, 11, 1)).explain()
+        self.assertIn('UNION ALL', plan)
+        self.assertIn('evento_serie_inicio_idx', plan)
+        # La consulta externa lee las filas encontradas por id
+        self.assertIn('INTEGER PRIMARY KEY', plan)
+    
+    @skipUnless(connection.vendor == 'sqlite', 'Plan de consulta de SQLite')
+    def test_eventos_unicos_por_rango_acotado(self):
+        """Prueba que los eventos únicos se buscan por un rango de fecha_inicio con ambos extremos"""
+        plan = Evento.objects.filter(usuario=self.usuario).overlapping(date(2025, 10, 1), date(2025, 11, 1)).explain()
+        self.assertIn('evento_usuario_inicio_idx (usuario_id=? AND fecha_inicio>? AND fecha_inicio<?)', plan)
+    
+    def test_evento_de_duracion_maxima(self):
+        """Prueba que un evento de la duración máxima se encuentra al final de su rango"""
+        from .models import DURACION_MAXIMA_EVENTO
+        inicio = make_aware(datetime(2025, 1, 1, 9, 0))
+        largo = Evento(titulo='Pasantía', usuario=self.usuario, fecha_inicio=inicio,
+                       fecha_fin=inicio + DURACION_MAXIMA_EVENTO)
+        largo.full_clean()
+        largo.save()
+        fin = largo.fecha_fin.date()
+        self.assertTrue(Evento.objects.filter(usuario=self.usuario).overlapping(fin, fin + timedelta(days=1)).exists())
+        largo.fecha_fin += timedelta(minutes=1)
+        with self.assertRaisesMessage(ValidationError, 'no puede durar más de'):
+            largo.full_clean()
+    
+    def test_overlapping_incluye_series(self):
+        """Prueba que una serie sin fin se incluye aunque su primera ocurrencia sea anterior"""
+        serie = Evento.objects.create(
+            titulo='Serie', recurrencia='weekly', usuario=self.usuario,
+            fecha_inicio=make_aware(datetime(2024, 1, 1, 9, 0)),
+            fecha_fin=make_aware(datetime(2024, 1, 1, 10, 0)),
+        )
+        eventos = Evento.objects.filter(usuario=self.usuario)
+        self.assertEqual(
+            set(eventos.overlapping(date(2025, 10, 1), date(2025, 11, 1))), {self.evento, serie}
+        )
+        self.assertEqual(list(eventos.overlapping(date(2023, 1, 1), date(2023, 2, 1))), [])
+
+
+class IndiceEventosPorDiaTest(TestCase):
+    """Pruebas para el índice de eventos por día de la vista mensual"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.evento_multidia = Evento.objects.create(
+            titulo='Jornada',
+            fecha_inicio=make_aware(datetime(2025, 10, 20, 18, 0)),
+            fecha_fin=make_aware(datetime(2025, 10, 22, 10, 0)),
+            usuario=self.usuario
+        )
+        self.evento_dia = Evento.objects.create(
+            titulo='Reunión',
+            fecha_inicio=make_aware(datetime(2025, 10, 21, 9, 0)),
+            fecha_fin=make_aware(datetime(2025, 10, 21, 10, 0)),
+            usuario=self.usuario
+        )
+    
+    def test_segmentos_evento_multidia(self):
+        """Prueba que cada día recibe el tramo correcto de cada evento"""
+        from .calendario import indexar_eventos_por_dia
+        dias = [date(2025, 10, 19) + timedelta(days=i) for i in range(5)]
+        indice = indexar_eventos_por_dia(Evento.objects.order_by('fecha_inicio'), dias)
+        self.assertEqual(indice[date(2025, 10, 19)], [])
+        self.assertEqual([item.segmento for item in indice[date(2025, 10, 20)]], ['inicio'])
+        self.assertEqual(
+            [(item.evento.titulo, item.segmento) for item in indice[date(2025, 10, 21)]],
+            [('Jornada', 'continua'), ('Reunión', 'unico')]
+        )
+        self.assertEqual([item.segmento for item in indice[date(2025, 10, 22)]], ['fin'])
+        self.assertEqual(indice[date(2025, 10, 23)], [])
+    
+    def test_vista_mensual_usa_indice(self):
+        """Prueba que la vista mensual entrega los eventos ya asignados a cada celda"""
+        self.client.login(username='12345678-9', password='testpassword123')
+        response = self.client.get(reverse('calendario_mensual', args=[2025, 10]))
+        celdas = {
+            dia['date']: dia['eventos']
+            for semana in response.context['month_days'] for dia in semana
+        }
+        self.assertEqual(len(celdas[date(2025, 10, 21)]), 2)
+        self.assertEqual(celdas[date(2025, 10, 22)][0].evento, self.evento_multidia)
+        self.assertContains(response, '═ Jornada ═')
+
+
+class CalendarioSemanalISOTest(TestCase):
+    """Pruebas de la vista semanal con semanas ISO y una sola consulta"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.evento = Evento.objects.create(
+            titulo='Congreso',
+            fecha_inicio=make_aware(datetime(2020, 12, 30, 9, 0)),
+            fecha_fin=make_aware(datetime(2021, 1, 1, 17, 0)),
+            usuario=self.usuario
+        )
+        self.client.login(username='12345678-9', password='testpassword123')
+    
+    def test_semana_53_y_navegacion(self):
+        """Prueba un año ISO con 53 semanas y la navegación entre años"""
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('calendario_semanal', args=[2020, 53]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['start_of_week'], date(2020, 12, 28))
+        self.assertEqual((response.context['next_year'], response.context['next_week']), (2021, 1))
+        self.assertEqual((response.context['prev_year'], response.context['prev_week']), (2020, 52))
+        
+        response = self.client.get(reverse('calendario_semanal', args=[2021, 1]))
+        self.assertEqual((response.context['prev_year'], response.context['prev_week']), (2020, 53))
+    
+    def test_evento_multidia_en_cada_dia(self):
+        """Prueba que el evento multi-día se reparte en todos los días que cubre"""
+        response = self.client.get(reverse('calendario_semanal', args=[2020, 53]))
+        segmentos = [
+            [item.segmento for item in dia['eventos']]
+            for dia in response.context['week_days']
+        ]
+        self.assertEqual(segmentos, [[], [], ['inicio'], ['continua'], ['fin'], [], []])
+    
+    def test_semana_inexistente(self):
+        """Prueba que una semana fuera del año ISO responde 404"""
+        response = self.client.get(reverse('calendario_semanal', args=[2025, 53]))
+        self.assertEqual(response.status_code, 404)
+    
+    def test_marca_de_hoy_fuera_del_fragmento(self):
+        """Prueba que el día de hoy se marca fuera del fragmento cacheado y cambia el ETag"""
+        caches['calendario'].clear()
+        url = reverse('calendario_semanal', args=[2020, 53])
+        
+        def con_hoy(hoy):
+            class Fecha(date):
+                @classmethod
+                def today(cls):
+                    return hoy
+            return mock.patch('core.views.date', Fecha)
+        
+        with con_hoy(date(2020, 12, 30)):
+            response = self.client.get(url)
+        self.assertContains(response, '.card-header[data-fecha="2020-12-30"]')
+        self.assertNotContains(response, 'bg-primary text-white')
+        etag = response['ETag']
+        
+        # Al día siguiente el fragmento viene de la caché, pero la marca y el ETag cambian
+        with con_hoy(date(2020, 12, 31)), self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '.card-header[data-fecha="2020-12-31"]')
+        self.assertNotEqual(response['ETag'], etag)
+        
+        # Una semana que no contiene el día de hoy no lleva la marca
+        with con_hoy(date(2021, 1, 4)):
+            response = self.client.get(url)
+        self.assertNotContains(response, '.card-header[data-fecha=')
+
+
+class CacheCalendarioTest(TestCase):
+    """Pruebas para la caché versionada de fragmentos del calendario"""
+    
+    def setUp(self):
+        caches['calendario'].clear()
+        self.client = Client()
+        self.superusuario = Usuario.objects.create_superuser(
+            rut='87654321-0',
+            password='adminpassword123'
+        )
+        self.otro = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.evento = Evento.objects.create(
+            titulo='Evento Cacheado',
+            fecha_inicio=make_aware(datetime(2025, 10, 15, 9, 0)),
+            fecha_fin=make_aware(datetime(2025, 10, 15, 17, 0)),
+            usuario=self.superusuario
+        )
+        self.client.login(username='87654321-0', password='adminpassword123')
+    
+    def test_segunda_visita_no_consulta_eventos(self):
+        """Prueba que un fragmento cacheado evita la consulta de eventos"""
+        url = reverse('calendario_mensual', args=[2025, 10])
+        self.client.get(url)
+        # Solo el usuario; la sesión sale de la caché
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertContains(response, 'Evento Cacheado')
+    
+    def test_crud_invalida_fragmentos_del_usuario(self):
+        """Prueba que crear, editar y eliminar eventos invalida la caché del dueño"""
+        url = reverse('calendario_diario', args=[2025, 10, 15])
+        self.client.get(url)
+        self.client.post(reverse('evento_editar', args=[self.evento.pk]), {
+            'titulo': 'Evento Renombrado',
+            'fecha_inicio': '2025-10-15T09:00',
+            'fecha_fin': '2025-10-15T17:00'
+        })
+        self.assertContains(self.client.get(url), 'Evento Renombrado')
+        
+        self.client.post(reverse('evento_crear'), {
+            'titulo': 'Evento Nuevo',
+            'fecha_inicio': '2025-10-15T18:00',
+            'fecha_fin': '2025-10-15T19:00'
+        })
+        self.assertContains(self.client.get(url), 'Evento Nuevo')
+        
+        self.client.post(reverse('evento_eliminar', args=[self.evento.pk]))
+        self.assertNotContains(self.client.get(url), 'Evento Renombrado')
+    
+    def test_invalidacion_solo_afecta_al_dueno(self):
+        """Prueba que los cambios de un usuario no invalidan la caché de otro"""
+        from .cache import version_usuario
+        version_otro = version_usuario(self.otro.pk)
+        version_admin = version_usuario(self.superusuario.pk)
+        Evento.objects.create(
+            titulo='Otro Evento',
+            fecha_inicio=make_aware(datetime(2025, 10, 16, 9, 0)),
+            fecha_fin=make_aware(datetime(2025, 10, 16, 10, 0)),
+            usuario=self.superusuario
+        )
+        self.assertEqual(version_usuario(self.otro.pk), version_otro)
+        self.assertNotEqual(version_usuario(self.superusuario.pk), version_admin)
+
+
+class GetCondicionalTest(TestCase):
+    """Pruebas para ETag y respuestas 304 de las vistas del calendario"""
+    
+    def setUp(self):
+        caches['calendario'].clear()
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.evento = Evento.objects.create(
+            titulo='Evento Condicional',
+            fecha_inicio=make_aware(datetime(2025, 10, 15, 9, 0)),
+            fecha_fin=make_aware(datetime(2025, 10, 15, 17, 0)),
+            usuario=self.usuario
+        )
+        self.client.login(username='12345678-9', password='testpassword123')
+        self.url = reverse('calendario_mensual', args=[2025, 10])
+    
+    def test_etag_y_304(self):
+        """Prueba que un If-None-Match vigente responde 304 sin renderizar"""
+        response = self.client.get(self.url)
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+        
+        caches['calendario'].clear()
+        # Usuario y el resumen del periodo; no se cargan eventos
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+    
+    def test_etag_cambia_con_los_eventos(self):
+        """Prueba que editar o eliminar eventos del periodo cambia el ETag"""
+        etag = self.client.get(self.url).headers['ETag']
+        self.evento.titulo = 'Evento Editado'
+        self.evento.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Evento Editado')
+        
+        etag = response.headers['ETag']
+        self.evento.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+    
+    def test_etag_distinto_por_periodo(self):
+        """Prueba que cada periodo tiene su propio ETag"""
+        etag_octubre = self.client.get(self.url).headers['ETag']
+        response = self.client.get(
+            reverse('calendario_mensual', args=[2025, 11]), HTTP_IF_NONE_MATCH=etag_octubre
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class EventosAPITest(TestCase):
+    """Pruebas para la API JSON de eventos"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        otro = Usuario.objects.create_user(rut='11111111-1', password='testpassword123')
+        inicio = make_aware(datetime(2025, 10, 1, 9, 0))
+        for i in range(5):
+            Evento.objects.create(
+                titulo=f'Evento {i}',
+                fecha_inicio=inicio + timedelta(days=i),
+                fecha_fin=inicio + timedelta(days=i, hours=1),
+                usuario=self.usuario
+            )
+        # Dos eventos con la misma hora de inicio para probar el desempate por id
+        Evento.objects.create(
+            titulo='Evento Empate',
+            fecha_inicio=inicio,
+            fecha_fin=inicio + timedelta(hours=2),
+            usuario=self.usuario
+        )
+        Evento.objects.create(
+            titulo='Evento Ajeno',
+            fecha_inicio=inicio,
+            fecha_fin=inicio + timedelta(hours=1),
+            usuario=otro
+        )
+        self.client.login(username='12345678-9', password='testpassword123')
+        self.url = reverse('api_eventos')
+    
+    def _pedir(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+    
+    def test_paginacion_por_cursor(self):
+        """Prueba que las páginas recorren todos los eventos sin repetir"""
+        titulos = []
+        params = {'start': '2025-10-01', 'end': '2025-11-01', 'limit': 2}
+        while True:
+            datos = self._pedir(**params)
+            titulos += [evento['titulo'] for evento in datos['eventos']]
+            if not datos['siguiente']:
+                break
+            params['cursor'] = datos['siguiente']
+        self.assertEqual(
+            titulos,
+            ['Evento 0', 'Evento Empate', 'Evento 1', 'Evento 2', 'Evento 3', 'Evento 4']
+        )
+    
+    def test_filtro_por_rango(self):
+        """Prueba que solo se retornan eventos del rango solicitado"""
+        datos = self._pedir(start='2025-10-02', end='2025-10-04')
+        self.assertEqual([evento['titulo'] for evento in datos['eventos']], ['Evento 1', 'Evento 2'])
+        self.assertIsNone(datos['siguiente'])
+        self.assertEqual(
+            set(datos['eventos'][0]),
+            {'id', 'titulo', 'descripcion', 'fecha_inicio', 'fecha_fin', 'recurrencia'}
+        )
+    
+    def test_parametros_invalidos(self):
+        """Prueba que parámetros faltantes o mal formados responden 400"""
+        self.assertEqual(self.client.get(self.url, {'start': '2025-10-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': 'ayer', 'end': '2025-10-02'}).status_code, 400)
+        response = self.client.get(self.url, {'start': '2025-10-01', 'end': '2025-10-02', 'cursor': '!!'})
+        self.assertEqual(response.status_code, 400)
+    
+    async def test_streaming_asincrono_bajo_asgi(self):
+        """Prueba que bajo ASGI la página se envía con un iterador asíncrono, también comprimida"""
+        client = AsyncClient()
+        await client.aforce_login(self.usuario)
+        params = {'start': '2025-10-01', 'end': '2025-11-01', 'limit': 2}
+        response = await client.get(self.url, params)
+        self.assertTrue(response.is_async)
+        datos = json.loads(b''.join([parte async for parte in response.streaming_content]))
+        self.assertEqual([evento['titulo'] for evento in datos['eventos']], ['Evento 0', 'Evento Empate'])
+        self.assertIsNotNone(datos['siguiente'])
+        
+        response = await client.get(self.url, params, headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertTrue(response.is_async)
+    
+    def test_requiere_autenticacion(self):
+        """Prueba que sin sesión la API responde 401 en lugar de redirigir"""
+        self.client.logout()
+        response = self.client.get(self.url, {'start': '2025-10-01', 'end': '2025-10-02'})
+        self.assertEqual(response.status_code, 401)
+
+
+class FeedICSTest(TestCase):
+    """Pruebas para el feed iCalendar de suscripción"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        Evento.objects.create(
+            titulo='Consejo; de profesores, 2025',
+            descripcion='Primera línea\nSegunda línea ' + 'á' * 60,
+            fecha_inicio=make_aware(datetime(2025, 10, 15, 9, 0)),
+            fecha_fin=make_aware(datetime(2025, 10, 15, 17, 0)),
+            usuario=self.usuario
+        )
+        from .ical import token_suscripcion
+        self.url = reverse('eventos_ics', args=[token_suscripcion(self.usuario)])
+    
+    def test_feed_en_streaming(self):
+        """Prueba el contenido del feed y su formato"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response.headers['Content-Type'], 'text/calendar; charset=utf-8')
+        contenido = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(contenido.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn('SUMMARY:Consejo\; de profesores\\, 2025\r\n', contenido)
+        self.assertIn('DTSTART:20251015T090000Z\r\n', contenido)
+        self.assertIn('DESCRIPTION:Primera línea\\nSegunda línea', contenido)
+        for linea in contenido.split('\r\n'):
+            self.assertLessEqual(len(linea.encode('utf-8')), 75)
+    
+    async def test_feed_asincrono_bajo_asgi(self):
+        """Prueba que bajo ASGI el feed se envía con un iterador asíncrono"""
+        import zlib
+        
+        response = await AsyncClient().get(self.url, headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        contenido = zlib.decompress(b''.join([parte async for parte in response.streaming_content]), 31)
+        self.assertTrue(contenido.startswith(b'BEGIN:VCALENDAR\r\n'))
+        self.assertIn(b'DTSTART:20251015T090000Z\r\n', contenido)
+        self.assertTrue(contenido.endswith(b'END:VCALENDAR\r\n'))
+    
+    def test_feed_sin_cambios_responde_304(self):
+        """Prueba que un feed sin cambios cuesta solo el usuario y el resumen"""
+        etag = self.client.get(self.url).headers['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_token_invalido_o_revocado(self):
+        """Prueba que un token alterado o anterior a un cambio de clave no sirve"""
+        token = self.url.split('/')[-2]
+        self.assertEqual(self.client.get(reverse('eventos_ics', args=[token + 'x'])).status_code, 404)
+        self.usuario.set_password('otraclave456')
+        self.usuario.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ImportarEventosTest(TestCase):
+    """Pruebas para la importación masiva de eventos"""
+    
+    CSV = (
+        "titulo,descripcion,fecha_inicio,fecha_fin\n"
+        "Clase 1,Aula 3,2025-03-03T08:00,2025-03-03T09:30\n"
+        "Clase 2,,2025-03-04T08:00,2025-03-04T09:30\n"
+        ",Sin título,2025-03-05T08:00,2025-03-05T09:30\n"
+        "Clase 4,Fechas invertidas,2025-03-06T10:00,2025-03-06T09:00\n"
+        "Clase 5,Fecha inválida,mañana,2025-03-07T09:30\n"
+        "Clase 6,,2025-03-10T08:00,2025-03-10T09:30\n"
+    )
+    ICS = (
+        "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+        "BEGIN:VEVENT\r\nSUMMARY:Consejo\\, escolar\r\n"
+        "DESCRIPTION:Primera línea\\nsegunda\r\n  línea\r\n"
+        "DTSTART:20250310T120000Z\r\nDTEND:20250310T130000Z\r\nEND:VEVENT\r\n"
+        "BEGIN:VEVENT\r\nSUMMARY:Feriado\r\n"
+        "DTSTART;VALUE=DATE:20250418\r\nDTEND;VALUE=DATE:20250419\r\nEND:VEVENT\r\n"
+        "END:VCALENDAR\r\n"
+    )
+    
+    def setUp(self):
+        self.usuario = Usuario.objects.create_superuser(
+            rut='87654321-0',
+            password='adminpassword123'
+        )
+    
+    def _archivo(self, contenido, sufijo, encoding='utf-8'):
+        archivo = tempfile.NamedTemporaryFile('w', suffix=sufijo, delete=False, encoding=encoding)
+        archivo.write(contenido)
+        archivo.close()
+        self.addCleanup(os.unlink, archivo.name)
+        return archivo.name
+    
+    def test_comando_archivo_invalido(self):
+        """Prueba que el comando rechaza un archivo que no es UTF-8 o CSV válido sin traceback"""
+        from django.core.management.base import CommandError
+        archivos = (
+            self._archivo(self.CSV + 'Sesión,,2025-01-01T10:00,2025-01-01T11:00\n', '.csv', encoding='latin-1'),
+            self._archivo('titulo\n"' + 'x' * (csv.field_size_limit() + 1), '.csv'),
+        )
+        for archivo in archivos:
+            with self.subTest(archivo=archivo), self.assertRaisesMessage(CommandError, 'Archivo rechazado'):
+                call_command('import_eventos', archivo, rut='87654321-0', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Evento.objects.count(), 0)
+    
+    def test_comando_csv_por_lotes(self):
+        """Prueba la importación CSV con lotes pequeños y filas rechazadas"""
+        salida, errores = StringIO(), StringIO()
+        call_command(
+            'import_eventos', self._archivo(self.CSV, '.csv'),
+            rut='87654321-0', lote=2, stdout=salida, stderr=errores
+        )
+        self.assertEqual(
+            list(Evento.objects.order_by('fecha_inicio').values_list('titulo', flat=True)),
+            ['Clase 1', 'Clase 2', 'Clase 6']
+        )
+        self.assertIn('Importados 3 eventos', salida.getvalue())
+        self.assertIn('3 filas rechazadas', salida.getvalue())
+        self.assertIn('Línea 4: El título es obligatorio.', errores.getvalue())
+        self.assertIn('Línea 5: La fecha de fin debe ser posterior', errores.getvalue())
+        self.assertIn('Línea 6: La fecha de inicio no es válida.', errores.getvalue())
+    
+    def test_importar_ics(self):
+        """Prueba la importación de un archivo iCalendar"""
+        call_command('import_eventos', self._archivo(self.ICS, '.ics'), rut='87654321-0', stdout=StringIO())
+        consejo = Evento.objects.get(titulo='Consejo, escolar')
+        self.assertEqual(consejo.descripcion, 'Primera línea\nsegunda línea')
+        self.assertEqual(consejo.fecha_inicio, make_aware(datetime(2025, 3, 10, 12, 0)))
+        feriado = Evento.objects.get(titulo='Feriado')
+        self.assertFalse(feriado.es_evento_multidia())
+    
+    def test_importacion_invalida_cache(self):
+        """Prueba que los eventos importados aparecen en el calendario ya cacheado"""
+        caches['calendario'].clear()
+        client = Client()
+        client.login(username='87654321-0', password='adminpassword123')
+        url = reverse('calendario_mensual', args=[2025, 3])
+        self.assertNotContains(client.get(url), 'Clase 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_eventos', self._archivo(self.CSV, '.csv'), rut='87654321-0',
+                         stdout=StringIO(), stderr=StringIO())
+        self.assertContains(client.get(url), 'Clase 1')
+    
+    def test_carga_desde_admin(self):
+        """Prueba la vista de carga de archivos en el admin"""
+        client = Client()
+        client.login(username='87654321-0', password='adminpassword123')
+        self.assertContains(client.get(reverse('admin:core_evento_changelist')), 'Importar eventos')
+        url = reverse('admin:core_evento_importar')
+        self.assertEqual(client.get(url).status_code, 200)
+        response = client.post(url, {
+            'archivo': SimpleUploadedFile('eventos.csv', self.CSV.encode('utf-8')),
+            'usuario': self.usuario.pk,
+            'lote': 100,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'El título es obligatorio.')
+        self.assertEqual(Evento.objects.count(), 3)
+    
+    def test_archivo_invalido_desde_admin(self):
+        """Prueba que un archivo que no es UTF-8 o CSV válido se rechaza sin error 500"""
+        client = Client()
+        client.login(username='87654321-0', password='adminpassword123')
+        url = reverse('admin:core_evento_importar')
+        for contenido in (self.CSV.encode('latin-1') + 'Sesión'.encode('latin-1'), b'titulo\n"' + b'x' * (csv.field_size_limit() + 1)):
+            response = client.post(url, {
+                'archivo': SimpleUploadedFile('eventos.csv', contenido),
+                'usuario': self.usuario.pk,
+                'lote': 100,
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Archivo rechazado')
+        self.assertEqual(Evento.objects.count(), 0)
+
+
+class EventosRecurrentesTest(TestCase):
+    """Pruebas para las series de eventos recurrentes"""
+    
+    def setUp(self):
+        caches['calendario'].clear()
+        self.client = Client()
+        self.usuario = Usuario.objects.create_superuser(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.client.login(username='12345678-9', password='testpassword123')
+    
+    def _serie(self, **regla):
+        return Evento.objects.create(
+            titulo='Historia',
+            fecha_inicio=make_aware(datetime(2025, 3, 3, 8, 0)),
+            fecha_fin=make_aware(datetime(2025, 3, 3, 9, 30)),
+            usuario=self.usuario,
+            **regla
+        )
+    
+    def _inicios(self, serie, desde, hasta):
+        from .recurrencia import ocurrencias
+        return [o.fecha_inicio.date() for o in ocurrencias(serie, make_aware(desde), make_aware(hasta))]
+    
+    def test_serie_semanal_en_ventana(self):
+        """Prueba que solo se expanden las ocurrencias del periodo pedido"""
+        serie = self._serie(recurrencia='semanal')
+        self.assertIsNone(serie.fin_serie)
+        self.assertEqual(
+            self._inicios(serie, datetime(2025, 6, 1), datetime(2025, 7, 1)),
+            [date(2025, 6, 2), date(2025, 6, 9), date(2025, 6, 16), date(2025, 6, 23), date(2025, 6, 30)]
+        )
+        self.assertEqual(Evento.objects.count(), 1)
+    
+    def test_limites_y_excepciones(self):
+        """Prueba la cantidad de repeticiones, la fecha límite y las fechas excluidas"""
+        serie = self._serie(recurrencia='diaria', intervalo=2, repeticiones=3, excepciones=['2025-03-05'])
+        self.assertEqual(
+            self._inicios(serie, datetime(2025, 3, 1), datetime(2025, 4, 1)),
+            [date(2025, 3, 3), date(2025, 3, 7)]
+        )
+        self.assertEqual(serie.fin_serie, make_aware(datetime(2025, 3, 7, 9, 30)))
+        mensual = self._serie(recurrencia='mensual', repetir_hasta=date(2025, 5, 31))
+        self.assertEqual(
+            self._inicios(mensual, datetime(2025, 1, 1), datetime(2026, 1, 1)),
+            [date(2025, 3, 3), date(2025, 4, 3), date(2025, 5, 3)]
+        )
+        self.assertFalse(
+            Evento.objects.filter(pk=mensual.pk).overlapping(date(2025, 6, 1), date(2025, 7, 1)).exists()
+        )
+    
+    def test_mensual_cuenta_solo_meses_con_el_dia(self):
+        """Prueba que, como COUNT de RRULE, los meses sin el día 31 no cuentan como repetición"""
+        serie = Evento.objects.create(
+            titulo='Cierre', usuario=self.usuario, recurrencia='mensual', repeticiones=3,
+            fecha_inicio=make_aware(datetime(2026, 1, 31, 18, 0)),
+            fecha_fin=make_aware(datetime(2026, 1, 31, 19, 0)),
+        )
+        self.assertEqual(
+            self._inicios(serie, datetime(2026, 1, 1), datetime(2027, 1, 1)),
+            [date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31)]
+        )
+        # La ventana puede comenzar después de la primera ocurrencia
+        self.assertEqual(self._inicios(serie, datetime(2026, 5, 1), datetime(2026, 6, 1)), [date(2026, 5, 31)])
+        self.assertEqual(serie.fin_serie, make_aware(datetime(2026, 5, 31, 19, 0)))
+    
+    def test_fin_de_serie_sin_expandir(self):
+        """Prueba que el fin de una serie muy larga se calcula sin recorrer sus ocurrencias"""
+        inicio = time.perf_counter()
+        serie = self._serie(recurrencia='diaria', repetir_hasta=date(8999, 12, 31))
+        self.assertLess(time.perf_counter() - inicio, 1)
+        self.assertEqual(serie.fin_serie, make_aware(datetime(8999, 12, 31, 9, 30)))
+    
+    def test_fin_de_serie_coincide_con_la_expansion(self):
+        """Prueba el fin calculado contra la última ocurrencia expandida"""
+        from .recurrencia import inicios_locales
+        reglas = [
+            {'recurrencia': 'diaria', 'intervalo': 3, 'repetir_hasta': date(2025, 4, 20)},
+            {'recurrencia': 'semanal', 'intervalo': 2, 'repetir_hasta': date(2025, 6, 1)},
+            {'recurrencia': 'semanal', 'repeticiones': 7},
+            {'recurrencia': 'mensual', 'intervalo': 2, 'repetir_hasta': date(2026, 2, 2)},
+            {'recurrencia': 'diaria', 'repetir_hasta': date(2025, 3, 2)},
+        ]
+        for regla in reglas:
+            with self.subTest(**regla):
+                serie = self._serie(**regla)
+                inicios = inicios_locales(serie, serie.fecha_inicio, serie.fecha_inicio + timedelta(days=3 * 365))
+                esperado = make_aware(inicios[-1]) + timedelta(minutes=90) if inicios else serie.fecha_fin
+                self.assertEqual(serie.fin_serie, esperado)
+        dia_31 = Evento.objects.create(
+            titulo='Cierre', usuario=self.usuario, recurrencia='mensual', repetir_hasta=date(2026, 6, 30),
+            fecha_inicio=make_aware(datetime(2026, 1, 31, 18, 0)),
+            fecha_fin=make_aware(datetime(2026, 1, 31, 19, 0)),
+        )
+        self.assertEqual(dia_31.fin_serie, make_aware(datetime(2026, 5, 31, 19, 0)))
+    
+    def test_limites_de_la_serie_en_el_formulario(self):
+        """Prueba que el formulario no acepta series con demasiadas repeticiones o demasiado largas"""
+        datos = {
+            'titulo': 'Historia',
+            'fecha_inicio': '2025-03-03T08:00',
+            'fecha_fin': '2025-03-03T09:30',
+            'recurrencia': 'diaria',
+        }
+        response = self.client.post(reverse('evento_crear'), {**datos, 'repeticiones': '1001'})
+        self.assertContains(response, 'a lo más 1000 repeticiones')
+        response = self.client.post(reverse('evento_crear'), {**datos, 'repetir_hasta': '8999-12-31'})
+        self.assertContains(response, 'no puede ser posterior al año 2035')
+        self.assertFalse(Evento.objects.exists())
+    
+    def test_regla_invalida(self):
+        """Prueba que no se acepta una fecha límite junto con una cantidad"""
+        serie = Evento(
+            titulo='Serie', usuario=self.usuario, recurrencia='semanal',
+            fecha_inicio=make_aware(datetime(2025, 3, 3, 8, 0)),
+            fecha_fin=make_aware(datetime(2025, 3, 3, 9, 0)),
+            repetir_hasta=date(2025, 6, 1), repeticiones=4,
+        )
+        with self.assertRaises(ValidationError):
+            serie.clean()
+    
+    def test_vista_mensual_muestra_ocurrencias(self):
+        """Prueba que el calendario mensual muestra cada ocurrencia de la serie"""
+        self._serie(recurrencia='semanal')
+        response = self.client.get(reverse('calendario_mensual', args=[2025, 9]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode().count('Historia'), 5)
+    
+    def test_formulario_y_feed_ics(self):
+        """Prueba la creación de una serie desde el formulario y su RRULE en el feed"""
+        response = self.client.post(reverse('evento_crear'), {
+            'titulo': 'Historia',
+            'fecha_inicio': '2025-03-03T08:00',
+            'fecha_fin': '2025-03-03T09:30',
+            'recurrencia': 'semanal',
+            'intervalo': '2',
+            'repeticiones': '10',
+            'excepciones': '2025-03-17',
+        })
+        self.assertEqual(response.status_code, 302)
+        serie = Evento.objects.get()
+        self.assertEqual(serie.excepciones, ['2025-03-17'])
+        from .ical import token_suscripcion
+        response = self.client.get(reverse('eventos_ics', args=[token_suscripcion(self.usuario)]))
+        contenido = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('RRULE:FREQ=WEEKLY;INTERVAL=2;COUNT=10\r\n', contenido)
+        self.assertIn('EXDATE:20250317T080000Z\r\n', contenido)
+
+
+class PresupuestoConsultasTest(TestCase):
+    """Pruebas de los presupuestos de consultas usados por los benchmarks"""
+    
+    def test_endpoints_dentro_del_presupuesto(self):
+        """Prueba cada endpoint a escala pequeña contra su presupuesto"""
+        from .benchmarks import PRESUPUESTO_CONSULTAS, ejecutar
+        resultados = ejecutar(400, repeticiones=1)
+        self.assertEqual({r.endpoint for r in resultados}, set(PRESUPUESTO_CONSULTAS))
+        for resultado in resultados:
+            with self.subTest(endpoint=resultado.endpoint):
+                self.assertLessEqual(resultado.consultas, resultado.presupuesto)
+    
+    def test_consultas_no_dependen_de_la_escala(self):
+        """Prueba que la vista anual cuesta lo mismo con el doble de eventos"""
+        from .benchmarks import sembrar
+        usuario = sembrar(200)
+        client = Client()
+        client.force_login(usuario)
+        url = reverse('calendario_anual', args=[2025])
+        with self.assertNumQueries(5):
+            client.get(url)
+        Evento.objects.bulk_create([
+            Evento(titulo=f'Extra {i}', usuario=usuario,
+                   fecha_inicio=make_aware(datetime(2025, 1 + i % 12, 10, 9)),
+                   fecha_fin=make_aware(datetime(2025, 1 + i % 12, 10, 10)))
+            for i in range(200)
+        ])
+        caches['calendario'].clear()
+        with self.assertNumQueries(5):
+            client.get(url)
+
+
+@override_settings(PERFILAMIENTO=True)
+class PerfilamientoMiddlewareTest(TestCase):
+    """Pruebas para el middleware de perfilamiento"""
+    
+    def setUp(self):
+        caches['calendario'].clear()
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.client.force_login(self.usuario)
+    
+    def test_server_timing_y_log(self):
+        """Prueba la cabecera Server-Timing y la línea JSON registrada"""
+        with self.assertLogs('core.perfilamiento', level='INFO') as registros:
+            response = self.client.get(reverse('calendario_anual', args=[2025]))
+        timing = response.headers['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        self.assertIn('desc="5 consultas"', timing)
+        self.assertIn('plantillas;dur=', timing)
+        datos = json.loads(registros.records[0].getMessage())
+        self.assertEqual(datos['vista'], 'calendario_anual')
+        self.assertEqual(datos['sql_consultas'], 5)
+        self.assertGreater(datos['plantillas_ms'], 0)
+        self.assertLessEqual(len(datos['consultas_lentas']), 5)
+        self.assertIn('SELECT', datos['consultas_lentas'][0]['sql'])
+    
+    @override_settings(PERFILAMIENTO=False)
+    def test_desactivado(self):
+        """Prueba que sin activarlo no se agrega la cabecera"""
+        response = Client().get(reverse('login'))
+        self.assertNotIn('Server-Timing', response.headers)
+
+
+@override_settings(METRICAS_IPS_PERMITIDAS=['127.0.0.1'])
+class MetricasTest(TestCase):
+    """Pruebas para el endpoint /metrics"""
+    
+    def setUp(self):
+        caches['calendario'].clear()
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+    
+    def _metricas(self):
+        response = self.client.get(reverse('metricas'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+    
+    def test_latencia_cache_y_logins(self):
+        """Prueba que se exponen los histogramas, la caché y los intentos de login"""
+        self.client.post(reverse('login'), {'username': '12345678-9', 'password': 'incorrecta'})
+        self.client.login(username='12345678-9', password='testpassword123')
+        self.client.get(reverse('calendario_anual', args=[2025]))
+        self.client.get(reverse('calendario_anual', args=[2025]))
+        texto = self._metricas()
+        self.assertIn('# TYPE didacta_request_duracion_segundos histogram', texto)
+        self.assertIn(
+            'didacta_request_duracion_segundos_bucket{metodo="GET",vista="calendario_anual",le="+Inf"}', texto
+        )
+        self.assertIn('didacta_request_consultas_bucket{vista="calendario_anual",le="8"}', texto)
+        self.assertIn('didacta_cache_calendario_total{resultado="hit",vista="anual"}', texto)
+        self.assertIn('didacta_login_intentos_total{resultado="fallo"}', texto)
+        self.assertIn('didacta_login_intentos_total{resultado="exito"}', texto)
+        self.assertIn('didacta_sesiones_activas 1\n', texto)
+    
+    def test_acceso_restringido(self):
+        """Prueba que fuera de las IPs permitidas solo accede un superusuario"""
+        client = Client(REMOTE_ADDR='10.0.0.8')
+        self.assertEqual(client.get(reverse('metricas')).status_code, 403)
+        admin = Usuario.objects.create_superuser(rut='87654321-0', password='adminpassword123')
+        client.force_login(admin)
+        self.assertEqual(client.get(reverse('metricas')).status_code, 200)
+    
+    @override_settings(METRICAS_IPS_PERMITIDAS=[])
+    def test_sin_ips_permitidas_por_defecto(self):
+        """Prueba que sin DIDACTA_METRICAS_IPS ni la IP local accede sin ser superusuario"""
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        self.client.login(username='12345678-9', password='testpassword123')
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+    
+    def test_suma_de_procesos(self):
+        """Prueba que en modo multiproceso se suman los archivos de cada proceso"""
+        from .metricas import combinar
+        temporal = tempfile.TemporaryDirectory()
+        self.addCleanup(temporal.cleanup)
+        directorio = temporal.name
+        otro = {
+            'contadores': [['didacta_login_intentos_total', [['resultado', 'bloqueado']], 3]],
+            'histogramas': [],
+        }
+        with open(os.path.join(directorio, 'metricas-1.json'), 'w') as archivo:
+            json.dump(otro, archivo)
+        with override_settings(METRICAS_DIRECTORIO=directorio):
+            texto = self._metricas()
+            self.assertTrue(os.path.exists(os.path.join(directorio, f'metricas-{os.getpid()}.json')))
+        self.assertIn('didacta_login_intentos_total{resultado="bloqueado"} 3\n', texto)
+        contadores, _ = combinar([otro, otro])
+        self.assertEqual(contadores[('didacta_login_intentos_total', (('resultado', 'bloqueado'),))], 6)
+    
+    def test_volcados_simultaneos(self):
+        """Prueba que varios hilos pueden volcar a la vez sin errores ni temporales huérfanos"""
+        import threading
+        from .metricas import registro
+        temporal = tempfile.TemporaryDirectory()
+        self.addCleanup(temporal.cleanup)
+        errores = []
+        
+        def volcar():
+            try:
+                for _ in range(20):
+                    registro.volcar(forzar=True)
+            except Exception as error:
+                errores.append(error)
+        
+        with override_settings(METRICAS_DIRECTORIO=temporal.name):
+            hilos = [threading.Thread(target=volcar) for _ in range(8)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        self.assertEqual(errores, [])
+        self.assertEqual(os.listdir(temporal.name), [f'metricas-{os.getpid()}.json'])
+    
+    def test_error_al_volcar_no_llega_al_request(self):
+        """Prueba que si el directorio no se puede escribir el request responde igual"""
+        directorio = os.path.join(tempfile.gettempdir(), 'didacta-no-existe', 'metricas')
+        with override_settings(METRICAS_DIRECTORIO=directorio, METRICAS_INTERVALO=0), \
+                self.assertLogs('core.metricas', level='WARNING'):
+            response = self.client.get(reverse('login'))
+        self.assertEqual(response.status_code, 200)
+    
+    async def test_volcado_bajo_asgi(self):
+        """Prueba que bajo ASGI el volcado se escribe (fuera del event loop)"""
+        temporal = tempfile.TemporaryDirectory()
+        self.addCleanup(temporal.cleanup)
+        with override_settings(METRICAS_DIRECTORIO=temporal.name, METRICAS_INTERVALO=0):
+            response = await AsyncClient().get(reverse('login'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(os.path.exists(os.path.join(temporal.name, f'metricas-{os.getpid()}.json')))
+
+
+class CalendarioAsincronoTest(TestCase):
+    """Pruebas de las vistas del calendario servidas por el handler ASGI"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_superuser(
+            rut='87654321-0',
+            password='adminpassword123'
+        )
+        Evento.objects.create(
+            titulo='Reunión ASGI',
+            fecha_inicio=make_aware(datetime(2025, 10, 15, 9, 0)),
+            fecha_fin=make_aware(datetime(2025, 10, 15, 10, 0)),
+            usuario=cls.usuario
+        )
+    
+    def setUp(self):
+        caches['calendario'].clear()
+    
+    async def test_vistas_asincronas(self):
+        """Prueba cada vista del calendario con el cliente asíncrono"""
+        client = AsyncClient()
+        await client.aforce_login(self.usuario)
+        for url in (
+            reverse('calendario_anual', args=[2025]),
+            reverse('calendario_mensual', args=[2025, 10]),
+            reverse('calendario_semanal', args=[2025, 42]),
+            reverse('calendario_diario', args=[2025, 10, 15]),
+        ):
+            with self.subTest(url=url):
+                response = await client.get(url)
+                self.assertContains(response, 'Reunión ASGI')
+                etag = response.headers['ETag']
+                self.assertEqual((await client.get(url, headers={'if-none-match': etag})).status_code, 304)
+    
+    async def test_sin_sesion_redirige(self):
+        """Prueba que login_required funciona en las vistas asíncronas"""
+        response = await AsyncClient().get(reverse('calendario_anual', args=[2025]))
+        self.assertEqual(response.status_code, 302)
+    
+    @override_settings(PERFILAMIENTO=True)
+    async def test_consultas_medidas_bajo_asgi(self):
+        """Prueba que el perfilamiento cuenta las consultas hechas en otro hilo"""
+        client = AsyncClient()
+        await client.aforce_login(self.usuario)
+        # assertLogs reemplaza los handlers: no se escribe en perfilamiento.jsonl
+        with self.assertLogs('core.perfilamiento', level='INFO') as registros:
+            response = await client.get(reverse('calendario_anual', args=[2025]))
+        self.assertIn('desc="5 consultas"', response.headers['Server-Timing'])
+        self.assertEqual(json.loads(registros.records[0].getMessage())['sql_consultas'], 5)
+
+
+class SesionesTest(TestCase):
+    """Pruebas para las sesiones en caché y los mensajes en cookies"""
+    
+    def setUp(self):
+        caches['calendario'].clear()
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+    
+    def _escrituras(self, consultas):
+        return [q['sql'] for q in consultas if not q['sql'].lstrip().upper().startswith('SELECT')]
+    
+    def test_visitas_no_escriben_en_la_base_de_datos(self):
+        """Prueba que ver páginas con sesión iniciada no escribe en la base de datos"""
+        self.client.post(reverse('login'), {'username': '12345678-9', 'password': 'testpassword123'})
+        # El mensaje de bienvenida viaja en una cookie firmada, no en la sesión
+        self.assertIn('messages', self.client.cookies)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('calendario'))
+            self.client.get(reverse('calendario_mensual', args=[2025, 10]))
+            self.client.get(reverse('calendario_semanal', args=[2025, 42]))
+        self.assertEqual(self._escrituras(consultas), [])
+    
+    def test_next_url_sin_cambios_no_guarda_la_sesion(self):
+        """Prueba que repetir la misma redirección al login no reescribe la sesión"""
+        url = reverse('login') + '?next=/calendario/semana/'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(url)
+        self.assertEqual(self._escrituras(consultas), [])
+    
+    def test_limpiar_sesiones_por_lotes(self):
+        """Prueba que se eliminan solo las sesiones expiradas"""
+        from django.contrib.sessions.models import Session
+        ahora = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'expirada{i}', session_data='', expire_date=ahora - timedelta(days=1))
+             for i in range(7)]
+            + [Session(session_key='vigente', session_data='', expire_date=ahora + timedelta(days=1))]
+        )
+        salida = StringIO()
+        call_command('limpiar_sesiones', lote=3, stdout=salida)
+        self.assertIn('Eliminadas 7 sesiones', salida.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['vigente'])
+
+
+PRAGMAS_SIN_WAL = {'mmap_size': 1024 * 1024, 'busy_timeout': 5000}
+PRAGMAS_WAL = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', **PRAGMAS_SIN_WAL}
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Solo aplica a SQLite')
+class ConfiguracionSQLiteTest(TestCase):
+    """Pruebas de los PRAGMAs aplicados a las conexiones SQLite"""
+    
+    def _pragmas(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        conexion = DatabaseWrapper({**connection.settings_dict, 'NAME': os.path.join(directorio.name, 'prueba.sqlite3')})
+        self.addCleanup(conexion.close)
+        with conexion.cursor() as cursor:
+            valores = {}
+            for pragma in ('journal_mode', 'synchronous', 'mmap_size', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {pragma}')
+                valores[pragma] = cursor.fetchone()[0]
+        return valores
+    
+    @override_settings(SQLITE_PRAGMAS=PRAGMAS_SIN_WAL)
+    def test_sin_wal(self):
+        """Prueba que sin DIDACTA_SQLITE_WAL la base conserva su modo pero usa mmap y busy_timeout"""
+        valores = self._pragmas()
+        self.assertEqual(valores['journal_mode'], 'delete')
+        self.assertEqual(valores['synchronous'], 2)  # FULL
+        self.assertGreater(valores['mmap_size'], 0)
+        self.assertEqual(valores['busy_timeout'], 5000)
+    
+    @override_settings(SQLITE_PRAGMAS=PRAGMAS_WAL)
+    def test_pragmas_en_conexion_nueva(self):
+        """Prueba WAL, synchronous, mmap y busy_timeout en una base en disco"""
+        valores = self._pragmas()
+        self.assertEqual(valores['journal_mode'], 'wal')
+        self.assertEqual(valores['synchronous'], 1)  # NORMAL
+        self.assertGreater(valores['mmap_size'], 0)
+        self.assertEqual(valores['busy_timeout'], 5000)
+    
+    @override_settings(SQLITE_PRAGMAS=PRAGMAS_WAL)
+    def test_lectura_y_escritura_concurrentes(self):
+        """Prueba que con WAL una lectura en curso y una escritura no se bloquean"""
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = {**connection.settings_dict, 'NAME': os.path.join(directorio.name, 'prueba.sqlite3')}
+        escritora, lectora = DatabaseWrapper(ajustes, alias='escritora'), DatabaseWrapper(ajustes, alias='lectora')
+        self.addCleanup(escritora.close)
+        self.addCleanup(lectora.close)
+        escritora.cursor().execute('CREATE TABLE prueba (valor INTEGER)')
+        escritora.cursor().execute('INSERT INTO prueba VALUES (1)')
+        lectura = lectora.cursor()
+        lectura.execute('BEGIN')
+        lectura.execute('SELECT COUNT(*) FROM prueba')
+        self.assertEqual(lectura.fetchone()[0], 1)
+        # Sin WAL esta escritura esperaría busy_timeout y fallaría con "database is locked"
+        inicio = time.monotonic()
+        escritora.cursor().execute('INSERT INTO prueba VALUES (2)')
+        self.assertLess(time.monotonic() - inicio, 1)
+        # El lector mantiene su instantánea hasta terminar la transacción
+        lectura.execute('SELECT COUNT(*) FROM prueba')
+        self.assertEqual(lectura.fetchone()[0], 1)
+        lectura.execute('COMMIT')
+
+
+class ConteoDiarioTest(TestCase):
+    """Pruebas de los conteos diarios de eventos por usuario"""
+    
+    def setUp(self):
+        caches['calendario'].clear()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+    
+    def _crear(self, inicio, fin, **kwargs):
+        return Evento.objects.create(
+            titulo='Evento', fecha_inicio=make_aware(inicio), fecha_fin=make_aware(fin),
+            usuario=self.usuario, **kwargs
+        )
+    
+    def _conteos(self):
+        from .models import ConteoDiario
+        return {
+            fecha: (cantidad, nuevos)
+            for fecha, cantidad, nuevos in ConteoDiario.objects.filter(usuario=self.usuario)
+            .exclude(cantidad=0).values_list('fecha', 'cantidad', 'nuevos_en_mes')
+        }
+    
+    def test_crear_editar_eliminar(self):
+        """Prueba que los conteos siguen a las altas, ediciones y bajas"""
+        evento = self._crear(datetime(2025, 3, 10, 9), datetime(2025, 3, 10, 10))
+        self._crear(datetime(2025, 3, 10, 11), datetime(2025, 3, 10, 12))
+        self.assertEqual(self._conteos(), {date(2025, 3, 10): (2, 2)})
+        
+        evento.fecha_inicio = make_aware(datetime(2025, 3, 12, 9))
+        evento.fecha_fin = make_aware(datetime(2025, 3, 12, 10))
+        evento.save()
+        self.assertEqual(self._conteos(), {date(2025, 3, 10): (1, 1), date(2025, 3, 12): (1, 1)})
+        
+        evento.delete()
+        self.assertEqual(self._conteos(), {date(2025, 3, 10): (1, 1)})
+    
+    def test_evento_de_varios_dias_y_meses(self):
+        """Prueba que un evento cuenta en cada día y una sola vez por mes"""
+        self._crear(datetime(2025, 1, 30, 9), datetime(2025, 2, 2, 17))
+        self.assertEqual(self._conteos(), {
+            date(2025, 1, 30): (1, 1),
+            date(2025, 1, 31): (1, 0),
+            date(2025, 2, 1): (1, 1),
+            date(2025, 2, 2): (1, 0),
+        })
+        from .conteos import resumen_por_mes
+        self.assertEqual(
+            list(resumen_por_mes(self.usuario, date(2025, 1, 1), date(2026, 1, 1))), [(1, 1), (2, 1)]
+        )
+    
+    def test_series_no_se_cuentan(self):
+        """Prueba que las series recurrentes no generan conteos"""
+        self._crear(datetime(2025, 3, 10, 9), datetime(2025, 3, 10, 10), recurrencia='semanal', repeticiones=4)
+        self.assertEqual(self._conteos(), {})
+    
+    def test_reconstruir_coincide(self):
+        """Prueba que el comando de reconstrucción da los mismos conteos"""
+        self._crear(datetime(2025, 1, 30, 9), datetime(2025, 2, 2, 17))
+        evento = self._crear(datetime(2025, 3, 10, 9), datetime(2025, 3, 10, 10))
+        evento.fecha_fin = make_aware(datetime(2025, 3, 11, 10))
+        evento.save()
+        incrementales = self._conteos()
+        salida = StringIO()
+        call_command('reconstruir_conteos', '--rut', '12345678-9', stdout=salida)
+        self.assertIn('Reconstruidos 6 conteos', salida.getvalue())
+        self.assertEqual(self._conteos(), incrementales)
+    
+    def test_importacion_actualiza_conteos(self):
+        """Prueba que los eventos importados con bulk_create se cuentan"""
+        from .importacion import importar_eventos
+        resultado = importar_eventos([
+            "titulo,descripcion,fecha_inicio,fecha_fin\n",
+            "Clase,,2025-04-01T09:00,2025-04-01T10:00\n",
+            "Taller,,2025-04-01T11:00,2025-04-02T12:00\n",
+        ], self.usuario)
+        self.assertEqual(resultado.creados, 2)
+        self.assertEqual(self._conteos(), {date(2025, 4, 1): (2, 2), date(2025, 4, 2): (1, 0)})
+    
+    def test_vista_anual_con_conteos_y_series(self):
+        """Prueba que la vista anual suma los conteos y las ocurrencias de las series"""
+        for dia in range(1, 8):
+            self._crear(datetime(2025, 5, dia, 9), datetime(2025, 5, dia, 10))
+        self._crear(datetime(2025, 4, 29, 9), datetime(2025, 5, 2, 10))
+        self._crear(datetime(2025, 5, 20, 9), datetime(2025, 5, 20, 10), recurrencia='semanal', repeticiones=3)
+        self.client.force_login(self.usuario)
+        response = self.client.get(reverse('calendario_anual', args=[2025]))
+        meses = response.context['meses_con_eventos']
+        self.assertEqual(meses[3]['cantidad'], 1)
+        # 7 simples, el que viene de abril y 2 ocurrencias de la serie (la tercera es en junio)
+        self.assertEqual(meses[4]['cantidad'], 10)
+        self.assertEqual(meses[5]['cantidad'], 1)
+        self.assertEqual(len(meses[4]['eventos']), 5)
+        self.assertEqual(meses[4]['eventos'][0].fecha_inicio, make_aware(datetime(2025, 4, 29, 9)))
+        self.assertEqual(response.context['total_eventos'], 12)
+
+
+class MapaCalorTest(TestCase):
+    """Pruebas del mapa de calor anual calculado con NumPy"""
+    
+    def setUp(self):
+        caches['calendario'].clear()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.client.force_login(self.usuario)
+    
+    def _crear(self, inicio, fin, **kwargs):
+        return Evento.objects.create(
+            titulo='Evento', fecha_inicio=make_aware(inicio), fecha_fin=make_aware(fin),
+            usuario=self.usuario, **kwargs
+        )
+    
+    def test_endpoint_reparte_eventos_y_horas(self):
+        """Prueba eventos multi-día, horas ocupadas y ocurrencias de series"""
+        self._crear(datetime(2025, 1, 30, 22), datetime(2025, 2, 1, 2))
+        self._crear(datetime(2025, 1, 30, 9), datetime(2025, 1, 30, 10, 30))
+        self._crear(datetime(2024, 12, 30, 9), datetime(2024, 12, 30, 10), recurrencia='semanal', repeticiones=3)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('mapa_calor', args=[2025]))
+        datos = response.json()
+        self.assertEqual(datos['desde'], '2025-01-01')
+        self.assertEqual(len(datos['eventos']), 365)
+        self.assertEqual(datos['eventos'][29:32], [2, 1, 1])
+        self.assertEqual(datos['horas'][29:32], [3.5, 24.0, 2.0])
+        # La serie ocurre el 6 y el 13 de enero; la primera ocurrencia es de 2024
+        self.assertEqual([dia for dia, cantidad in enumerate(datos['eventos'][:29]) if cantidad], [5, 12])
+        self.assertEqual(sum(datos['eventos']), 6)
+    
+    def test_etag(self):
+        """Prueba que sin cambios se responde 304"""
+        self._crear(datetime(2025, 3, 1, 9), datetime(2025, 3, 1, 10))
+        response = self.client.get(reverse('mapa_calor', args=[2025]))
+        response = self.client.get(reverse('mapa_calor', args=[2025]), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+    
+    def test_year_fuera_de_rango(self):
+        """Prueba que los años límite de datetime responden 404 y no 500"""
+        for year in (0, 1, 9999):
+            response = self.client.get(reverse('mapa_calor', args=[year]))
+            self.assertEqual(response.status_code, 404)
+    
+    def test_coincide_con_calculo_por_evento(self):
+        """Prueba contra un cálculo día por día, en zonas con cambios de hora"""
+        import random
+        aleatorio = random.Random(7)
+        for _ in range(60):
+            inicio = datetime(2025, 1, 1) + timedelta(minutes=aleatorio.randrange(-3 * 1440, 368 * 1440))
+            fin = inicio + timedelta(minutes=aleatorio.randrange(0, 4 * 1440))
+            serie = {'recurrencia': 'semanal', 'repeticiones': 8} if aleatorio.random() < 0.2 else {}
+            self._crear(inicio, fin, **serie)
+        # Santiago cambia la hora a medianoche (y ese día no existe las 00:00); Madrid, de madrugada
+        for zona in ('America/Santiago', 'Europe/Madrid'):
+            with self.subTest(zona=zona), override_settings(TIME_ZONE=zona):
+                self._comparar_con_calculo_por_evento()
+    
+    def _comparar_con_calculo_por_evento(self):
+        from .calendario import fecha_local
+        from .mapa_calor import mapa_calor
+        from .recurrencia import expandir_eventos
+        cantidades, horas = mapa_calor(lambda eventos: eventos.filter(usuario=self.usuario), 2025)
+        
+        desde = make_aware(datetime(2025, 1, 1))
+        hasta = make_aware(datetime(2026, 1, 1))
+        eventos = expandir_eventos(
+            Evento.objects.filter(usuario=self.usuario).overlapping(date(2025, 1, 1), date(2026, 1, 1)), desde, hasta
+        )
+        esperadas = [0] * 365
+        segundos = [0.0] * 365
+        for evento in eventos:
+            dia, fin = fecha_local(evento.fecha_inicio), fecha_local(evento.fecha_fin)
+            while dia <= fin:
+                if dia.year == 2025:
+                    indice = (dia - date(2025, 1, 1)).days
+                    esperadas[indice] += 1
+                    # Con timestamps: restar datetimes de la misma zona ignora el cambio de hora
+                    inicio_dia = make_aware(datetime.combine(dia, datetime.min.time())).timestamp()
+                    fin_dia = make_aware(datetime.combine(dia + timedelta(days=1), datetime.min.time())).timestamp()
+                    cubierto = min(evento.fecha_fin.timestamp(), fin_dia) - max(evento.fecha_inicio.timestamp(), inicio_dia)
+                    segundos[indice] += max(cubierto, 0)
+                dia += timedelta(days=1)
+        self.assertEqual(cantidades.tolist(), esperadas)
+        self.assertEqual(horas.round(6).tolist(), [round(s / 3600, 6) for s in segundos])
+
+
+class BusquedaTest(TestCase):
+    """Pruebas de la búsqueda de texto completo de eventos"""
+    
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.client.force_login(self.usuario)
+    
+    def _crear(self, titulo, descripcion='', dia=10, usuario=None):
+        return Evento.objects.create(
+            titulo=titulo, descripcion=descripcion, usuario=usuario or self.usuario,
+            fecha_inicio=make_aware(datetime(2025, 3, dia, 9)),
+            fecha_fin=make_aware(datetime(2025, 3, dia, 10)),
+        )
+    
+    def _buscar(self, texto, **kwargs):
+        from .busqueda import buscar
+        return buscar(self.usuario, texto, **kwargs)
+    
+    def test_titulo_y_descripcion_sin_acentos(self):
+        """Prueba que se busca en ambos campos, sin distinguir acentos y por prefijo"""
+        reunion = self._crear('Reunión de apoderados')
+        consejo = self._crear('Consejo', 'Se revisa la reunion anterior')
+        self._crear('Taller de matemáticas')
+        resultados = self._buscar('reunion')
+        self.assertEqual({evento.pk for evento in resultados.eventos}, {reunion.pk, consejo.pk})
+        # El título pesa más que la descripción
+        self.assertEqual(resultados.eventos[0].pk, reunion.pk)
+        self.assertGreater(resultados.eventos[0].relevancia, resultados.eventos[1].relevancia)
+        self.assertEqual([evento.pk for evento in self._buscar('matem').eventos], [self.usuario.eventos.last().pk])
+    
+    def test_solo_eventos_del_usuario_y_rango(self):
+        """Prueba que no aparecen eventos ajenos y que se filtra por fechas"""
+        otro = Usuario.objects.create_user(rut='11111111-1', password='testpassword123')
+        self._crear('Clase de historia', usuario=otro)
+        marzo = self._crear('Clase de historia', dia=5)
+        self._crear('Clase de historia', dia=20)
+        self.assertEqual(len(self._buscar('historia').eventos), 2)
+        resultados = self._buscar('historia', desde=date(2025, 3, 1), hasta=date(2025, 3, 10))
+        self.assertEqual([evento.pk for evento in resultados.eventos], [marzo.pk])
+    
+    def test_indice_sigue_cambios(self):
+        """Prueba que el índice refleja ediciones, eliminaciones y bulk_create"""
+        evento = self._crear('Prueba de lenguaje')
+        evento.titulo = 'Evaluación de ciencias'
+        evento.save()
+        self.assertEqual(self._buscar('lenguaje').eventos, [])
+        self.assertEqual(len(self._buscar('ciencias').eventos), 1)
+        Evento.objects.filter(pk=evento.pk).update(descripcion='Laboratorio')
+        self.assertEqual(len(self._buscar('laboratorio').eventos), 1)
+        evento.delete()
+        self.assertEqual(self._buscar('ciencias').eventos, [])
+        Evento.objects.bulk_create([
+            Evento(titulo='Importado', usuario=self.usuario,
+                   fecha_inicio=make_aware(datetime(2025, 3, 1, 9)), fecha_fin=make_aware(datetime(2025, 3, 1, 10)))
+        ])
+        self.assertEqual(len(self._buscar('importado').eventos), 1)
+    
+    def test_texto_con_sintaxis(self):
+        """Prueba que comillas, operadores y signos no rompen la consulta"""
+        self._crear('Reunión "general"')
+        for texto in ('"general', 'general OR', 'NEAR(general)', '*', 'general -', "'; DROP"):
+            with self.subTest(texto=texto):
+                self._buscar(texto)
+        self.assertEqual(self._buscar('!!').eventos, [])
+    
+    def test_vista_paginada(self):
+        """Prueba la página de resultados, su paginación y el costo en consultas"""
+        from .busqueda import POR_PAGINA
+        for dia in range(1, POR_PAGINA + 6):
+            self._crear(f'Tutoría {dia}', dia=1 + dia % 28)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('buscar'), {'q': 'tutoria'})
+        self.assertEqual(len(response.context['resultados'].eventos), POR_PAGINA)
+        self.assertTrue(response.context['resultados'].hay_siguiente)
+        self.assertContains(response, 'pagina=2')
+        self.assertFalse(any('LIKE' in consulta['sql'] for consulta in consultas))
+        # Usuario y la búsqueda; la sesión sale de la caché
+        self.assertEqual(len(consultas), 2)
+        response = self.client.get(reverse('buscar'), {'q': 'tutoria', 'pagina': 2})
+        self.assertEqual(len(response.context['resultados'].eventos), 5)
+        self.assertFalse(response.context['resultados'].hay_siguiente)
+    
+    def test_rango_invalido(self):
+        """Prueba que un rango invertido muestra un error y no busca"""
+        response = self.client.get(reverse('buscar'), {'q': 'x', 'desde': '2025-03-10', 'hasta': '2025-03-01'})
+        self.assertIsNone(response.context['resultados'])
+        self.assertContains(response, 'no puede ser anterior')
+    
+    def test_reconstruir(self):
+        """Prueba que el comando recrea el índice desde los eventos"""
+        self._crear('Jornada deportiva')
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO core_evento_fts(core_evento_fts) VALUES ('delete-all')")
+        self.assertEqual(self._buscar('deportiva').eventos, [])
+        call_command('reconstruir_busqueda', stdout=StringIO())
+        self.assertEqual(len(self._buscar('deportiva').eventos), 1)
+
+
+class ConflictosTest(TestCase):
+    """Pruebas de la detección de eventos superpuestos"""
+    
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.client.force_login(self.usuario)
+    
+    def _crear(self, titulo, inicio, fin, usuario=None, **kwargs):
+        return Evento.objects.create(
+            titulo=titulo, usuario=usuario or self.usuario,
+            fecha_inicio=make_aware(inicio), fecha_fin=make_aware(fin), **kwargs
+        )
+    
+    def _form(self, inicio, fin, instance=None, **datos):
+        return EventoForm(data={
+            'titulo': 'Nuevo', 'descripcion': '',
+            'fecha_inicio': inicio.strftime('%Y-%m-%dT%H:%M'), 'fecha_fin': fin.strftime('%Y-%m-%dT%H:%M'),
+            'intervalo': 1, **datos,
+        }, instance=instance, usuario=self.usuario)
+    
+    def test_formulario_rechaza_superposicion(self):
+        """Prueba que el formulario rechaza un evento que se cruza con otro"""
+        self._crear('Consejo', datetime(2025, 3, 10, 9), datetime(2025, 3, 10, 11))
+        form = self._form(datetime(2025, 3, 10, 10), datetime(2025, 3, 10, 12))
+        self.assertFalse(form.is_valid())
+        self.assertIn('Consejo', str(form.non_field_errors()))
+    
+    def test_eventos_contiguos_y_ajenos(self):
+        """Prueba que tocarse en un extremo o cruzarse con otro usuario no es conflicto"""
+        otro = Usuario.objects.create_user(rut='11111111-1', password='testpassword123')
+        self._crear('Consejo', datetime(2025, 3, 10, 9), datetime(2025, 3, 10, 11))
+        self._crear('Ajeno', datetime(2025, 3, 10, 11), datetime(2025, 3, 10, 12), usuario=otro)
+        self.assertTrue(self._form(datetime(2025, 3, 10, 11), datetime(2025, 3, 10, 12)).is_valid())
+    
+    def test_ignorar_conflictos(self):
+        """Prueba que se puede guardar igual marcando la casilla"""
+        self._crear('Consejo', datetime(2025, 3, 10, 9), datetime(2025, 3, 10, 11))
+        form = self._form(datetime(2025, 3, 10, 10), datetime(2025, 3, 10, 12), ignorar_conflictos='on')
+        self.assertTrue(form.is_valid())
+    
+    def test_edicion_excluye_el_propio_evento(self):
+        """Prueba que al editar un evento no choca consigo mismo, con una consulta"""
+        evento = self._crear('Consejo', datetime(2025, 3, 10, 9), datetime(2025, 3, 10, 11))
+        form = self._form(datetime(2025, 3, 10, 10), datetime(2025, 3, 10, 12), instance=evento)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertTrue(form.is_valid())
+        self.assertEqual(len(consultas), 1)
+    
+    def test_serie_contra_existentes(self):
+        """Prueba que se revisan las ocurrencias de una serie nueva y de las existentes"""
+        self._crear('Taller', datetime(2025, 3, 19, 15), datetime(2025, 3, 19, 16))
+        form = self._form(datetime(2025, 3, 5, 15, 30), datetime(2025, 3, 5, 16, 30), recurrencia='semanal')
+        self.assertFalse(form.is_valid())
+        self.assertIn('19/03/2025', str(form.non_field_errors()))
+        
+        self._crear('Ensayo', datetime(2025, 1, 7, 8), datetime(2025, 1, 7, 9), recurrencia='semanal')
+        form = self._form(datetime(2025, 4, 1, 8, 30), datetime(2025, 4, 1, 9, 30))
+        self.assertFalse(form.is_valid())
+        self.assertIn('Ensayo', str(form.non_field_errors()))
+    
+    def test_barrido_igual_a_fuerza_bruta(self):
+        """Prueba que el barrido encuentra los mismos pares que comparar todos"""
+        import random
+        from .conflictos import barrer
+        azar = random.Random(7)
+        otro = Usuario.objects.create_user(rut='11111111-1', password='testpassword123')
+        eventos = []
+        for numero in range(200):
+            inicio = timezone.now() + timedelta(minutes=azar.randrange(0, 5000, 15))
+            eventos.append(Evento(
+                pk=numero, titulo=str(numero), usuario=azar.choice([self.usuario, otro]),
+                fecha_inicio=inicio, fecha_fin=inicio + timedelta(minutes=azar.randrange(15, 240, 15)),
+            ))
+        esperados = {
+            frozenset((a.pk, b.pk)) for i, a in enumerate(eventos) for b in eventos[i + 1:]
+            if a.usuario_id == b.usuario_id and a.fecha_inicio < b.fecha_fin and b.fecha_inicio < a.fecha_fin
+        }
+        pares = [frozenset((a.pk, b.pk)) for a, b in barrer(eventos)]
+        self.assertEqual(len(pares), len(esperados))
+        self.assertEqual(set(pares), esperados)
+    
+    def test_vista_crear(self):
+        """Prueba que la vista de creación muestra el conflicto y no guarda"""
+        self.usuario.is_superuser = True
+        self.usuario.save()
+        self._crear('Consejo', datetime(2025, 3, 10, 9), datetime(2025, 3, 10, 11))
+        response = self.client.post(reverse('evento_crear'), {
+            'titulo': 'Nuevo', 'fecha_inicio': '2025-03-10T10:00', 'fecha_fin': '2025-03-10T12:00', 'intervalo': 1,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Se superpone con')
+        self.assertEqual(Evento.objects.count(), 1)
+    
+    def test_reporte_admin(self):
+        """Prueba el reporte de conflictos del admin"""
+        admin = Usuario.objects.create_superuser(rut='99999999-9', password='testpassword123')
+        self.client.force_login(admin)
+        self._crear('Consejo', datetime(2025, 3, 10, 9), datetime(2025, 3, 10, 11))
+        self._crear('Tutoría', datetime(2025, 3, 10, 10), datetime(2025, 3, 10, 12))
+        self._crear('Almuerzo', datetime(2025, 3, 10, 12), datetime(2025, 3, 10, 13))
+        url = reverse('admin:core_evento_conflictos')
+        response = self.client.get(url, {'desde': '2025-03-01', 'hasta': '2025-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total'], 1)
+        self.assertContains(response, 'Tutoría')
+        response = self.client.get(url, {'desde': '2025-03-31', 'hasta': '2025-03-01'})
+        self.assertIsNone(response.context['conflictos'])
+
+
+class LimiteLoginTest(TestCase):
+    """Pruebas del límite de intentos de inicio de sesión"""
+    
+    def setUp(self):
+        from . import limites
+        limites.reiniciar_todos()
+        self.addCleanup(limites.reiniciar_todos)
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+    
+    def _intentar(self, rut='12345678-9', password='wrongpassword', ip='192.0.2.1'):
+        return self.client.post(reverse('login'), {'username': rut, 'password': password}, REMOTE_ADDR=ip)
+    
+    def test_parsear_limite(self):
+        """Prueba el formato 'intentos/segundos' de la configuración"""
+        from django.core.exceptions import ImproperlyConfigured
+        from .limites import Limite, parsear_limite
+        self.assertEqual(parsear_limite('5/300'), Limite(5, 300.0))
+        self.assertIsNone(parsear_limite(''))
+        self.assertIsNone(parsear_limite('0'))
+        for texto in ('5', 'a/b', '0/10', '5/0'):
+            with self.subTest(texto=texto), self.assertRaises(ImproperlyConfigured):
+                parsear_limite(texto)
+    
+    @override_settings(LIMITE_LOGIN_RUT='2/60', LIMITE_LOGIN_IP='')
+    def test_rechazo_por_rut_sin_calcular_hash(self):
+        """Prueba que al agotar los intentos de un RUT se responde 429 sin consultar al usuario"""
+        self.assertEqual(self._intentar().status_code, 200)
+        self.assertEqual(self._intentar(ip='192.0.2.2').status_code, 200)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self._intentar(password='testpassword123', ip='192.0.2.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(consultas), 0)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 30)
+        self.assertContains(response, 'Demasiados intentos', status_code=429)
+        # Mayúsculas o espacios no dan un bucket nuevo
+        self.assertEqual(self._intentar(rut=' 12345678-9 ').status_code, 429)
+        # Otro RUT no se ve afectado
+        self.assertEqual(self._intentar(rut='11111111-1').status_code, 200)
+    
+    @override_settings(LIMITE_LOGIN_RUT='', LIMITE_LOGIN_IP='2/60')
+    def test_rechazo_por_ip(self):
+        """Prueba que una IP que prueba muchos RUTs queda limitada, sin afectar a otras"""
+        self._intentar(rut='1-1')
+        self._intentar(rut='2-2')
+        self.assertEqual(self._intentar(rut='3-3').status_code, 429)
+        response = self._intentar(password='testpassword123', ip='192.0.2.50')
+        self.assertEqual(response.status_code, 302)
+    
+    @override_settings(LIMITE_LOGIN_RUT='2/60', LIMITE_LOGIN_IP='')
+    def test_login_exitoso_reinicia_rut(self):
+        """Prueba que un inicio de sesión exitoso devuelve los intentos del RUT"""
+        self._intentar()
+        self.assertEqual(self._intentar(password='testpassword123').status_code, 302)
+        self.client.logout()
+        self._intentar()
+        self.assertEqual(self._intentar(password='testpassword123').status_code, 302)
+    
+    def test_recarga_y_camino_rapido(self):
+        """Prueba la recarga del bucket y que un bucket vacío se rechaza sin leer la caché"""
+        from django.core.cache import caches
+        from .limites import CACHE_LIMITES, Limite, consumir
+        buckets = [('prueba', Limite(2, 10))]
+        self.assertEqual(consumir(buckets, ahora=100), 0)
+        self.assertEqual(consumir(buckets, ahora=100), 0)
+        self.assertAlmostEqual(consumir(buckets, ahora=100), 5)
+        # Aunque la caché se vacíe, este proceso recuerda el bloqueo
+        caches[CACHE_LIMITES].clear()
+        self.assertAlmostEqual(consumir(buckets, ahora=104), 1)
+        self.assertEqual(consumir(buckets, ahora=105), 0)
+    
+    def test_ip_cliente(self):
+        """Prueba que las IPv6 se agrupan por /64 y las IPv4 mapeadas se normalizan"""
+        from django.test import RequestFactory
+        from .limites import ip_cliente
+        factory = RequestFactory()
+        self.assertEqual(ip_cliente(factory.get('/', REMOTE_ADDR='2001:db8::1')), '2001:db8::/64')
+        self.assertEqual(ip_cliente(factory.get('/', REMOTE_ADDR='2001:db8::ffff')), '2001:db8::/64')
+        self.assertEqual(ip_cliente(factory.get('/', REMOTE_ADDR='::ffff:192.0.2.1')), '192.0.2.1')
+        self.assertEqual(ip_cliente(factory.get('/', REMOTE_ADDR='192.0.2.1')), '192.0.2.1')
+    
+    @override_settings(PROXIES_CONFIABLES=['127.0.0.1', '10.0.0.0/8'])
+    def test_ip_cliente_tras_proxy(self):
+        """Prueba que tras un proxy confiable la IP sale de X-Forwarded-For, sin creerle al cliente"""
+        from django.test import RequestFactory
+        from .limites import ip_cliente
+        factory = RequestFactory()
+        def ip(remota, reenviada=None):
+            extra = {'HTTP_X_FORWARDED_FOR': reenviada} if reenviada is not None else {}
+            return ip_cliente(factory.get('/', REMOTE_ADDR=remota, **extra))
+        self.assertEqual(ip('127.0.0.1', '192.0.2.1'), '192.0.2.1')
+        # La primera dirección la escribe el cliente: se usa la última que no es un proxy
+        self.assertEqual(ip('127.0.0.1', '198.51.100.9, 192.0.2.1, 10.1.2.3'), '192.0.2.1')
+        self.assertEqual(ip('127.0.0.1', '2001:db8::1'), '2001:db8::/64')
+        # Sin cabecera o con una inválida no se conoce al cliente
+        self.assertIsNone(ip('127.0.0.1'))
+        self.assertIsNone(ip('127.0.0.1', 'desconocido'))
+        # Un cliente que no es un proxy no puede elegir su IP
+        self.assertEqual(ip('192.0.2.7', '198.51.100.9'), '192.0.2.7')
+    
+    @override_settings(LIMITE_LOGIN_RUT='', LIMITE_LOGIN_IP='2/60')
+    def test_clientes_tras_el_mismo_proxy(self):
+        """Prueba que, con el proxy declarado, un atacante no bloquea a otros clientes del mismo proxy"""
+        def intentar(ip, password='wrongpassword', rut='1-1'):
+            return self.client.post(reverse('login'), {'username': rut, 'password': password},
+                                    REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR=ip)
+        # Sin declararlo, todos comparten el bucket de la IP del proxy
+        intentar('203.0.113.7')
+        intentar('203.0.113.7')
+        self.assertEqual(intentar('198.51.100.20', 'testpassword123', '12345678-9').status_code, 429)
+        from . import limites
+        limites.reiniciar_todos()
+        with override_settings(PROXIES_CONFIABLES=['127.0.0.1']):
+            intentar('203.0.113.7')
+            intentar('203.0.113.7')
+            self.assertEqual(intentar('203.0.113.7').status_code, 429)
+            self.assertEqual(intentar('198.51.100.20', 'testpassword123', '12345678-9').status_code, 302)
+
+
+class EstaticosTest(TestCase):
+    """Pruebas de los archivos estáticos propios (sin CDN)"""
+    
+    CSS = 'core/vendor/bootstrap-5.3.2/css/bootstrap.min.css'
+    
+    def test_base_sin_cdn(self):
+        """Prueba que las páginas cargan Bootstrap desde los estáticos propios"""
+        response = self.client.get(reverse('login'))
+        self.assertNotContains(response, 'cdn.jsdelivr.net')
+        self.assertContains(response, f'/static/{self.CSS}')
+        self.assertContains(response, '/static/core/vendor/bootstrap-5.3.2/js/bootstrap.min.js')
+    
+    def test_collectstatic_con_hash_y_comprimidos(self):
+        """Prueba que collectstatic genera nombres con hash, variantes .gz y .br, y cómo se sirven"""
+        import brotli
+        import gzip
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from whitenoise.middleware import WhiteNoiseMiddleware
+        
+        with tempfile.TemporaryDirectory() as directorio, override_settings(
+            STATIC_ROOT=directorio,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+            },
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            nombre = staticfiles_storage.stored_name(self.CSS)
+            self.assertNotEqual(nombre, self.CSS)
+            with open(os.path.join(directorio, nombre), 'rb') as archivo:
+                original = archivo.read()
+            with open(os.path.join(directorio, nombre + '.gz'), 'rb') as archivo:
+                self.assertEqual(gzip.decompress(archivo.read()), original)
+            with open(os.path.join(directorio, nombre + '.br'), 'rb') as archivo:
+                self.assertEqual(brotli.decompress(archivo.read()), original)
+            
+            middleware = WhiteNoiseMiddleware(lambda request: HttpResponse())
+            request = RequestFactory().get(f'/static/{nombre}', HTTP_ACCEPT_ENCODING='gzip, br')
+            response = middleware(request)
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertIn('max-age=315360000', response['Cache-Control'])
+            self.assertIn('Accept-Encoding', response['Vary'])
+            response.close()
+
+
+class CompresionMiddlewareTest(TestCase):
+    """Pruebas de la compresión de respuestas"""
+    
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.client.force_login(self.usuario)
+    
+    def _middleware(self, response):
+        from .middleware import CompresionMiddleware
+        return CompresionMiddleware(lambda request: response)
+    
+    def _request(self, accept_encoding='br, gzip'):
+        from django.test import RequestFactory
+        return RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+    
+    def test_elegir_codificacion(self):
+        """Prueba la negociación según Accept-Encoding y sus pesos"""
+        from .middleware import elegir_codificacion
+        casos = {
+            '': None, 'identity': None, 'gzip': 'gzip', 'gzip, br': 'br', 'br;q=0, gzip': 'gzip',
+            'gzip;q=1, br;q=0.5': 'gzip', '*': 'br', 'gzip;q=0, br;q=0': None, 'deflate': None,
+        }
+        for accept, esperada in casos.items():
+            with self.subTest(accept=accept):
+                self.assertEqual(elegir_codificacion(accept), esperada)
+    
+    def test_pagina_html_comprimida(self):
+        """Prueba que una página del calendario se envía con brotli o gzip y se descomprime igual"""
+        import brotli
+        import gzip
+        url = reverse('calendario_mensual', args=[2025, 3])
+        original = self.client.get(url)
+        self.assertNotIn('Content-Encoding', original)
+        self.assertIn('Accept-Encoding', original['Vary'])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(original.content) / 4)
+        self.assertEqual(brotli.decompress(response.content), original.content)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(gzip.decompress(response.content), original.content)
+    
+    def test_etag_debil_y_304(self):
+        """Prueba que el ETag de una respuesta comprimida es débil y sigue sirviendo para 304"""
+        url = reverse('calendario_mensual', args=[2025, 3])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br')
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+    
+    def test_omite_pequenas_comprimidas_y_binarias(self):
+        """Prueba que no se comprimen cuerpos pequeños, ya comprimidos o de tipos binarios"""
+        from django.http import HttpResponse
+        casos = [
+            HttpResponse(b'corto'),
+            HttpResponse(b'x' * 1000, headers={'Content-Encoding': 'gzip'}),
+            HttpResponse(b'x' * 1000, content_type='image/png'),
+            HttpResponse(b'x' * 1000, headers={'Cache-Control': 'no-transform'}),
+        ]
+        for response in casos:
+            with self.subTest(response=response):
+                cuerpo = response.content
+                resultado = self._middleware(response)(self._request())
+                self.assertEqual(resultado.content, cuerpo)
+        self.assertNotIn('Content-Encoding', self._middleware(HttpResponse(b'x' * 1000))(self._request('')))
+    
+    @override_settings(COMPRESION_NIVEL_GZIP=1)
+    def test_nivel_configurable(self):
+        """Prueba que el nivel se toma de la configuración"""
+        from django.http import HttpResponse
+        self.assertEqual(self._middleware(HttpResponse()).niveles['gzip'], 1)
+    
+    def test_streaming_incremental(self):
+        """Prueba que un StreamingHttpResponse se comprime por partes, sin consumir todo el contenido"""
+        import zlib
+        from django.http import StreamingHttpResponse
+        from .middleware import BLOQUE_STREAMING
+        consumidas = []
+        
+        def partes():
+            for numero in range(200):
+                consumidas.append(numero)
+                yield f'BEGIN:VEVENT\r\nUID:{numero}\r\nSUMMARY:Evento {numero}\r\n'.encode() * 50
+        
+        response = self._middleware(StreamingHttpResponse(partes(), content_type='text/calendar'))(
+            self._request('gzip')
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        salida = iter(response.streaming_content)
+        primero = next(salida)
+        self.assertLess(len(consumidas), 200)
+        self.assertLessEqual(len(consumidas) * 50 * 40, BLOQUE_STREAMING * 2)
+        cuerpo = zlib.decompress(primero + b''.join(salida), 31)
+        self.assertEqual(cuerpo, b''.join(
+            f'BEGIN:VEVENT\r\nUID:{numero}\r\nSUMMARY:Evento {numero}\r\n'.encode() * 50 for numero in range(200)
+        ))
+    
+    def test_streaming_asincrono(self):
+        """Prueba la compresión de un StreamingHttpResponse con un iterador asíncrono"""
+        import brotli
+        from asgiref.sync import async_to_sync
+        from django.http import StreamingHttpResponse
+        
+        async def partes():
+            for numero in range(100):
+                yield f'{{"id": {numero}}}\n'.encode()
+        
+        async def leer(response):
+            return b''.join([parte async for parte in response.streaming_content])
+        
+        response = self._middleware(StreamingHttpResponse(partes(), content_type='application/json'))(
+            self._request('br')
+        )
+        self.assertEqual(response['Content-Encoding'], 'br')
+        cuerpo = brotli.decompress(async_to_sync(leer)(response))
+        self.assertEqual(cuerpo, b''.join(f'{{"id": {numero}}}\n'.encode() for numero in range(100)))
+
+
+class EsqueletoCalendarioTest(TestCase):
+    """Pruebas de la grilla compartida de las vistas mensual y semanal"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.client.login(username='12345678-9', password='testpassword123')
+    
+    def test_esqueleto_compartido(self):
+        """Prueba que la grilla de un mes se calcula una vez y se reutiliza"""
+        from .calendario import _esqueleto_mensual, esqueleto_mensual
+        
+        primero = esqueleto_mensual(2025, 3)
+        aciertos = _esqueleto_mensual.cache_info().hits
+        self.assertIs(esqueleto_mensual(2025, 3), primero)
+        self.assertEqual(_esqueleto_mensual.cache_info().hits, aciertos + 1)
+        self.assertEqual(primero.desde, date(2025, 2, 24))
+        self.assertEqual(primero.hasta, date(2025, 4, 7))
+        self.assertTrue(primero.semanas[0][0].fuera_del_mes)
+        self.assertFalse(primero.semanas[0][5].fuera_del_mes)
+    
+    def test_navegacion_entre_anios(self):
+        """Prueba que enero enlaza a diciembre del año anterior y diciembre a enero"""
+        response = self.client.get(reverse('calendario_mensual', args=[2025, 1]))
+        self.assertContains(response, 'Enero 2025')
+        self.assertContains(response, f'href="{reverse("calendario_mensual", args=[2024, 12])}"')
+        
+        response = self.client.get(reverse('calendario_mensual', args=[2025, 12]))
+        self.assertContains(response, f'href="{reverse("calendario_mensual", args=[2026, 1])}"')
+    
+    def test_mes_inexistente(self):
+        """Prueba que un mes fuera de 1-12 responde 404"""
+        for month in (0, 13):
+            response = self.client.get(reverse('calendario_mensual', args=[2025, month]))
+            self.assertEqual(response.status_code, 404)
+    
+    def test_eventos_por_usuario(self):
+        """Prueba que la grilla compartida no mezcla los eventos de distintos usuarios"""
+        otro = Usuario.objects.create_user(rut='98765432-1', password='testpassword123')
+        Evento.objects.create(
+            titulo='Reunión ajena',
+            fecha_inicio=make_aware(datetime(2025, 3, 10, 9, 0)),
+            fecha_fin=make_aware(datetime(2025, 3, 10, 10, 0)),
+            usuario=otro
+        )
+        response = self.client.get(reverse('calendario_mensual', args=[2025, 3]))
+        self.assertNotContains(response, 'Reunión ajena')
+        response = self.client.get(reverse('calendario_semanal', args=[2025, 11]))
+        self.assertNotContains(response, 'Reunión ajena')
+    
+    def test_cargador_con_cache(self):
+        """Prueba que las plantillas se cargan con el cargador con caché"""
+        from django.template import engines
+        from django.template.loaders.cached import Loader
+        
+        self.assertIsInstance(engines['django'].engine.template_loaders[0], Loader)
+
+
+class ArchivoEventosTest(TestCase):
+    """Pruebas del archivo de eventos de periodos pasados"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            rut='12345678-9',
+            password='testpassword123'
+        )
+        self.antiguo = self._crear('Examen antiguo', datetime(2023, 6, 12, 9), datetime(2023, 6, 12, 11))
+        self.serie = self._crear(
+            'Taller 2023', datetime(2023, 3, 6, 15), datetime(2023, 3, 6, 16), recurrencia='semanal', repeticiones=4
+        )
+        # Cruza el corte: debe quedar en la tabla de eventos
+        self.cruza = self._crear('Receso', datetime(2023, 12, 28, 9), datetime(2024, 1, 3, 18))
+        self.sin_fin = self._crear('Consejo', datetime(2023, 5, 2, 10), datetime(2023, 5, 2, 11), recurrencia='mensual')
+        self.reciente = self._crear('Examen reciente', datetime(2025, 6, 10, 9), datetime(2025, 6, 10, 11))
+        self.client.login(username='12345678-9', password='testpassword123')
+    
+    def _crear(self, titulo, inicio, fin, **kwargs):
+        return Evento.objects.create(
+            titulo=titulo, fecha_inicio=make_aware(inicio), fecha_fin=make_aware(fin), usuario=self.usuario, **kwargs
+        )
+    
+    def _archivar(self, *argumentos):
+        salida = StringIO()
+        call_command('archivar_eventos', '--antes-de', '2024-01-01', *argumentos, stdout=salida)
+        return salida.getvalue()
+    
+    def test_archivar_por_lotes(self):
+        """Prueba que se mueven solo los eventos terminados antes del corte, conservando su id"""
+        from .models import EventoArchivado
+        
+        self.assertIn('Archivados 2 eventos', self._archivar('--lote', '1'))
+        self.assertEqual(
+            set(EventoArchivado.objects.values_list('id', flat=True)), {self.antiguo.pk, self.serie.pk}
+        )
+        self.assertEqual(
+            set(Evento.objects.values_list('id', flat=True)), {self.cruza.pk, self.sin_fin.pk, self.reciente.pk}
+        )
+        archivado = EventoArchivado.objects.get(pk=self.serie.pk)
+        self.assertEqual((archivado.titulo, archivado.repeticiones), ('Taller 2023', 4))
+        self.assertEqual(archivado.fin_serie, self.serie.fin_serie)
+        self.assertIn('Archivados 0 eventos', self._archivar())
+    
+    def test_conteos_y_busqueda(self):
+        """Prueba que los archivados siguen en los conteos y salen del índice de búsqueda"""
+        from .busqueda import buscar
+        from .conteos import reconstruir, resumen_por_mes
+        
+        antes = list(resumen_por_mes(self.usuario, date(2023, 1, 1), date(2024, 1, 1)))
+        self._archivar()
+        self.assertEqual(list(resumen_por_mes(self.usuario, date(2023, 1, 1), date(2024, 1, 1))), antes)
+        reconstruir()
+        self.assertEqual(list(resumen_por_mes(self.usuario, date(2023, 1, 1), date(2024, 1, 1))), antes)
+        self.assertEqual(buscar(self.usuario, 'examen').eventos, [self.reciente])
+    
+    def test_vistas_leen_archivo(self):
+        """Prueba que las vistas de periodos anteriores al corte muestran los archivados sin consultas extra"""
+        self._archivar()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('calendario_mensual', args=[2023, 6]))
+        self.assertContains(response, 'Examen antiguo')
+        self.assertContains(response, 'Consejo')
+        response = self.client.get(reverse('calendario_semanal', args=[2023, 12]))
+        self.assertContains(response, 'Taller 2023')
+        response = self.client.get(reverse('calendario_diario', args=[2023, 12, 29]))
+        self.assertContains(response, 'Receso')
+        response = self.client.get(reverse('calendario_anual', args=[2023]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Examen antiguo')
+        # Las ocurrencias de la serie archivada se siguen sumando al mes
+        marzo = next(mes for mes in response.context['meses_con_eventos'] if mes['numero'] == 3)
+        self.assertEqual(marzo['cantidad'], 4)
+    
+    def test_periodo_posterior_no_lee_archivo(self):
+        """Prueba que un periodo posterior al corte no lee la tabla de archivo"""
+        from .models import EventoArchivado
+        
+        self._archivar()
+        # Una fila fuera de lugar en el archivo solo sería visible si se leyera
+        EventoArchivado.objects.create(
+            id=10_000, titulo='Fuera de lugar', usuario=self.usuario,
+            fecha_inicio=make_aware(datetime(2025, 6, 11, 9)), fecha_fin=make_aware(datetime(2025, 6, 11, 10)),
+        )
+        response = self.client.get(reverse('calendario_mensual', args=[2025, 6]))
+        self.assertContains(response, 'Examen reciente')
+        self.assertNotContains(response, 'Fuera de lugar')
+    
+    def test_mapa_calor_y_validadores(self):
+        """Prueba que el mapa de calor y el ETag no cambian al archivar"""
+        from .mapa_calor import mapa_calor
+        
+        url = reverse('mapa_calor', args=[2023])
+        cantidades, horas = mapa_calor(lambda eventos: eventos.filter(usuario=self.usuario), 2023)
+        etag = self.client.get(url)['ETag']
+        self._archivar()
+        despues, horas_despues = mapa_calor(lambda eventos: eventos.filter(usuario=self.usuario), 2023)
+        self.assertEqual(despues.tolist(), cantidades.tolist())
+        self.assertEqual(horas_despues.tolist(), horas.tolist())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+    
+    def test_corte_no_retrocede(self):
+        """Prueba que el corte solo avanza y que por defecto depende de ARCHIVO_MESES"""
+        from django.core.management.base import CommandError
+        from .archivo import corte_por_antiguedad, corte_vigente
+        
+        self._archivar()
+        with self.assertRaises(CommandError):
+            call_command('archivar_eventos', '--antes-de', '2023-06-01', stdout=StringIO())
+        self.assertEqual(corte_vigente(), make_aware(datetime(2024, 1, 1)))
+        self.assertEqual(corte_por_antiguedad(24, hoy=date(2026, 3, 15)), date(2024, 3, 1))
+        self.assertEqual(corte_por_antiguedad(3, hoy=date(2026, 2, 1)), date(2025, 11, 1))
+    
+    def test_admin_de_solo_lectura(self):
+        """Prueba que el admin no permite agregar, editar ni borrar eventos archivados"""
+        from .models import EventoArchivado
+        self._archivar()
+        admin = Usuario.objects.create_superuser(rut='87654321-0', password='adminpassword123')
+        self.client.force_login(admin)
+        archivado = EventoArchivado.objects.get(pk=self.antiguo.pk)
+        response = self.client.get(reverse('admin:core_eventoarchivado_changelist'))
+        self.assertContains(response, 'Examen antiguo')
+        self.assertNotContains(response, 'delete_selected')
+        for url in (
+            reverse('admin:core_eventoarchivado_add'),
+            reverse('admin:core_eventoarchivado_delete', args=[archivado.pk]),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.post(url, {'post': 'yes'}).status_code, 403)
+        self.assertTrue(EventoArchivado.objects.filter(pk=archivado.pk).exists())
+
+
+class CachesCompartidasTest(TestCase):
+    """Pruebas de la verificación de cachés compartidas entre procesos"""
+    
+    REDIS = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}
+    
+    def _errores(self):
+        from .checks import advertir_caches_locales, revisar_caches_compartidas
+        return [mensaje.id for mensaje in revisar_caches_compartidas(None) + advertir_caches_locales(None)]
+    
+    def _caches(self, **alias):
+        from django.conf import settings
+        return {**settings.CACHES, **alias}
+    
+    def test_un_proceso_solo_advierte(self):
+        """Prueba que con un proceso la caché local solo genera una advertencia de despliegue"""
+        with override_settings(PROCESOS=1):
+            self.assertIn('core.W001', self._errores())
+            self.assertNotIn('core.E001', self._errores())
+    
+    def test_varios_procesos_exigen_cache_compartida(self):
+        """Prueba que con varios procesos la caché del calendario debe ser compartida"""
+        with override_settings(PROCESOS=4):
+            self.assertIn('core.E001', self._errores())
+        with override_settings(
+            PROCESOS=4, CACHES=self._caches(calendario=self.REDIS, sesiones=self.REDIS, limites=self.REDIS)
+        ):
+            self.assertEqual(self._errores(), [])
+    
+    def test_sesiones_en_cache_local(self):
+        """Prueba que las sesiones en caché local se rechazan con varios procesos, salvo con backends.db"""
+        caches_compartidas = self._caches(calendario=self.REDIS, limites=self.REDIS)
+        with override_settings(PROCESOS=4, CACHES=caches_compartidas):
+            self.assertEqual(self._errores(), ['core.E001'])
+        with override_settings(
+            PROCESOS=4, CACHES=caches_compartidas, SESSION_ENGINE='django.contrib.sessions.backends.db'
+        ):
+            self.assertEqual(self._errores(), [])
+    
+    def test_limites_en_cache_local(self):
+        """Prueba que los buckets de inicio de sesión locales se rechazan con varios procesos"""
+        caches_compartidas = self._caches(calendario=self.REDIS, sesiones=self.REDIS)
+        with override_settings(PROCESOS=4, CACHES=caches_compartidas):
+            self.assertEqual(self._errores(), ['core.E001'])
+        with override_settings(PROCESOS=4, CACHES=caches_compartidas, LIMITE_LOGIN_RUT='', LIMITE_LOGIN_IP=''):
+            self.assertEqual(self._errores(), [])
+
@@ -1,18 +1,240 @@
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.http import require_GET
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
 from django.contrib import messages
-from .models import Evento, Usuario
-from .forms import EventoForm, CustomUserCreationForm, CustomAuthenticationForm
-import calendar
-from datetime import date, timedelta, datetime
+from .models import Evento, Usuario, rango_datetimes
+from .forms import BusquedaForm, EventoForm, CustomUserCreationForm, CustomAuthenticationForm
+from .calendario import (
+    DIAS_SEMANA, NOMBRES_MESES, agrupar_eventos_por_mes, esqueleto_mensual, esqueleto_semanal,
+    indexar_eventos_por_dia,
+)
+from .archivo import aresumen_cambios, con_archivo, resumen_cambios
+from .busqueda import buscar
+from . import limites
+from .cache import aobtener_fragmento
+from .conteos import resumen_por_mes
+from .mapa_calor import mapa_calor
+from .recurrencia import expandir_eventos
+from .ical import CAMPOS_ICS, agenerar_calendario, generar_calendario, token_suscripcion, usuario_desde_token
+import hashlib
+import math
+from datetime import MAXYEAR, MINYEAR, date, timedelta
+
+# Eventos que muestra cada mes del calendario anual
+EVENTOS_POR_MES = 5
 
 def is_admin(user):
     return user.is_superuser
 
+async def _eventos_periodo(usuario, desde, hasta):
+    """
+    Eventos del usuario que ocurren en [desde, hasta), incluidos los que
+    inician, terminan o se extienden durante el rango, con las series
+    recurrentes ya expandidas. Si el periodo es anterior al corte de archivo
+    también se leen los eventos archivados (ver core.archivo).
+    """
+    eventos = con_archivo(
+        lambda eventos: eventos.filter(usuario=usuario).overlapping(desde, hasta), desde
+    ).order_by("fecha_inicio")
+    return expandir_eventos([evento async for evento in eventos], *rango_datetimes(desde, hasta))
+
+def _contexto_diario(usuario, selected_date, eventos_dia):
+    return {
+        "selected_date": selected_date,
+        "semana_iso": selected_date.isocalendar(),
+        "eventos": eventos_dia,
+        "is_admin": usuario.is_superuser
+    }
+
+def _contexto_mensual(usuario, year, month, eventos_mes):
+    # La grilla es compartida entre usuarios: solo se asignan los eventos de cada celda
+    esqueleto = esqueleto_mensual(year, month)
+    eventos_por_dia = indexar_eventos_por_dia(
+        eventos_mes, [dia.fecha for semana in esqueleto.semanas for dia in semana]
+    )
+    month_days = [
+        [{'date': dia.fecha, 'dia': dia, 'eventos': eventos_por_dia[dia.fecha]} for dia in semana]
+        for semana in esqueleto.semanas
+    ]
+    
+    return {
+        "year": year,
+        "month": month,
+        "esqueleto": esqueleto,
+        "dias_semana": DIAS_SEMANA,
+        "month_days": month_days,
+        "is_admin": usuario.is_superuser
+    }
+
+async def _datos_anuales(usuario, desde, hasta):
+    """
+    Datos del calendario anual sin recorrer todos los eventos del año: las
+    cantidades por mes salen de ConteoDiario y de cada mes se cargan solo los
+    primeros eventos. Las series y los eventos que abarcan varios meses se
+    cargan aparte porque pueden aparecer en meses distintos al de su inicio.
+    """
+    cantidades = {mes: eventos async for mes, eventos in resumen_por_mes(usuario, desde, hasta)}
+    primeros = con_archivo(
+        lambda eventos: eventos.filter(usuario=usuario).primeros_por_mes(desde, hasta, EVENTOS_POR_MES), desde
+    ).order_by("fecha_inicio", "id")
+    primeros = [evento async for evento in primeros]
+    otros = con_archivo(
+        lambda eventos: eventos.filter(usuario=usuario).overlapping(desde, hasta).ocupan_varios_meses(), desde
+    ).order_by("fecha_inicio")
+    otros = expandir_eventos([evento async for evento in otros], *rango_datetimes(desde, hasta))
+    return cantidades, primeros, otros
+
+def _contexto_anual(usuario, year, datos):
+    cantidades, primeros, otros = datos
+    primeros_por_mes = agrupar_eventos_por_mes(primeros, year)
+    otros_por_mes = agrupar_eventos_por_mes(otros, year)
+    
+    # Crear una lista de todos los meses del año con sus primeros eventos
+    meses_con_eventos = []
+    total_eventos = 0
+    mes_mas_activo = ""
+    max_eventos_mes = 0
+    meses_con_eventos_count = 0
+    
+    for mes in range(1, 13):
+        nombre_mes = NOMBRES_MESES[mes]
+        
+        # Las series no están en los conteos: se suman sus ocurrencias del mes
+        ocurrencias = sum(1 for evento in otros_por_mes[mes - 1] if evento.recurrencia)
+        cantidad_eventos = cantidades.get(mes, 0) + ocurrencias
+        total_eventos += cantidad_eventos
+        
+        if cantidad_eventos > 0:
+            meses_con_eventos_count += 1
+            
+        if cantidad_eventos > max_eventos_mes:
+            max_eventos_mes = cantidad_eventos
+            mes_mas_activo = nombre_mes
+        
+        # Un evento largo que comienza en el mes puede venir en ambas listas
+        candidatos = {
+            (evento.pk, evento.fecha_inicio): evento
+            for evento in primeros_por_mes[mes - 1] + otros_por_mes[mes - 1]
+        }
+        eventos_mes = sorted(candidatos.values(), key=lambda evento: (evento.fecha_inicio, evento.pk))
+        
+        meses_con_eventos.append({
+            'numero': mes,
+            'nombre': nombre_mes,
+            'eventos': eventos_mes[:EVENTOS_POR_MES],
+            'cantidad': cantidad_eventos
+        })
+    
+    return {
+        "year": year,
+        "url_ics": reverse("eventos_ics", args=[token_suscripcion(usuario)]),
+        "meses_con_eventos": meses_con_eventos,
+        "total_eventos": total_eventos,
+        "mes_mas_activo": mes_mas_activo,
+        "max_eventos_mes": max_eventos_mes,
+        "meses_con_eventos_count": meses_con_eventos_count,
+        "is_admin": usuario.is_superuser
+    }
+
+def _contexto_semanal(usuario, year, week, esqueleto, eventos_semana):
+    # Los eventos de la semana se reparten por día; los eventos multi-día
+    # aparecen en cada día que cubren
+    eventos_por_dia = indexar_eventos_por_dia(eventos_semana, [dia.fecha for dia in esqueleto.dias])
+    week_days = [{'date': dia.fecha, 'dia': dia, 'eventos': eventos_por_dia[dia.fecha]} for dia in esqueleto.dias]
+    
+    return {
+        "year": year,
+        "week": week,
+        "esqueleto": esqueleto,
+        "start_of_week": esqueleto.desde,
+        "end_of_week": esqueleto.hasta - timedelta(days=1),
+        "week_days": week_days,
+        "prev_year": esqueleto.anterior[0],
+        "prev_week": esqueleto.anterior[1],
+        "next_year": esqueleto.siguiente[0],
+        "next_week": esqueleto.siguiente[1],
+        "is_admin": usuario.is_superuser
+    }
+
+async def _validadores_periodo(usuario, vista, periodo, desde, hasta):
+    """
+    Calcula el ETag y la fecha de última modificación de un periodo a partir
+    de la cantidad de eventos y su último `updated_at`.
+    """
+    resumen = await aresumen_cambios(lambda eventos: eventos.filter(usuario=usuario).overlapping(desde, hasta), desde)
+    return _etag(vista, periodo, usuario.pk, int(usuario.is_superuser), resumen), resumen['ultima_modificacion']
+
+def _etag(*partes):
+    """ETag a partir de identificadores y el resultado de resumen_cambios()"""
+    *partes, resumen = partes
+    ultima_modificacion = resumen['ultima_modificacion']
+    firma = ":".join(str(parte) for parte in partes) + ":{}:{}".format(
+        resumen['cantidad'], ultima_modificacion.isoformat() if ultima_modificacion else ''
+    )
+    return quote_etag(hashlib.md5(firma.encode()).hexdigest())
+
+def _agregar_validadores(response, etag, ultima_modificacion):
+    response.headers['ETag'] = etag
+    if ultima_modificacion:
+        response.headers['Last-Modified'] = http_date(ultima_modificacion.timestamp())
+    # Cada usuario ve su propio calendario y el navegador debe revalidar siempre
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+async def _render_calendario(request, template, vista, periodo, rango, construir_contexto, cargar=_eventos_periodo, hoy=None):
+    """
+    Renderiza una página del calendario reutilizando, si existe, el fragmento
+    cacheado para el usuario. Las consultas y el renderizado del fragmento
+    solo se ejecutan cuando no está en caché. `construir_contexto` recibe lo
+    que retorna `cargar` para el rango (por defecto, sus eventos).
+    
+    Responde 304 cuando el ETag enviado en If-None-Match coincide con el del
+    periodo. El ETag también se guarda en la caché versionada, así que mientras
+    el usuario no modifique eventos no se vuelve a calcular.
+    
+    El fragmento no depende de la fecha actual: si la página marca el día de
+    hoy, la vista pasa `hoy`, que se entrega a la plantilla externa y se agrega
+    al ETag para que el navegador no conserve la marca del día anterior.
+    
+    Todo el acceso a la sesión, la caché y la base de datos es asíncrono, así
+    que bajo ASGI el request no ocupa un hilo mientras espera.
+    """
+    # Las plantillas leen request.user: se reemplaza el objeto perezoso (que
+    # consultaría la base de datos de forma síncrona) por el ya cargado
+    usuario = request.user = await request.auser()
+    etag, ultima_modificacion = await aobtener_fragmento(
+        usuario, f"{vista}:etag", periodo,
+        lambda: _validadores_periodo(usuario, vista, periodo, *rango)
+    )
+    if hoy is not None:
+        etag = quote_etag(hashlib.md5(f"{etag}:{hoy.isoformat()}".encode()).hexdigest())
+    
+    # Si hay mensajes pendientes la página debe renderizarse para mostrarlos.
+    # Solo se valida el ETag: Last-Modified no refleja eventos eliminados.
+    if not len(messages.get_messages(request)):
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return _agregar_validadores(response, etag, ultima_modificacion)
+    
+    async def construir_fragmento():
+        datos = await cargar(usuario, *rango)
+        return render_to_string(f"core/parciales/{template}", construir_contexto(datos), request)
+    
+    fragmento = await aobtener_fragmento(usuario, vista, periodo, construir_fragmento)
+    response = render(request, f"core/{template}", {"fragmento": mark_safe(fragmento), "hoy": hoy})
+    return _agregar_validadores(response, etag, ultima_modificacion)
+
 @login_required
-def calendario_view(request, year=None, month=None, day=None):
+async def calendario_view(request, year=None, month=None, day=None):
     today = date.today()
     
     # Si no se especifica año, usar el año actual
@@ -23,173 +245,147 @@ def calendario_view(request, year=None, month=None, day=None):
         month = int(month) if month else today.month
         day = int(day)
         selected_date = date(year, month, day)
-        
-        # Obtener eventos que ocurren en esta fecha específica
-        # Incluye eventos que inician, terminan o se extienden durante este día
-        eventos_dia = Evento.objects.filter(
-            usuario=request.user,
-            fecha_inicio__date__lte=selected_date,  # Inicia en o antes de esta fecha
-            fecha_fin__date__gte=selected_date      # Termina en o después de esta fecha
-        ).order_by("fecha_inicio")
-        
-        return render(request, "core/calendario_diario.html", {
-            "selected_date": selected_date,
-            "eventos": eventos_dia,
-            "is_admin": request.user.is_superuser
-        })
+        return await _render_calendario(
+            request, "calendario_diario.html", "diario", selected_date.isoformat(),
+            (selected_date, selected_date + timedelta(days=1)),
+            lambda eventos: _contexto_diario(request.user, selected_date, eventos)
+        )
 
     # Vista Mensual
     elif month is not None:
         month = int(month)
-        cal = calendar.Calendar()
-        month_days = cal.monthdatescalendar(year, month)
-        
-        # Obtener eventos que ocurren durante este mes
-        # Incluye eventos que inician, terminan o se extienden durante este mes
-        primer_dia_mes = datetime(year, month, 1).date()
-        if month == 12:
-            ultimo_dia_mes = datetime(year + 1, 1, 1).date() - timedelta(days=1)
-        else:
-            ultimo_dia_mes = datetime(year, month + 1, 1).date() - timedelta(days=1)
-        
-        eventos_mes = Evento.objects.filter(
-            usuario=request.user,
-            fecha_inicio__date__lte=ultimo_dia_mes,  # Inicia en o antes del último día del mes
-            fecha_fin__date__gte=primer_dia_mes      # Termina en o después del primer día del mes
-        ).order_by("fecha_inicio")
-        
-        return render(request, "core/calendario_mensual.html", {
-            "year": year,
-            "month": month,
-            "month_days": month_days,
-            "eventos": eventos_mes,
-            "is_admin": request.user.is_superuser
-        })
+        try:
+            esqueleto = esqueleto_mensual(year, month)
+        except (ValueError, OverflowError):
+            raise Http404("El mes solicitado no existe.")
+        return await _render_calendario(
+            request, "calendario_mensual.html", "mensual", f"{year}-{month:02d}",
+            (esqueleto.desde, esqueleto.hasta),
+            lambda eventos: _contexto_mensual(request.user, year, month, eventos)
+        )
 
     # Vista Anual (cuando year está especificado pero month y day no)
     # O vista por defecto (cuando accede a /calendario/ sin parámetros - mostrará el año actual)
     else:
-        # Nombres de meses en español
-        nombres_meses = [
-            '', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-            'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'
-        ]
-        
-        # Crear una lista de todos los meses del año con sus eventos
-        meses_con_eventos = []
-        total_eventos = 0
-        mes_mas_activo = ""
-        max_eventos_mes = 0
-        meses_con_eventos_count = 0
-        
-        for mes in range(1, 13):
-            nombre_mes = nombres_meses[mes]
-            
-            # Calcular el primer y último día del mes
-            primer_dia_mes = datetime(year, mes, 1).date()
-            if mes == 12:
-                ultimo_dia_mes = datetime(year + 1, 1, 1).date() - timedelta(days=1)
-            else:
-                ultimo_dia_mes = datetime(year, mes + 1, 1).date() - timedelta(days=1)
-            
-            # Obtener eventos que ocurren durante este mes
-            # Incluye eventos que inician, terminan o se extienden durante este mes
-            eventos_mes = Evento.objects.filter(
-                usuario=request.user,
-                fecha_inicio__date__lte=ultimo_dia_mes,  # Inicia en o antes del último día del mes
-                fecha_fin__date__gte=primer_dia_mes      # Termina en o después del primer día del mes
-            ).order_by("fecha_inicio")
-            
-            cantidad_eventos = eventos_mes.count()
-            total_eventos += cantidad_eventos
-            
-            if cantidad_eventos > 0:
-                meses_con_eventos_count += 1
-                
-            if cantidad_eventos > max_eventos_mes:
-                max_eventos_mes = cantidad_eventos
-                mes_mas_activo = nombre_mes
-            
-            meses_con_eventos.append({
-                'numero': mes,
-                'nombre': nombre_mes,
-                'eventos': eventos_mes,
-                'cantidad': cantidad_eventos
-            })
-        
-        return render(request, "core/calendario_anual.html", {
-            "year": year,
-            "meses_con_eventos": meses_con_eventos,
-            "total_eventos": total_eventos,
-            "mes_mas_activo": mes_mas_activo,
-            "max_eventos_mes": max_eventos_mes,
-            "meses_con_eventos_count": meses_con_eventos_count,
-            "is_admin": request.user.is_superuser
-        })
+        return await _render_calendario(
+            request, "calendario_anual.html", "anual", str(year),
+            (date(year, 1, 1), date(year + 1, 1, 1)),
+            lambda datos: _contexto_anual(request.user, year, datos),
+            cargar=_datos_anuales
+        )
 
 @login_required
-def calendario_semanal_view(request, year=None, week=None):
+async def calendario_semanal_view(request, year=None, week=None):
     today = date.today()
-    year = int(year) if year else today.year
     
-    # Si week es 'current', usar la semana actual
+    # Si week es 'current', usar la semana ISO actual
     if week == 'current' or week is None:
-        week = today.isocalendar()[1]
+        year, week = today.isocalendar()[:2]
     else:
+        year = int(year)
         week = int(week)
     
-    # Calcular el primer día de la semana
-    first_day_of_year = date(year, 1, 1)
-    # Encontrar el primer lunes del año
-    days_since_monday = first_day_of_year.weekday()
-    first_monday = first_day_of_year - timedelta(days=days_since_monday)
-    
-    # Calcular la fecha de inicio de la semana especificada
-    start_of_week = first_monday + timedelta(weeks=week - 1)
-    end_of_week = start_of_week + timedelta(days=6)
+    # Calcular el lunes de la semana ISO especificada
+    try:
+        esqueleto = esqueleto_semanal(date.fromisocalendar(year, week, 1))
+    except (ValueError, OverflowError):
+        raise Http404("La semana solicitada no existe.")
     
-    # Crear lista de días de la semana
-    week_days = []
-    for i in range(7):
-        day = start_of_week + timedelta(days=i)
-        
-        # Obtener eventos que ocurren en este día específico
-        # Incluye eventos que inician, terminan o se extienden durante este día
-        eventos_dia = Evento.objects.filter(
-            usuario=request.user,
-            fecha_inicio__date__lte=day,  # Inicia en o antes de esta fecha
-            fecha_fin__date__gte=day      # Termina en o después de esta fecha
-        ).order_by("fecha_inicio")
-        
-        week_days.append({
-            'date': day,
-            'eventos': eventos_dia
+    return await _render_calendario(
+        request, "calendario_semanal.html", "semanal", f"{year}-W{week:02d}",
+        (esqueleto.desde, esqueleto.hasta),
+        lambda eventos: _contexto_semanal(request.user, year, week, esqueleto, eventos),
+        hoy=today if esqueleto.desde <= today < esqueleto.hasta else None
+    )
+
+@login_required
+@require_GET
+def mapa_calor_view(request, year):
+    """
+    Ocupación de cada día del año del usuario (cantidad de eventos y horas
+    ocupadas) en JSON, para dibujar el mapa de calor del calendario anual.
+    `eventos[i]` y `horas[i]` corresponden al día `desde + i`.
+    """
+    # El rango llega hasta el 1 de enero del año siguiente y los extremos se
+    # convierten a la zona horaria activa, así que se excluyen los años límite
+    if not MINYEAR < year < MAXYEAR:
+        raise Http404("El año solicitado no existe.")
+    desde = date(year, 1, 1)
+    resumen = resumen_cambios(
+        lambda eventos: eventos.filter(usuario=request.user).overlapping(desde, date(year + 1, 1, 1)), desde
+    )
+    etag = _etag("mapa_calor", year, request.user.pk, resumen)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cantidades, horas = mapa_calor(lambda eventos: eventos.filter(usuario=request.user), year)
+        response = JsonResponse({
+            "year": year,
+            "desde": desde.isoformat(),
+            "eventos": cantidades.tolist(),
+            "horas": horas.round(2).tolist(),
         })
-    
-    # Calcular semana anterior y siguiente
-    prev_week = week - 1 if week > 1 else 52
-    prev_year = year if week > 1 else year - 1
-    next_week = week + 1 if week < 52 else 1
-    next_year = year if week < 52 else year + 1
-    
-    return render(request, "core/calendario_semanal.html", {
-        "year": year,
-        "week": week,
-        "start_of_week": start_of_week,
-        "end_of_week": end_of_week,
-        "week_days": week_days,
-        "prev_year": prev_year,
-        "prev_week": prev_week,
-        "next_year": next_year,
-        "next_week": next_week,
-        "is_admin": request.user.is_superuser
+    return _agregar_validadores(response, etag, resumen['ultima_modificacion'])
+
+@login_required
+@require_GET
+def buscar_view(request):
+    """
+    Búsqueda de texto completo en los eventos del usuario, ordenada por
+    relevancia y filtrable por rango de fechas (ver core.busqueda)
+    """
+    form = BusquedaForm(request.GET or None)
+    resultados = None
+    if form.is_valid():
+        hasta = form.cleaned_data["hasta"]
+        resultados = buscar(
+            request.user, form.cleaned_data["q"],
+            desde=form.cleaned_data["desde"],
+            hasta=hasta + timedelta(days=1) if hasta else None,
+            pagina=form.cleaned_data["pagina"] or 1,
+        )
+    # Los enlaces de página conservan los filtros
+    parametros = request.GET.copy()
+    parametros.pop("pagina", None)
+    return render(request, "core/busqueda.html", {
+        "form": form,
+        "resultados": resultados,
+        "parametros": parametros.urlencode(),
+        "is_admin": request.user.is_superuser,
     })
 
+@require_GET
+def eventos_ics(request, token):
+    """
+    Feed iCalendar de los eventos de un usuario, para suscribirse desde un
+    cliente de calendario. Se autentica con el token firmado de la URL.
+    """
+    usuario = usuario_desde_token(token)
+    if usuario is None:
+        raise Http404("Suscripción no encontrada.")
+    
+    # Los clientes consultan el feed seguido: si nada cambió basta con el resumen.
+    # No se usa Last-Modified porque no refleja eventos eliminados.
+    eventos = Evento.objects.filter(usuario=usuario)
+    etag = _etag("ics", usuario.pk, eventos.resumen_cambios())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        filas = eventos.order_by("fecha_inicio", "id").values_list(*CAMPOS_ICS)
+        # Igual que en core.api, el iterador debe coincidir con el servidor
+        nombre = f"Didacta {usuario.rut}"
+        if isinstance(request, ASGIRequest):
+            contenido = agenerar_calendario(filas.aiterar(500), nombre=nombre)
+        else:
+            contenido = generar_calendario(filas.iterator(chunk_size=500), nombre=nombre)
+        response = StreamingHttpResponse(contenido, content_type="text/calendar; charset=utf-8")
+        response.headers['Content-Disposition'] = 'inline; filename="eventos.ics"'
+    response.headers['ETag'] = etag
+    return response
+
 @login_required
 @user_passes_test(is_admin)
 def evento_crear(request):
     if request.method == "POST":
-        form = EventoForm(request.POST)
+        form = EventoForm(request.POST, usuario=request.user)
         if form.is_valid():
             evento = form.save(commit=False)
             evento.usuario = request.user
@@ -205,7 +401,7 @@ def evento_crear(request):
 def evento_editar(request, pk):
     evento = get_object_or_404(Evento, pk=pk, usuario=request.user)
     if request.method == "POST":
-        form = EventoForm(request.POST, instance=evento)
+        form = EventoForm(request.POST, instance=evento, usuario=request.user)
         if form.is_valid():
             form.save()
             messages.success(request, "Evento actualizado exitosamente.")
@@ -242,36 +438,48 @@ def register_view(request):
 
 def login_view(request):
     if request.method == "POST":
+        rut = request.POST.get("username", "")
+        # Se revisa antes de validar el formulario, que es donde se calcula el hash
+        espera = limites.consumir(limites.buckets_login(request, rut))
+        if espera:
+            segundos = math.ceil(espera)
+            messages.error(request, f"Demasiados intentos. Vuelve a intentarlo en {segundos} segundos.")
+            form = CustomAuthenticationForm(request, initial={"username": rut})
+            response = render(
+                request, "core/login.html", {"form": form, "next": request.GET.get('next', '')}, status=429
+            )
+            response["Retry-After"] = str(segundos)
+            return response
+
         form = CustomAuthenticationForm(request, data=request.POST)
         if form.is_valid():
-            rut = form.cleaned_data.get("username")
-            password = form.cleaned_data.get("password")
-            user = authenticate(request, rut=rut, password=password)
-            if user is not None:
-                login(request, user)
-                messages.success(request, f"Has iniciado sesión como {rut}.")
-                
-                # Redirigir a la página que intentaba acceder originalmente
-                next_url = request.POST.get('next') or request.GET.get('next') or request.session.get('next_url')
-                if next_url and next_url != '/calendario/login/':
-                    # Limpiar la sesión si existe
-                    if 'next_url' in request.session:
-                        del request.session['next_url']
-                    return redirect(next_url)
-                
-                # Si no hay URL de destino, ir al calendario
-                return redirect("calendario")
-            else:
-                messages.error(request, "RUT o contraseña inválidos.")
+            # El formulario ya autenticó al usuario: no se vuelve a calcular el hash
+            user = form.get_user()
+            limites.reiniciar_login(rut)
+            login(request, user)
+            messages.success(request, f"Has iniciado sesión como {user.rut}.")
+            
+            # Redirigir a la página que intentaba acceder originalmente
+            next_url = request.POST.get('next') or request.GET.get('next') or request.session.get('next_url')
+            if next_url and next_url != '/calendario/login/':
+                # Limpiar la sesión si existe
+                if 'next_url' in request.session:
+                    del request.session['next_url']
+                return redirect(next_url)
+            
+            # Si no hay URL de destino, ir al calendario
+            return redirect("calendario")
         else:
             messages.error(request, "RUT o contraseña inválidos.")
     else:
         form = CustomAuthenticationForm()
         
         # Si viene de una redirección por falta de autenticación
+        # Solo se escribe si cambió, para no guardar la sesión en cada visita
         next_url = request.GET.get('next')
         if next_url:
-            request.session['next_url'] = next_url
+            if request.session.get('next_url') != next_url:
+                request.session['next_url'] = next_url
             messages.warning(request, "Debes iniciar sesión para acceder a esa página.")
     
     # Pasar el parámetro next al template